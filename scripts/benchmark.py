@@ -0,0 +1,288 @@
+# ==============================================================================
+# Script Name: benchmark.py
+# Description: Benchmark harness for the pipeline. Generates a deterministic
+#              synthetic corpus, times run_compressions, analyze_results and
+#              generate_report on every image, and compares throughput and
+#              memory against a stored baseline.
+# Usage:       python benchmark.py [--sizes 1 12 48] [--save-baseline] [options]
+# ==============================================================================
+
+import argparse
+import os
+import json
+import time
+import shutil
+import logging
+import platform
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Ensure libs can be imported if running from root or scripts dir
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from libs.profiling import peak_rss_mb, resource
+
+BASELINE_VERSION = 1
+
+STAGES = ["encode", "analyze", "report"]
+
+# Stage results compared against the baseline: (key, tolerance option, higher is worse)
+CHECKS = [
+    ("wall_s", "tolerance", True),
+    ("peak_rss_mb", "memory_tolerance", True),
+]
+
+def setup_logging(verbosity):
+    level = logging.WARNING
+    if verbosity == 1:
+        level = logging.INFO
+    elif verbosity >= 2:
+        level = logging.DEBUG
+
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%H:%M:%S'
+    )
+
+def children_usage():
+    """(CPU seconds, peak RSS MiB) of all reaped child processes so far."""
+    if resource is None:
+        return 0.0, None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    rss = usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+    return usage.ru_utime + usage.ru_stime, round(rss, 1)
+
+def timed(fn, *args, **kwargs):
+    """Runs fn once. Returns (result, timings) with wall, CPU (incl. children) and peak RSS."""
+    child_cpu = children_usage()[0]
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    result = fn(*args, **kwargs)
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu + children_usage()[0] - child_cpu
+    return result, {
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "children_peak_rss_mb": children_usage()[1],
+    }
+
+def bench_image(image_path, settings, work_dir):
+    """
+    Runs the three pipeline stages on one image, `repeat` times, in a fresh
+    process (see run_benchmarks). Keeps the fastest wall time of each stage.
+    """
+    setup_logging(settings["verbosity"])
+    from PIL import Image
+    from libs.analyzer import analyze_results
+    from libs.compressor import run_compressions
+    from libs.reporter import generate_report
+    from libs.workspace import create_workspace
+
+    with Image.open(image_path) as img:
+        megapixels = img.width * img.height / 1_000_000
+
+    best = {}
+    variants = 0
+    for _ in range(settings["repeat"]):
+        run_root = os.path.join(work_dir, "runs")
+        dirs, original_copy = create_workspace(image_path, run_root)
+        try:
+            generated, encode = timed(run_compressions, original_copy, dirs["images"], settings["formats"],
+                                      settings["steps"], jobs=settings["jobs"], backend=settings["backend"])
+            metrics_path, analyze = timed(analyze_results, original_copy, generated, dirs["diffs"], dirs["data"],
+                                      engine=settings["engine"], jobs=settings["jobs"])
+            _, report = timed(generate_report, original_copy, metrics_path, dirs["report"], dirs["root"],
+                              charts=settings["charts"])
+        finally:
+            shutil.rmtree(dirs["root"], ignore_errors=True)
+
+        variants = len(generated)
+        for name, timings in zip(STAGES, (encode, analyze, report)):
+            if name not in best or timings["wall_s"] < best[name]["wall_s"]:
+                best[name] = timings
+
+    for name in ("encode", "analyze"):
+        wall = best[name]["wall_s"] or 1e-9
+        best[name]["variants_per_s"] = round(variants / wall, 3)
+        best[name]["mp_per_s"] = round(variants * megapixels / wall, 3)
+
+    return {"megapixels": round(megapixels, 2), "variants": variants, "stages": best}
+
+def run_benchmarks(images, settings, work_dir):
+    """
+    Benchmarks every image in its own spawned process, so the peak RSS of
+    one image is not hidden by a larger one measured earlier.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for path in images:
+        name = os.path.splitext(os.path.basename(path))[0]
+        print(f"  {name} ...", end="", flush=True)
+        # Not multiprocessing.Pool: its daemonic workers cannot start the analysis/chart pools
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            results[name] = pool.submit(bench_image, path, settings, work_dir).result()
+        total = sum(s["wall_s"] for s in results[name]["stages"].values())
+        print(f" {total:.2f} s")
+    return results
+
+def environment():
+    import numpy
+    import PIL
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pillow": PIL.__version__,
+    }
+
+def compare(results, baseline, settings, options):
+    """
+    Returns the regressions: stage values worse than the baseline by more
+    than the relative tolerance. Timings must also be worse by at least
+    --min-seconds, so jitter on millisecond stages does not fail a run.
+    """
+    # Images are matched by name, so a run over a subset of the corpus is fine
+    ignored = ("sizes", "kinds", "repeat")
+    pipeline = {k: v for k, v in settings.items() if k not in ignored}
+    if {k: v for k, v in baseline.get("settings", {}).items() if k not in ignored} != pipeline:
+        print("Warning: baseline was recorded with different settings; comparisons may not be meaningful")
+        print(f"  baseline: {baseline.get('settings')}")
+        print(f"  current:  {settings}")
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        for stage_name, current in result["stages"].items():
+            reference = base["stages"].get(stage_name, {})
+            for key, tolerance_option, higher_is_worse in CHECKS:
+                new, old = current.get(key), reference.get(key)
+                if new is None or not old:
+                    continue
+                tolerance = getattr(options, tolerance_option)
+                change = (new - old) / old
+                worse = change > tolerance if higher_is_worse else change < -tolerance
+                if key == "wall_s" and new - old < options.min_seconds:
+                    worse = False
+                if worse:
+                    regressions.append((name, stage_name, key, old, new, change))
+    return regressions
+
+def print_results(results, baseline=None):
+    base_results = (baseline or {}).get("results", {})
+    print(f"\n  {'image':<24} {'stage':<8} {'wall s':>8} {'cpu s':>8} {'var/s':>8} {'MP/s':>8} {'RSS MB':>8} {'vs base':>8}")
+    for name, result in results.items():
+        for stage_name, s in result["stages"].items():
+            old = base_results.get(name, {}).get("stages", {}).get(stage_name, {}).get("wall_s")
+            delta = f"{(s['wall_s'] - old) / old:+.0%}" if old else ""
+            print(f"  {name:<24} {stage_name:<8} {s['wall_s']:>8.3f} {s['cpu_s']:>8.3f} "
+                  f"{s.get('variants_per_s', ''):>8} {s.get('mp_per_s', ''):>8} {s['peak_rss_mb'] or '':>8} {delta:>8}")
+
+def main():
+    from libs.corpus import KINDS, SIZES_MP
+
+    parser = argparse.ArgumentParser(description="Image Compression Analyzer benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES_MP,
+                       help=f"Corpus image sizes in megapixels (default {SIZES_MP})")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS,
+                       help="Corpus image kinds (default: all)")
+    parser.add_argument("--seed", type=int, default=0,
+                       help="Corpus seed (default 0)")
+    parser.add_argument("--work-dir", default="benchmarks",
+                       help="Folder for the corpus, scratch runs and results (default 'benchmarks')")
+    parser.add_argument("--steps", type=int, default=4,
+                       help="Number of quality steps (default 4)")
+    parser.add_argument("--formats", nargs="+", default=["webp", "jpeg"],
+                       help="Formats to test (default webp jpeg)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                       help="Number of parallel encode/analysis workers (default: CPU count)")
+    parser.add_argument("--encoder-backend", choices=["pillow", "cli"], default="pillow",
+                       help="Encoder backend (default pillow)")
+    parser.add_argument("--metrics-engine", choices=["numpy", "tiled", "magick"], default="numpy",
+                       help="Metrics engine (default numpy)")
+    parser.add_argument("--charts", choices=["svg", "js"], default="svg",
+                       help="Chart mode of the report (default svg)")
+    parser.add_argument("--repeat", type=int, default=1,
+                       help="Runs per image; the fastest is kept (default 1)")
+    parser.add_argument("--baseline",
+                       help="Baseline file (default <work-dir>/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true",
+                       help="Store this run as the new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                       help="Allowed relative slowdown per stage before failing (default 0.15)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25,
+                       help="Allowed relative peak RSS growth per stage before failing (default 0.25)")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                       help="Slowdowns smaller than this many seconds never fail (default 0.05)")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                       help="Increase verbosity")
+
+    args = parser.parse_args()
+    setup_logging(args.verbose)
+
+    from libs.compressor import MAX_STEPS, resolve_backend
+    from libs.corpus import generate_corpus
+
+    if not 1 <= args.steps <= MAX_STEPS:
+        parser.error(f"--steps must be between 1 and {MAX_STEPS}")
+
+    settings = {
+        "sizes": args.sizes,
+        "kinds": args.kinds,
+        "seed": args.seed,
+        "steps": args.steps,
+        "formats": args.formats,
+        "jobs": args.jobs,
+        "backend": resolve_backend(args.encoder_backend, args.formats),
+        "engine": args.metrics_engine,
+        "charts": args.charts,
+        "repeat": max(1, args.repeat),
+    }
+    baseline_path = args.baseline or os.path.join(args.work_dir, "baseline.json")
+
+    print(f"Generating corpus ({len(args.kinds)} kinds x {args.sizes} MP, seed {args.seed})")
+    images = generate_corpus(os.path.join(args.work_dir, "corpus"), args.kinds, args.sizes, args.seed)
+
+    print(f"Benchmarking {len(images)} images")
+    results = run_benchmarks(images, dict(settings, verbosity=args.verbose), args.work_dir)
+
+    report = {"version": BASELINE_VERSION, "environment": environment(), "settings": settings, "results": results}
+    results_path = os.path.join(args.work_dir, "results.json")
+    with open(results_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        print_results(results)
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print_results(results)
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to record one. Results: {results_path}")
+        return 0
+
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    print_results(results, baseline)
+
+    regressions = compare(results, baseline, settings, args)
+    if not regressions:
+        print(f"\nNo regressions against {baseline_path}. Results: {results_path}")
+        return 0
+
+    print(f"\n{len(regressions)} regression(s) against {baseline_path}:")
+    for name, stage_name, key, old, new, change in regressions:
+        print(f"  {name} {stage_name} {key}: {old} -> {new} ({change:+.0%})")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
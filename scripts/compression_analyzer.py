@@ -2,14 +2,12 @@
 # Script Name: compression_analyzer.py
 # Description: Main entry point for the Image Compression Analysis Tool.
 #              Orchestrates compression, analysis, and report generation.
-# Usage:       python compression_analyzer.py <image_path> [options]
+# Usage:       python compression_analyzer.py <image_path|dir|glob> [...] [options]
 # ==============================================================================
 
 import argparse
 import os
 import logging
-import datetime
-import shutil
 import json
 import sys
 
@@ -18,9 +16,10 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 
-from libs.compressor import run_compressions
-from libs.analyzer import analyze_results
-from libs.reporter import generate_report
+# Only light modules here: --help and bad input paths should answer at once.
+# The pipeline (NumPy, Pillow, SQLite, ...) is imported by load_pipeline().
+from libs.profiling import ImportProfiler
+from libs.workspace import create_workspace, find_images
 
 CONFIG_FILE = "config.json"
 
@@ -30,7 +29,23 @@ def load_config():
         "steps": 10,
         "formats": ["webp", "jpeg"],
         "report_root": ".",
-        "verbosity": 0
+        "verbosity": 0,
+        "jobs": None,
+        "metrics_engine": "numpy",
+        "max_open_images": 2,
+        "cache_dir": None,
+        "cache_max_mb": 2048,
+        "encoder_backend": "cli",
+        "diff_max_size": 0,
+        "charts": "svg",
+        "report_performance": False,
+        "tool_timeout": 600,
+        "tile_budget_mb": 256,
+        "memory_budget_mb": None,
+        "sampling": "grid",
+        "max_encodes": None,
+        "refine_tolerance": 0.05,
+        "decode_repeats": 5
     }
     
     # Check if config file exists relative to script
@@ -60,19 +75,95 @@ def setup_logging(verbosity):
         datefmt='%H:%M:%S'
     )
 
+def load_pipeline(profile=False):
+    """Imports the heavy pipeline modules; with profile, prints per-module import times."""
+    with ImportProfiler(enabled=profile) as profiler:
+        import libs.cache
+        import libs.compressor
+        import libs.reporter
+        import libs.scheduler
+        import libs.search
+    if profile:
+        profiler.report()
+
 def main():
     config = load_config()
     
     parser = argparse.ArgumentParser(description="Image Compression Analyzer")
-    parser.add_argument("image", help="Path to the input image file")
+    parser.add_argument("inputs", nargs="*",
+                       help="Input image file(s), directories or glob patterns")
+    parser.add_argument("--manifest",
+                       help="Text file listing one input (file, directory or glob) per line")
     
     # Use config values as defaults
     parser.add_argument("--steps", type=int, default=config["steps"], 
                        help=f"Number of quality steps (default {config['steps']})")
+    parser.add_argument("--sampling", choices=["grid", "adaptive"], default=config["sampling"],
+                       help="Sweep an even grid of --steps qualities, or start coarse and add qualities only "
+                            f"where size or quality still changes a lot (default {config['sampling']})")
+    parser.add_argument("--max-encodes", type=int, default=config["max_encodes"],
+                       help="Adaptive sampling: lossy encodes per format at most "
+                            "(default: as many as the --steps grid)")
+    parser.add_argument("--refine-tolerance", type=float, default=config["refine_tolerance"],
+                       help="Adaptive sampling: split a quality interval while it holds more than this share "
+                            f"of the curve's total size or quality change (default {config['refine_tolerance']})")
     parser.add_argument("--formats", nargs="+", default=config["formats"], 
                        help=f"Formats to test (default {config['formats']})")
     parser.add_argument("--report-root", default=config["report_root"],
                        help=f"Root directory for reports (default '{config['report_root']}')")
+    parser.add_argument("--jobs", type=int, default=config["jobs"] or os.cpu_count(),
+                       help="Number of parallel encode/analysis workers (default: CPU count)")
+    parser.add_argument("--max-open-images", type=int, default=config["max_open_images"],
+                       help=f"Batch mode: images in flight at once (default {config['max_open_images']})")
+    parser.add_argument("--metrics-engine", choices=["numpy", "tiled", "magick"], default=config["metrics_engine"],
+                       help="Compute metrics in-process with NumPy, in-process in row bands within "
+                            "--tile-budget-mb (for gigapixel sources), or via 'magick compare' "
+                            f"(default {config['metrics_engine']})")
+    parser.add_argument("--tile-budget-mb", type=int, default=config["tile_budget_mb"],
+                       help="Tiled engine: working memory per analysis worker in MiB for the row bands, "
+                            "on top of one whole 8-bit decode of the JPEG/WebP variant being measured "
+                            f"(default {config['tile_budget_mb']})")
+    parser.add_argument("--decode-repeats", type=int, default=config["decode_repeats"],
+                       help="Time this many in-process decodes of each variant and report the median "
+                            f"decode time and MP/s, 0 to skip (default {config['decode_repeats']})")
+    parser.add_argument("--encoder-backend", choices=["pillow", "cli"], default=config["encoder_backend"],
+                       help="Encode in-process with Pillow or via cwebp/magick subprocesses "
+                            f"(default {config['encoder_backend']})")
+    parser.add_argument("--report-performance", action="store_true", default=config["report_performance"],
+                       help="Add a 'Run performance' section (per-stage timings) to the HTML report")
+    parser.add_argument("--diff-max-size", type=int, default=config["diff_max_size"],
+                       help="Downscale diff maps so the longest edge is at most this many pixels "
+                            "(default: full resolution; 8192 for the tiled engine; in-process engines only)")
+    parser.add_argument("--charts", choices=["svg", "js"], default=config["charts"],
+                       help="Pre-render matplotlib SVG charts, or draw them in the browser from data "
+                            f"embedded in the report (default {config['charts']})")
+    parser.add_argument("--tool-timeout", type=float, default=config["tool_timeout"],
+                       help="Kill a cwebp/magick call that runs longer than this many seconds, 0 to never "
+                            f"(default {config['tool_timeout']})")
+    parser.add_argument("--target", metavar="METRIC=VALUE",
+                       help="Search each format for the smallest file meeting a threshold "
+                            "(e.g. SSIM=0.98) instead of sweeping --steps")
+    parser.add_argument("--cache-dir", default=config["cache_dir"],
+                       help="Result cache folder (default: <report-root>/.cache)")
+    parser.add_argument("--cache-max-mb", type=int, default=config["cache_max_mb"],
+                       help=f"Evict least recently used cache entries above this size (default {config['cache_max_mb']})")
+    parser.add_argument("--memory-budget", type=int, metavar="MB", default=config["memory_budget_mb"],
+                       help="Only start encodes/comparisons while their estimated peak memory fits this many "
+                            "MiB, so huge images run fewer at a time (default: 75%% of RAM; 0 for no limit)")
+    parser.add_argument("--resume", action="store_true",
+                       help="Continue interrupted runs: reuse each image's latest output folder for the same "
+                            "settings and redo only the variants its journal does not show as finished")
+    parser.add_argument("--no-cache", action="store_true",
+                       help="Re-encode and re-measure everything, ignoring the result cache")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                       help="Run as a service: keep the workers warm and accept jobs over HTTP on this port")
+    parser.add_argument("--host", default="127.0.0.1",
+                       help="Address the service binds to (default 127.0.0.1)")
+    parser.add_argument("--server", metavar="URL",
+                       help="Send the inputs to a running service (e.g. http://127.0.0.1:8765) instead of "
+                            "analyzing them here")
+    parser.add_argument("--profile-startup", action="store_true",
+                       help="Print how long each module takes to import")
     parser.add_argument("-v", "--verbose", action="count", default=config["verbosity"], 
                        help="Increase verbosity")
     
@@ -80,51 +171,170 @@ def main():
     setup_logging(args.verbose)
     logger = logging.getLogger("Main")
 
-    if not os.path.exists(args.image):
-        logger.error(f"Input file not found: {args.image}")
+    if args.serve is None and not args.inputs and not args.manifest:
+        parser.error("at least one input image, directory, glob or --manifest is required")
+    # Same bounds as quality_steps (compressor.MAX_STEPS), checked before anything is imported
+    if not 1 <= args.steps <= 100:
+        parser.error("--steps must be between 1 and 100")
+
+    images = find_images(args.inputs, args.manifest) if args.serve is None else []
+    if args.serve is None and not images:
+        logger.error("No input images found.")
+        return 1
+
+    if args.server:
+        return run_remote(images, args, logger)
+
+    load_pipeline(profile=args.profile_startup)
+    from libs.analyzer import configure_decode_benchmark, configure_tiling
+    from libs.cache import ResultCache
+    from libs.compressor import resolve_backend
+    from libs.runner import configure_runner
+    from libs.search import parse_target
+
+    # At most --jobs external tools at once, whichever threads start them
+    configure_runner(max_processes=args.jobs, timeout=args.tool_timeout)
+    configure_tiling(args.tile_budget_mb)
+    configure_decode_benchmark(args.decode_repeats)
+    args.encoder_backend = resolve_backend(args.encoder_backend, args.formats)
+
+    cache = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir or os.path.join(args.report_root, ".cache")
+        cache = ResultCache(cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+
+    if args.max_encodes is not None and args.max_encodes < 2:
+        parser.error("--max-encodes must be at least 2")
+
+    if args.serve is not None:
+        run_service(args, cache)
         return
 
-    # Determine Output Directory Name
-    filename = os.path.basename(args.image)
-    image_name_no_ext, ext = os.path.splitext(filename)
-    
-    # Base output path
-    report_root = os.path.abspath(args.report_root)
-    base_output_dir = os.path.join(report_root, image_name_no_ext)
-    
-    # If folder exists, append timestamp
-    if os.path.exists(base_output_dir):
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_output_dir = f"{base_output_dir}_{timestamp}"
-    
-    dirs = {
-        "root": base_output_dir,
-        "images": os.path.join(base_output_dir, "images"),
-        "diffs": os.path.join(base_output_dir, "diffs"),
-        "data": os.path.join(base_output_dir, "data"),
-        "report": os.path.join(base_output_dir, ".") # Report at root of project folder
-    }
+    if args.target:
+        try:
+            parse_target(args.target)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.resume:
+            logger.warning("--resume applies to quality sweeps; target searches start over")
+        if args.sampling != "grid":
+            logger.warning("--sampling applies to quality sweeps; target searches bisect instead")
+        run_target(images, args, logger, cache)
+        return
 
-    for d in dirs.values():
-        os.makedirs(d, exist_ok=True)
+    return run_images(images, args, logger, cache, batch=len(images) > 1 or bool(args.manifest))
 
-    # Copy original using its ACTUAL filename, not "original.ext"
-    original_copy = os.path.join(dirs["images"], filename)
-    shutil.copy(args.image, original_copy)
+def run_images(images, args, logger, cache=None, batch=False):
+    """
+    Streams every variant of every image through encode -> measure ->
+    row-append on one shared worker pool. Batch runs also get a corpus summary.
+    Returns the exit code: 1 if any image failed.
+    """
+    from libs.scheduler import write_corpus_summary
 
-    logger.info(f"Starting analysis for {args.image}")
-    logger.info(f"Output directory: {base_output_dir}")
+    if batch:
+        logger.info(f"Batch mode: {len(images)} images, {args.jobs} workers")
+    else:
+        logger.info(f"Starting analysis for {images[0]}")
 
-    # 1. Compress
-    compressed_files = run_compressions(original_copy, dirs["images"], args.formats, args.steps)
-    
-    # 2. Analyze
-    metrics_csv = analyze_results(original_copy, compressed_files, dirs["diffs"], dirs["data"])
-    
-    # 3. Report
-    generate_report(original_copy, metrics_csv, dirs["report"], dirs["root"])
+    summary = make_scheduler(args, cache).run(images)
+
+    failed = [i["image"] for i in summary.images if i["status"] != "ok"]
+    for path in failed:
+        logger.error(f"Failed: {path}")
+
+    if batch:
+        summary_path = write_corpus_summary(summary, args.report_root)
+        logger.info(f"Processed {len(summary.images) - len(failed)}/{len(images)} images. Summary: {summary_path}")
+    else:
+        logger.info(f"Output directory: {summary.images[0]['output_dir']}")
+        logger.info("Processing complete." if not failed else "Processing failed.")
+    return 1 if failed else 0
+
+def memory_budget_mb(args):
+    from libs.budget import default_budget_mb
+
+    if args.memory_budget is None:
+        return default_budget_mb()
+    return args.memory_budget
+
+def make_scheduler(args, cache=None, aggregate=True):
+    from libs.scheduler import BatchScheduler
+
+    return BatchScheduler(args.formats, args.steps, args.report_root, jobs=args.jobs,
+                          engine=args.metrics_engine, max_open_images=args.max_open_images,
+                          cache=cache, backend=args.encoder_backend, diff_max_size=args.diff_max_size,
+                          charts=args.charts, report_performance=args.report_performance,
+                          resume=args.resume, memory_budget_mb=memory_budget_mb(args),
+                          sampling=args.sampling, max_encodes=args.max_encodes,
+                          refine_tolerance=args.refine_tolerance, aggregate=aggregate)
+
+def run_service(args, cache=None):
+    """Daemon mode: one warm scheduler serving jobs until interrupted."""
+    from libs.service import serve
+
+    # No corpus summary: it would keep every job's rows for the life of the service
+    serve(make_scheduler(args, cache, aggregate=False), args.serve, args.host)
+
+def run_remote(images, args, logger):
+    """
+    Client mode: runs each image on the service at args.server and prints
+    its progress. Images are sent concurrently; the service queues them.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from urllib.error import URLError
+    from libs.service import submit_job
+
+    def run_one(image):
+        name = os.path.basename(image)
+        try:
+            for event in submit_job(args.server, image, args.formats, args.steps):
+                kind = event["event"]
+                if kind == "accepted" and event.get("deduplicated"):
+                    logger.info(f"{name}: joined job {event['job']} already running on the service")
+                elif kind == "variant":
+                    logger.info(f"{name}: {event['filename']} {event['size_kb']} KB")
+                elif kind == "variant_failed":
+                    logger.error(f"{name}: {event['filename']} failed: {event['error']}")
+                elif kind == "finished":
+                    print(f"{name}: {event['status']}, {event.get('variants', 0)} variants -> {event.get('output_dir')}")
+                    return event["status"] == "ok"
+        except (URLError, OSError, ValueError) as e:
+            logger.error(f"{name}: service request failed: {e}")
+        return False
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(images), args.max_open_images * 2))) as pool:
+        results = list(pool.map(run_one, images))
+    if not all(results):
+        logger.error(f"{results.count(False)} of {len(images)} images failed")
+        return 1
+    return 0
+
+def run_target(images, args, logger, cache=None):
+    """Target-quality mode: bisects the quality axis per format for every image."""
+    from libs.profiling import RunProfile
+    from libs.reporter import generate_report
+    from libs.search import run_target_search
+
+    for image in images:
+        dirs, original_copy = create_workspace(image, args.report_root)
+        logger.info(f"Searching {args.formats} for {args.target} on {image}")
+        logger.info(f"Output directory: {dirs['root']}")
+
+        profile = RunProfile(image)
+        metrics_path, results = profile.bind(run_target_search)(
+            original_copy, dirs, args.formats, args.target, engine=args.metrics_engine, jobs=args.jobs,
+            cache=cache, backend=args.encoder_backend, diff_max_size=args.diff_max_size)
+        profile.bind(generate_report)(original_copy, metrics_path, dirs["report"], dirs["root"], cache=cache,
+                                      charts=args.charts, profile=profile if args.report_performance else None)
+        profile.write(os.path.join(dirs["data"], "profile.json"))
 
-    logger.info("Processing complete.")
+        print(f"\n{os.path.basename(image)}: smallest setting meeting {args.target}")
+        for r in results:
+            if r["met"]:
+                print(f"  {r['format']:<6} q{r['quality']:<4} {r['size_kb']:>10} KB  ({r['value']:.4f}, {r['encodes']} encodes)")
+            else:
+                print(f"  {r['format']:<6} not reachable ({r['encodes']} encodes)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -6,7 +6,7 @@
 .DESCRIPTION
     1. Checks for Python and ImageMagick (installs via Winget if missing).
     2. Checks for cwebp. If missing, downloads local copy and adds to session PATH.
-    3. Installs Python requirements (matplotlib).
+    3. Installs Python requirements (matplotlib, numpy, pillow).
 #>
 
 # ==========================================
@@ -120,7 +120,7 @@ else {
 # -----------------------------------------------------------------------------
 Write-Host "`n[4/4] Installing Python Dependencies..."
 try {
-    pip install matplotlib
+    pip install matplotlib numpy pillow
     Write-Host "Dependencies installed." -ForegroundColor Green
 } catch {
     Write-Error "Failed to install pip packages. Ensure Python is in your PATH."
@@ -12,7 +12,7 @@ python3 -m venv venv
 source venv/bin/activate
 
 echo "Installing Python Dependencies..."
-pip install matplotlib
+pip install matplotlib numpy pillow
 
 echo "Installation Complete."
 echo "To run: source venv/bin/activate && python compression_analyzer.py <image>"
\ No newline at end of file
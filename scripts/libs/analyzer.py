@@ -5,20 +5,81 @@
 # Note:        This is a library file. Do not run directly.
 # ==============================================================================
 
-import subprocess
 import os
+import io
 import logging
 import csv
-import re
 import json
 import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from libs.cache import make_key
+    from libs.journal import append_line
+    from libs.probe import read_details
+    from libs.profiling import stage
+    from libs.runner import run_command, run_commands
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from libs.cache import make_key
+    from libs.journal import append_line
+    from libs.probe import read_details
+    from libs.profiling import stage
+    from libs.runner import run_command, run_commands
+
+try:
+    from libs import metrics as metrics_engine
+except ImportError:
+    # NumPy / Pillow not installed: fall back to magick compare for metrics
+    metrics_engine = None
+
+try:
+    from libs import store as metrics_store
+except ImportError:
+    # NumPy not installed: metrics.csv is the only output
+    metrics_store = None
+
+try:
+    from libs import pillow_backend
+except ImportError:
+    # Pillow not installed: no decode benchmark
+    pillow_backend = None
 
 logger = logging.getLogger("Analyzer")
 
+STANDARD_FIELDS = ["filename", "format", "quality", "params", "size_kb", "relative_path", "diff_path", "details"]
+
+METRICS_MAP = {
+    "MAE": "MAE",       
+    "RMSE": "RMSE",     
+    "PSNR": "PSNR",     
+    "SSIM": "SSIM",     
+    "NCC": "NCC"        
+}
+
+# Engines that measure in-process against a decoded reference (libs.metrics)
+IN_PROCESS_ENGINES = ("numpy", "tiled")
+
+# Working memory per analysis worker for the tiled engine (see configure_tiling)
+tile_budget_mb = 256
+
+# Timed decodes per variant for the decode benchmark, 0 to skip it (see configure_decode_benchmark)
+decode_repeats = 5
+
+# Encode times run_task adds to each entry, copied into its row
+ENCODE_TIMING_FIELDS = ["encode_ms", "encode_cpu_ms"]
+
 def get_image_details(path):
     """
-    Uses ImageMagick identify to get image attributes.
+    Returns image attributes as a JSON string. JPEG, PNG and WebP are read
+    from the file header; other formats go through ImageMagick identify.
     """
+    with stage("identify", os.path.basename(path)):
+        info = read_details(path)
+    if info is not None:
+        return json.dumps(info)
+
     try:
         # Get basic info: Width, Height, BitDepth, Colorspace, Format
         cmd = [
@@ -27,7 +88,8 @@ def get_image_details(path):
             '{"width": %w, "height": %h, "depth": %z, "colorspace": "%[colorspace]", "format": "%m"}',
             path
         ]
-        res = subprocess.run(cmd, capture_output=True, text=True)
+        with stage("identify", os.path.basename(path)):
+            res = run_command(cmd, capture_output=True, text=True)
         return res.stdout.strip()
     except Exception as e:
         logger.error(f"Failed to identify {path}: {e}")
@@ -69,97 +131,370 @@ def parse_magick_output(output, metric_name):
             
     return data
 
-def analyze_results(original_path, generated_files, diff_dir, data_dir):
+def magick_metrics(original_path, comp_path, filename):
     """
-    Compares generated images against original using ImageMagick.
-    Generates difference images and a CSV of metrics.
+    Collects numeric metrics with one 'magick compare -verbose' call per
+    metric. The calls are independent, so they run concurrently.
     """
-    metrics_map = {
-        "MAE": "MAE",       
-        "RMSE": "RMSE",     
-        "PSNR": "PSNR",     
-        "SSIM": "SSIM",     
-        "NCC": "NCC"        
-    }
+    data = {}
+    cmds = [["magick", "compare", "-verbose", "-metric", metric_arg, original_path, comp_path, "null:"]
+            for metric_arg in METRICS_MAP.values()]
+    with stage("compare", filename):
+        results = run_commands(cmds, capture_output=True, text=True)
 
-    csv_path = os.path.join(data_dir, "metrics.csv")
+    for metric_name, res in zip(METRICS_MAP, results):
+        try:
+            if isinstance(res, BaseException):
+                raise res
+            metric_data = parse_magick_output(res.stderr, metric_name)
+            
+            if not metric_data:
+                val_str = res.stderr.strip().split(' ')[0]
+                if "inf" in val_str.lower(): val = 999.0
+                else: val = float(val_str) if val_str else 0.0
+                metric_data = {metric_name: val}
+            
+            data.update(metric_data)
+            
+        except Exception as e:
+            logger.warning(f"Failed to calc {metric_name} for {filename}: {e}")
+    return data
+
+def magick_diff(original_path, comp_path, diff_path):
+    """Writes the difference image with 'magick compare'. Returns True on success."""
+    diff_cmd = [
+        "magick", "compare", 
+        "-metric", "AE", 
+        "-fuzz", "5%",      
+        original_path, comp_path, 
+        "-compose", "src",  
+        diff_path
+    ]
+    with stage("diff", os.path.basename(comp_path)):
+        run_command(diff_cmd, capture_output=True)
+    return os.path.exists(diff_path)
+
+def collect_metrics(original_path, comp_path, filename, engine, reference=None, diff_path=None, diff_max_size=0):
+    """
+    Returns (metrics, diff_written) for one variant, metrics keyed like parse_magick_output.
+    The 'numpy' and 'tiled' engines compare against the cached reference and
+    draw the diff map (if diff_path is given) from the same pass; 'magick'
+    shells out and leaves the diff to the caller.
+    """
+    if isinstance(reference, LazyReference):
+        reference = reference.get()
+    if engine in IN_PROCESS_ENGINES and reference is not None:
+        try:
+            # One decode yields every metric and the diff map, so they share a stage
+            with stage("metrics", filename):
+                return reference.compare(comp_path, diff_path, diff_max_size), diff_path is not None
+        except Exception as e:
+            logger.warning(f"In-process metrics failed for {filename}, using magick: {e}")
+    return magick_metrics(original_path, comp_path, filename), False
+
+def analysis_cache_key(cache, source_hash, comp_path, engine, diff_max_size=0):
+    """Keys an analysis on (source hash, variant hash, metrics engine + version, diff size)."""
+    if engine in IN_PROCESS_ENGINES and metrics_engine is not None:
+        version = f"{engine}-{metrics_engine.ENGINE_VERSION}"
+    else:
+        engine, version = "magick", cache.tool_version("magick")
+    # magick still draws the diff whenever the in-process engine cannot
+    return make_key("analysis", source_hash, cache.file_hash(comp_path), engine, version,
+                    cache.tool_version("magick"), diff_max_size)
+
+def pending_analysis(generated_files, engine, cache=None, source_hash=None, diff_max_size=0):
+    """Returns the generated files that have no cached analysis yet."""
+    if cache is None or source_hash is None:
+        return list(generated_files)
+    return [item for item in generated_files
+            if not cache.has(analysis_cache_key(cache, source_hash, item['path'], engine, diff_max_size))]
+
+def analyze_variant(item, original_path, diff_dir, data_dir, engine, reference=None,
+                    cache=None, source_hash=None, diff_max_size=0):
+    """
+    Measures one generated file. Returns its metrics.csv row.
+    The in-process engines draw the diff map from the pass that measures, so
+    each variant is decoded once; `diff_max_size` caps the diff's longest edge.
+    With a ResultCache, a previously measured identical variant is restored
+    (metrics, details and diff image) without spawning any process.
+    The row also carries the variant's encode times (from `item`) and its
+    decode benchmark; a cached variant keeps the decode times measured then.
+    """
+    comp_path = item['path']
+    filename = os.path.basename(comp_path)
     
-    all_rows = []
-    all_keys = set([
-        "filename", "format", "quality", "params", 
-        "size_kb", "relative_path", "diff_path", "details"
-    ])
-
-    for item in generated_files:
-        comp_path = item['path']
-        filename = os.path.basename(comp_path)
-        
-        logger.info(f"Analyzing {filename}...")
-        
-        row = {
-            "filename": filename,
-            "format": item['format'],
-            "quality": item['quality'],
-            "params": item['params'],
-            "size_kb": round(os.path.getsize(comp_path) / 1024, 2),
-            "relative_path": os.path.relpath(comp_path, os.path.dirname(data_dir)),
-            "details": get_image_details(comp_path)
-        }
-
-        # 1. Generate Difference Image (Visual)
-        diff_name = f"diff_{filename}"
-        diff_path = os.path.join(diff_dir, diff_name)
-        
-        diff_cmd = [
-            "magick", "compare", 
-            "-metric", "AE", 
-            "-fuzz", "5%",      
-            original_path, comp_path, 
-            "-compose", "src",  
-            diff_path
-        ]
-        
+    row = {
+        "filename": filename,
+        "format": item['format'],
+        "quality": item['quality'],
+        "params": item['params'],
+        "size_kb": round(os.path.getsize(comp_path) / 1024, 2),
+        "relative_path": os.path.relpath(comp_path, os.path.dirname(data_dir)),
+    }
+    row.update({k: item[k] for k in ENCODE_TIMING_FIELDS if item.get(k) is not None})
+
+    diff_name = f"diff_{filename}"
+    diff_path = os.path.join(diff_dir, diff_name)
+
+    key = None
+    if cache is not None and source_hash is not None:
+        key = analysis_cache_key(cache, source_hash, comp_path, engine, diff_max_size)
+        with stage("cache_restore", filename):
+            cached = cache.get_json(key)
+            hit = cached is not None and (not cached["diff"] or cache.get_file(make_key(key, "diff"), diff_path))
+        if hit:
+            logger.info(f"Analyzing {filename}... (cached)")
+            row["details"] = cached["details"]
+            row["diff_path"] = os.path.relpath(diff_path, os.path.dirname(data_dir)) if cached["diff"] else ""
+            row.update(cached["metrics"])
+            if decode_repeats:
+                row.update(cached.get("decode") or decode_timing(comp_path))
+            return row
+
+    logger.info(f"Analyzing {filename}...")
+    row["details"] = get_image_details(comp_path)
+
+    # 1. Collect Numeric Metrics (and the diff map, in-process)
+    metric_data, has_diff = collect_metrics(original_path, comp_path, filename, engine, reference,
+                                            diff_path, diff_max_size)
+    row.update(metric_data)
+    decode = decode_timing(comp_path)
+    row.update(decode)
+
+    # 2. Generate Difference Image (Visual) if the metrics pass did not
+    if not has_diff:
         try:
-            subprocess.run(diff_cmd, capture_output=True)
-            row["diff_path"] = os.path.relpath(diff_path, os.path.dirname(data_dir))
+            has_diff = magick_diff(original_path, comp_path, diff_path)
         except Exception as e:
             logger.error(f"Error creating diff image for {filename}: {e}")
-            row["diff_path"] = ""
+    row["diff_path"] = os.path.relpath(diff_path, os.path.dirname(data_dir)) if has_diff else ""
 
-        # 2. Collect Numeric Metrics (Verbose)
-        for metric_name, metric_arg in metrics_map.items():
-            cmd = ["magick", "compare", "-verbose", "-metric", metric_arg, original_path, comp_path, "null:"]
-            
-            try:
-                res = subprocess.run(cmd, capture_output=True, text=True)
-                metric_data = parse_magick_output(res.stderr, metric_name)
-                
-                if not metric_data:
-                    val_str = res.stderr.strip().split(' ')[0]
-                    if "inf" in val_str.lower(): val = 999.0
-                    else: val = float(val_str) if val_str else 0.0
-                    metric_data = {metric_name: val}
-                
-                row.update(metric_data)
-                all_keys.update(metric_data.keys())
-                
-            except Exception as e:
-                logger.warning(f"Failed to calc {metric_name} for {filename}: {e}")
-
-        all_rows.append(row)
-
-    # Write CSV
-    standard_fields = ["filename", "format", "quality", "params", "size_kb", "relative_path", "diff_path", "details"]
-    metric_fields = sorted([k for k in all_keys if k not in standard_fields])
-    fieldnames = standard_fields + metric_fields
-
-    with open(csv_path, 'w', newline='') as csvfile:
+    if key is not None and metric_data:
+        if has_diff:
+            cache.put_file(make_key(key, "diff"), diff_path, "diff")
+        cache.put_json(key, {"details": row["details"], "metrics": metric_data, "diff": has_diff,
+                             "decode": decode}, "analysis")
+    return row
+
+def metrics_fieldnames(rows):
+    """Standard columns first, then metric columns sorted."""
+    all_keys = set(STANDARD_FIELDS)
+    for row in rows:
+        all_keys.update(row.keys())
+    return STANDARD_FIELDS + sorted(k for k in all_keys if k not in STANDARD_FIELDS)
+
+def write_metrics_csv(csv_path, rows):
+    """
+    Writes metrics rows: standard columns first, then metric columns sorted.
+    The file is replaced atomically, so a crash never leaves it half written.
+    """
+    fieldnames = metrics_fieldnames(rows)
+
+    tmp_path = f"{csv_path}.tmp"
+    with open(tmp_path, 'w', newline='') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
-        writer.writerows(all_rows)
-            
+        writer.writerows(rows)
+    os.replace(tmp_path, csv_path)
     return csv_path
 
+def write_metrics(csv_path, rows):
+    """
+    Writes metrics.csv and, with NumPy available, the typed columnar store
+    (metrics.npz) next to it. Returns the path reports should read: the
+    store if it was written, else the CSV.
+    """
+    write_metrics_csv(csv_path, rows)
+    if metrics_store is None:
+        return csv_path
+    return metrics_store.write_metrics_store(metrics_store.store_path(csv_path), rows, metrics_fieldnames(rows))
+
+class MetricsWriter:
+    """
+    Appends rows to metrics.csv as soon as each variant is measured, so
+    progress is visible on disk during a run. The header comes from the
+    first row. Each row goes out as one atomic, fsynced append (see
+    journal.append_line), so a crash never leaves a torn row behind.
+    finalize() rewrites the file in variant order with the complete header.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.rows = {}
+        self._fieldnames = None
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def _line(self, row=None):
+        """One CSV line: the row, or the header."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=self._fieldnames, extrasaction='ignore')
+        if row is None:
+            writer.writeheader()
+        else:
+            writer.writerow(row)
+        return buffer.getvalue()
+
+    def restore(self, rows):
+        """
+        Starts from rows kept by --resume ({idx: row}). metrics.csv is
+        rewritten with just those rows, dropping anything a crash left behind.
+        """
+        with self._lock:
+            self.rows = dict(rows)
+            if rows:
+                ordered = [rows[i] for i in sorted(rows)]
+                self._fieldnames = metrics_fieldnames(ordered)
+                write_metrics_csv(self.csv_path, ordered)
+                self._fd = os.open(self.csv_path, os.O_WRONLY | os.O_APPEND)
+
+    def append(self, idx, row):
+        with self._lock:
+            self.rows[idx] = row
+            if self._fd is None:
+                metric_fields = sorted(k for k in row if k not in STANDARD_FIELDS)
+                self._fieldnames = STANDARD_FIELDS + metric_fields
+                self._fd = os.open(self.csv_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_TRUNC, 0o644)
+                append_line(self._fd, self._line())
+            append_line(self._fd, self._line(row))
+
+    def finalize(self):
+        """
+        Closes the stream and writes the ordered CSV and the columnar store.
+        Returns (metrics_path, rows), metrics_path as from write_metrics().
+        """
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            rows = [self.rows[i] for i in sorted(self.rows)]
+        return write_metrics(self.csv_path, rows), rows
+
+class LazyReference:
+    """
+    Decodes the original on first use (thread-safe), so a run where every
+    variant is served from the cache never decodes it at all.
+    """
+
+    def __init__(self, original_path, engine):
+        self.original_path = original_path
+        self.engine = engine
+        self._reference = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if not self._loaded:
+                with stage("decode_reference"):
+                    self._reference = load_reference(self.original_path, self.engine)
+                self._loaded = True
+            return self._reference
+
+    def close(self):
+        with self._lock:
+            if self._reference is not None:
+                self._reference.close()
+                self._reference = None
+
+# Per-process state for analysis workers (set by _init_worker)
+_worker_reference = None
+
+def _init_worker(handle):
+    global _worker_reference
+    if handle is not None:
+        _worker_reference = metrics_engine.attach_reference(handle)
+
+def _analyze_in_worker(item, original_path, diff_dir, data_dir, engine, cache, source_hash, diff_max_size):
+    return analyze_variant(item, original_path, diff_dir, data_dir, engine, _worker_reference,
+                           cache, source_hash, diff_max_size)
+
+def configure_decode_benchmark(repeats):
+    """Sets how many timed decodes the decode benchmark takes per variant; 0 turns it off."""
+    global decode_repeats
+    decode_repeats = max(0, repeats)
+
+def decode_timing(comp_path):
+    """
+    Median in-process decode time (`decode_ms`) and throughput in
+    megapixels per second (`decode_mps`) of a variant, or {} if skipped.
+    """
+    if not decode_repeats or pillow_backend is None:
+        return {}
+    filename = os.path.basename(comp_path)
+    try:
+        with stage("decode_benchmark", filename):
+            seconds, pixels = pillow_backend.decode_benchmark(comp_path, decode_repeats)
+    except Exception as e:
+        logger.warning(f"Could not time decoding {filename}: {e}")
+        return {}
+    return {"decode_ms": round(seconds * 1000, 3),
+            "decode_mps": round(pixels / seconds / 1e6, 3) if seconds > 0 else None}
+
+def configure_tiling(budget_mb):
+    """Sets the tiled engine's working memory per worker, in MiB (call before analysis starts)."""
+    global tile_budget_mb
+    tile_budget_mb = max(1, budget_mb)
+
+def load_reference(original_path, engine, shared=False):
+    """
+    Decodes the original once for the in-process engines. Returns None if
+    unavailable. A tiled reference lives in files, so it is always shareable.
+    """
+    if engine not in IN_PROCESS_ENGINES:
+        return None
+    if metrics_engine is None:
+        logger.warning("NumPy/Pillow not available, falling back to magick compare for metrics")
+        return None
+    try:
+        if engine == "tiled":
+            return metrics_engine.TiledReference.load(original_path, budget_mb=tile_budget_mb)
+        return metrics_engine.ReferenceImage.load(original_path, shared=shared)
+    except Exception as e:
+        logger.warning(f"Could not decode {original_path} in-process, using magick compare: {e}")
+        return None
+
+def analyze_results(original_path, generated_files, diff_dir, data_dir, engine="numpy", jobs=1, cache=None,
+                    diff_max_size=0):
+    """
+    Compares generated images against original.
+    Generates difference images and a CSV of metrics (plus metrics.npz).
+    The original is decoded once and shared with up to `jobs` worker processes.
+    With a ResultCache, unchanged variants are served from the cache and the
+    original is only decoded if something actually needs measuring.
+    Returns the metrics path to report from (see write_metrics()).
+    """
+    csv_path = os.path.join(data_dir, "metrics.csv")
+    all_rows = []
+
+    source_hash = cache.file_hash(original_path) if cache is not None else None
+    todo = pending_analysis(generated_files, engine, cache, source_hash, diff_max_size)
+
+    workers = max(1, min(jobs or 1, len(todo)))
+    reference = load_reference(original_path, engine, shared=workers > 1) if todo else None
+
+    try:
+        if workers == 1:
+            all_rows = [
+                analyze_variant(item, original_path, diff_dir, data_dir, engine, reference, cache, source_hash,
+                                diff_max_size)
+                for item in generated_files
+            ]
+        else:
+            handle = reference.handle() if reference is not None else None
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(handle,)) as pool:
+                futures = [
+                    pool.submit(_analyze_in_worker, item, original_path, diff_dir, data_dir, engine, cache, source_hash,
+                                diff_max_size)
+                    for item in generated_files
+                ]
+                all_rows = [f.result() for f in futures]
+    finally:
+        if reference is not None:
+            reference.close()
+
+    return write_metrics(csv_path, all_rows)
+
 # ==============================================================================
 # Execution Guard
 # ==============================================================================
@@ -0,0 +1,187 @@
+# ==============================================================================
+# Script Name: budget.py
+# Description: Helper module for memory-aware admission control. Estimates
+#              the peak memory of encodes and comparisons from the image's
+#              dimensions and the tool involved, and only lets work start
+#              while the estimates of everything running fit a budget.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import logging
+import threading
+import sys
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger("Budget")
+
+# Estimated peak bytes per source pixel, measured on 8-bit RGB sources.
+# Work held for an image's whole lifetime (per open image):
+REFERENCE_BYTES_PER_PIXEL = {
+    "numpy": 48,    # pixels plus window mean/variance as float32, 3 x 3 channels x 4 bytes, plus the decode
+}
+PILLOW_SOURCE_BYTES_PER_PIXEL = 12  # decoded source (RGBX) and its per-format conversion
+
+# One encode:
+ENCODE_BYTES_PER_PIXEL = {
+    "pillow": 8,    # private copy of the shared source plus encoder buffers
+    "cwebp": 12,    # decoded RGBA input, YUV picture and encoder state
+    "magick": 32,   # Q16-HDRI pixel cache (4 channels x float32) for input and output
+}
+LOSSLESS_BYTES_PER_PIXEL = 32  # WebP lossless keeps several ARGB working planes
+
+# One comparison:
+ANALYSIS_BYTES_PER_PIXEL = {
+    "numpy": 40,    # variant as float32 planes, MS-SSIM pyramid, diff mask and band temporaries
+    "tiled": 4,     # one whole 8-bit decode of the variant (JPEG/WebP); the bands are the tile budget
+    "magick": 240,  # five concurrent 'magick compare', each holding both images and a difference image
+}
+
+# How many later, smaller tasks may start ahead of a waiting task before it
+# is given priority, so a large task is delayed but never starved
+MAX_OVERTAKES = 32
+
+def default_budget_mb():
+    """Three quarters of physical memory, or None (no limit) where it cannot be read."""
+    try:
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+    return int(total * 0.75 / 2**20)
+
+def image_footprint(pixels, engine, backend):
+    """Bytes an open image holds between its first encode and its report."""
+    cost = pixels * REFERENCE_BYTES_PER_PIXEL.get(engine, 0)
+    if backend == "pillow":
+        cost += pixels * PILLOW_SOURCE_BYTES_PER_PIXEL
+    return cost
+
+def encode_cost(pixels, task):
+    if "lossless" in task["entry"]["params"]:
+        return pixels * LOSSLESS_BYTES_PER_PIXEL
+    return pixels * ENCODE_BYTES_PER_PIXEL.get(task["encoder"], ENCODE_BYTES_PER_PIXEL["magick"])
+
+def analysis_cost(pixels, engine, tile_budget_mb=0):
+    cost = pixels * ANALYSIS_BYTES_PER_PIXEL.get(engine, ANALYSIS_BYTES_PER_PIXEL["magick"])
+    if engine == "tiled":
+        cost += tile_budget_mb * 2**20
+    return cost
+
+class MemoryBudget:
+    """
+    Admits work while the estimated peaks of everything admitted fit in
+    `budget_bytes`. Tasks wait in a queue instead of blocking pool threads,
+    so while a large image's task waits for memory, smaller ones (from any
+    image) start in the gap: small images run at full concurrency and huge
+    ones at whatever concurrency the budget allows, in the same run.
+
+    Work larger than the whole budget is still admitted once nothing else
+    of its kind is running, so it runs alone rather than never.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget = budget_bytes
+        self.in_use = 0
+        self.running = 0
+        self.reserved = 0
+        self.waiting = deque()
+        self._overtaken = 0
+        self._cond = threading.Condition()
+
+    def _fits(self, cost):
+        return self.in_use + cost <= self.budget
+
+    def submit(self, pool, cost, fn, *args):
+        """
+        Submits fn(*args) to `pool` once `cost` bytes are free. Returns a
+        Future for its result; the bytes are returned when fn finishes.
+        """
+        future = Future()
+        with self._cond:
+            self.waiting.append((cost, pool, fn, args, future))
+            ready = self._admit()
+        self._start(ready)
+        return future
+
+    def _admit(self):
+        """Pops the tasks that may start now (lock held)."""
+        ready = []
+        for item in list(self.waiting):
+            cost = item[0]
+            head = item is self.waiting[0]
+            if not (self._fits(cost) or self.running == 0):
+                continue
+            if not head:
+                if self._overtaken >= MAX_OVERTAKES:
+                    # The head has waited long enough: let memory drain to it
+                    break
+                self._overtaken += 1
+            else:
+                self._overtaken = 0
+            self.waiting.remove(item)
+            self.in_use += cost
+            self.running += 1
+            ready.append(item)
+        return ready
+
+    def _start(self, ready):
+        for cost, pool, fn, args, future in ready:
+            if cost > self.budget:
+                logger.warning(f"A task needs about {cost / 2**20:.0f} MiB, more than the "
+                               f"{self.budget / 2**20:.0f} MiB memory budget; running it alone")
+            try:
+                inner = pool.submit(fn, *args)
+            except Exception as e:
+                self._release(cost)
+                future.set_exception(e)
+                continue
+            inner.add_done_callback(lambda f, cost=cost, future=future: self._finished(f, cost, future))
+
+    def _finished(self, inner, cost, future):
+        self._release(cost)
+        if inner.cancelled():
+            future.cancel()
+        elif inner.exception() is not None:
+            future.set_exception(inner.exception())
+        else:
+            future.set_result(inner.result())
+
+    def _release(self, cost):
+        with self._cond:
+            self.in_use -= cost
+            self.running -= 1
+            ready = self._admit()
+            self._cond.notify_all()
+        self._start(ready)
+
+    def reserve(self, cost):
+        """
+        Blocks until `cost` bytes held for a whole image fit (or no other
+        image holds any), then takes them. Pair with unreserve().
+        """
+        with self._cond:
+            while not (self._fits(cost) or self.reserved == 0):
+                self._cond.wait()
+            if cost > self.budget:
+                logger.warning(f"An image needs about {cost / 2**20:.0f} MiB while open, more than the "
+                               f"{self.budget / 2**20:.0f} MiB memory budget")
+            self.in_use += cost
+            self.reserved += 1
+
+    def unreserve(self, cost):
+        with self._cond:
+            self.in_use -= cost
+            self.reserved -= 1
+            ready = self._admit()
+            self._cond.notify_all()
+        self._start(ready)
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
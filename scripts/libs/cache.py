@@ -0,0 +1,213 @@
+# ==============================================================================
+# Script Name: cache.py
+# Description: Helper module for the persistent, content-addressed result
+#              cache. Stores encoded variants and analysis results keyed on
+#              (source hash, tool, tool version, params) with LRU eviction.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+import subprocess
+import sys
+
+logger = logging.getLogger("Cache")
+
+DEFAULT_MAX_MB = 2048
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used);
+CREATE TABLE IF NOT EXISTS tools (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    version TEXT NOT NULL
+);
+"""
+
+def make_key(*parts):
+    """Stable key for any JSON-serializable parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """
+    Objects live under <root>/objects/<k[:2]>/<k>; a SQLite index tracks
+    sizes and last use so the least recently used entries are evicted once
+    the cache grows past max_bytes. Safe to share between threads, and
+    between processes (each opens its own index connection).
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.root, "index.sqlite")
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        self._local = threading.local()
+        self._hashes = {}
+        self._lock = threading.Lock()
+        with self._db() as db:
+            db.executescript(SCHEMA)
+
+    def __getstate__(self):
+        # Connections and locks stay behind; the receiving process reopens them
+        return {"root": self.root, "max_bytes": self.max_bytes, "index_path": self.index_path}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def _db(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = sqlite3.connect(self.index_path, timeout=60)
+            local.pid = os.getpid()
+        return local.conn
+
+    def _object_path(self, key):
+        return os.path.join(self.root, "objects", key[:2], key)
+
+    # --- Keys -------------------------------------------------------------
+
+    def file_hash(self, path):
+        """SHA-256 of a file, memoized on (path, mtime, size)."""
+        st = os.stat(path)
+        memo_key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if memo_key in self._hashes:
+                return self._hashes[memo_key]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+
+        with self._lock:
+            self._hashes[memo_key] = digest
+        return digest
+
+    def tool_version(self, tool):
+        """
+        Version string of an external tool. Remembered per binary (path,
+        mtime, size), so fully cached runs spawn no processes at all.
+        """
+        path = shutil.which(tool)
+        if not path:
+            return "missing"
+        st = os.stat(path)
+        db = self._db()
+        row = db.execute("SELECT mtime, size, version FROM tools WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == st.st_mtime and row[1] == st.st_size:
+            return row[2]
+
+        try:
+            res = subprocess.run([path, "-version"], capture_output=True, text=True, timeout=30)
+            lines = (res.stdout or res.stderr).strip().splitlines()
+            version = lines[0] if lines else "unknown"
+        except Exception as e:
+            logger.warning(f"Could not determine {tool} version: {e}")
+            return "unknown"
+
+        with db:
+            db.execute("INSERT OR REPLACE INTO tools VALUES (?, ?, ?, ?)", (path, st.st_mtime, st.st_size, version))
+        return version
+
+    # --- Storage ----------------------------------------------------------
+
+    def _touch(self, key):
+        with self._db() as db:
+            db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+
+    def has(self, key):
+        row = self._db().execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+        return row is not None and os.path.exists(self._object_path(key))
+
+    def get_file(self, key, dest_path):
+        """Copies a cached object to dest_path. Returns True on a hit."""
+        src = self._object_path(key)
+        if not self.has(key):
+            return False
+        try:
+            shutil.copyfile(src, dest_path)
+        except OSError:
+            return False
+        self._touch(key)
+        return True
+
+    def put_file(self, key, src_path, kind):
+        """Stores a copy of src_path under key."""
+        dest = self._object_path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(src_path, tmp)
+        os.replace(tmp, dest)
+        self._record(key, kind, os.path.getsize(dest))
+
+    def get_json(self, key):
+        if not self.has(key):
+            return None
+        try:
+            with open(self._object_path(key), "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(key)
+        return data
+
+    def put_json(self, key, data, kind):
+        dest = self._object_path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, dest)
+        self._record(key, kind, os.path.getsize(dest))
+
+    def _record(self, key, kind, size):
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, kind, size, time.time()))
+        self.evict()
+
+    def evict(self):
+        """Drops least recently used entries until the cache fits max_bytes."""
+        db = self._db()
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        removed = 0
+        for key, size in db.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._object_path(key))
+            except FileNotFoundError:
+                pass
+            with db:
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        logger.debug(f"Evicted {removed} cache entries")
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
@@ -1,35 +1,79 @@
 # ==============================================================================
 # Script Name: compressor.py
 # Description: Helper module for generating compressed image variants.
-#              Wraps 'cwebp' and ImageMagick conversion tools.
+#              Wraps 'cwebp' and ImageMagick conversion tools, or encodes
+#              in-process through Pillow (see pillow_backend.py).
 # Note:        This is a library file. Do not run directly.
 # ==============================================================================
 
-import subprocess
 import os
+import time
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from libs.cache import make_key
+    from libs.profiling import bind_active, stage
+    from libs.runner import run_command
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from libs.cache import make_key
+    from libs.profiling import bind_active, stage
+    from libs.runner import run_command
+
+try:
+    from libs import pillow_backend
+except ImportError:
+    pillow_backend = None
 
 logger = logging.getLogger("Compressor")
 
-def run_compressions(input_path, output_dir, formats, steps):
+BACKENDS = ["pillow", "cli"]
+
+# quality_steps spaces qualities 100 // steps apart, so more steps would repeat them
+MAX_STEPS = 100
+
+def resolve_backend(backend, formats):
     """
-    Generates compressed versions of the image.
-    Returns a list of dictionaries containing file paths and metadata.
+    Falls back to the CLI backend when Pillow (or one of its codecs) is not
+    available, so a missing optional dependency never fails a run.
     """
-    generated_files = []
-    
-    step_size = 100 // steps
-    qualities = list(range(step_size, 101, step_size))
-    # Ensure 0 is included if desired, or start at low quality
-    if 0 not in qualities:
-        qualities.insert(0, 5) # 0 is often too destructive, 5 is a good low bound
+    if backend != "pillow":
+        return backend
+    if pillow_backend is None:
+        logger.warning("Pillow is not installed, using the cwebp/magick encoders")
+        return "cli"
+    missing = [f for f in formats if f.lower() in ("webp", "jpg", "jpeg")
+               and not pillow_backend.available("jpeg" if f.lower() == "jpg" else f.lower())]
+    if missing:
+        logger.warning(f"Pillow cannot encode {missing}, using the cwebp/magick encoders")
+        return "cli"
+    return backend
 
+def use_pillow(task, source, fmt, quality, lossless=False):
+    """Switches a CLI task to the in-process encoder. Naming and entry stay the same."""
+    task["encoder"] = "pillow"
+    task["source"] = source
+    task["native"] = {"format": fmt, "quality": quality, "lossless": lossless}
+    return task
+
+def build_tasks(input_path, output_dir, formats, qualities, lossless=True, backend="cli", source=None):
+    """
+    Builds the list of encode tasks in the order the variants are reported.
+    Each task carries the command to run and the generated_files entry it yields.
+    `lossless` adds the lossless variant for formats that have one.
+    With backend="pillow" every task encodes from one shared decoded `source`
+    (created here unless passed in); release it with release_sources().
+    """
+    tasks = []
     base_name = os.path.splitext(os.path.basename(input_path))[0]
+    if backend == "pillow" and source is None:
+        source = pillow_backend.PillowSource(input_path)
 
     for fmt in formats:
         fmt = fmt.lower()
-        
+
         if fmt == "webp":
             # WebP Loop
             for q in qualities:
@@ -39,35 +83,43 @@ def run_compressions(input_path, output_dir, formats, steps):
                 q_str = f"{q:02d}" 
                 output_name = f"{base_name}_q{q_str}.webp"
                 output_path = os.path.join(output_dir, output_name)
-                
-                cmd = ["cwebp", "-q", str(q), input_path, "-o", output_path]
-                
-                logger.info(f"Compressing WebP: Quality {q}")
-                try:
-                    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    generated_files.append({
+                task = {
+                    "cmd": ["cwebp", "-q", str(q), input_path, "-o", output_path],
+                    "encoder": "cwebp",
+                    "start_msg": f"Compressing WebP: Quality {q}",
+                    "fail_msg": f"Failed to compress {output_name}",
+                    "entry": {
                         "path": output_path,
                         "format": "webp",
                         "quality": q,
                         "params": f"-q {q}"
-                    })
-                except subprocess.CalledProcessError as e:
-                    logger.error(f"Failed to compress {output_name}: {e}")
+                    }
+                }
+                if backend == "pillow":
+                    use_pillow(task, source, "webp", q)
+                tasks.append(task)
+
+            if not lossless:
+                continue
 
             # WebP Lossless
             output_name = f"{base_name}_lossless.webp"
             output_path = os.path.join(output_dir, output_name)
-            cmd = ["cwebp", "-lossless", input_path, "-o", output_path]
-            try:
-                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                generated_files.append({
+            task = {
+                "cmd": ["cwebp", "-lossless", input_path, "-o", output_path],
+                "encoder": "cwebp",
+                "start_msg": "Compressing WebP: Lossless",
+                "fail_msg": "WebP lossless failed",
+                "entry": {
                     "path": output_path,
                     "format": "webp",
                     "quality": 100,
                     "params": "-lossless"
-                })
-            except Exception as e:
-                logger.error(f"WebP lossless failed: {e}")
+                }
+            }
+            if backend == "pillow":
+                use_pillow(task, source, "webp", 100, lossless=True)
+            tasks.append(task)
 
         elif fmt in ["jpg", "jpeg"]:
             # JPEG Loop (using ImageMagick)
@@ -75,22 +127,125 @@ def run_compressions(input_path, output_dir, formats, steps):
                 q_str = f"{q:02d}"
                 output_name = f"{base_name}_q{q_str}.jpg"
                 output_path = os.path.join(output_dir, output_name)
-                
-                # Magick command
-                cmd = ["magick", input_path, "-quality", str(q), output_path]
-                
-                logger.info(f"Compressing JPEG: Quality {q}")
-                try:
-                    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    generated_files.append({
+                task = {
+                    "cmd": ["magick", input_path, "-quality", str(q), output_path],
+                    "encoder": "magick",
+                    "start_msg": f"Compressing JPEG: Quality {q}",
+                    "fail_msg": f"Failed to compress {output_name}",
+                    "entry": {
                         "path": output_path,
                         "format": "jpeg",
                         "quality": q,
                         "params": f"-quality {q}"
-                    })
-                except subprocess.CalledProcessError as e:
-                    logger.error(f"Failed to compress {output_name}: {e}")
+                    }
+                }
+                if backend == "pillow":
+                    use_pillow(task, source, "jpeg", q)
+                tasks.append(task)
+
+    return tasks
+
+def release_sources(tasks):
+    """Drops the decoded sources held by Pillow tasks."""
+    for source in {id(t["source"]): t["source"] for t in tasks if t.get("source") is not None}.values():
+        source.close()
+
+def attach_cache_keys(tasks, cache, input_path):
+    """
+    Keys each task on (source hash, encoder, encoder version, params), so an
+    unchanged source re-encoded with the same settings is served from cache.
+    """
+    source_hash = cache.file_hash(input_path)
+    for task in tasks:
+        encoder = task["encoder"]
+        if encoder == "pillow":
+            version = pillow_backend.version(task["native"]["format"])
+        else:
+            version = cache.tool_version(encoder)
+        task["cache_key"] = make_key("encode", source_hash, encoder, version,
+                                     task["entry"]["format"], task["entry"]["params"])
+    return tasks
+
+def run_task(task, cache=None):
+    """
+    Runs a single encode task (or restores it from cache). Raises on failure.
+    The entry gets the encode's wall and CPU time (`encode_ms`,
+    `encode_cpu_ms`); a cached variant keeps the times of its original encode.
+    """
+    key = task.get("cache_key")
+    entry = task["entry"]
+    variant = os.path.basename(entry["path"])
+    if cache is not None and key:
+        with stage("cache_restore", variant):
+            hit = cache.get_file(key, entry["path"])
+        if hit:
+            logger.info(f"{task['start_msg']} (cached)")
+            entry.update(cache.get_json(make_key(key, "timing")) or {})
+            return entry
+
+    logger.info(task["start_msg"])
+    with stage("encode", variant):
+        if task["encoder"] == "pillow":
+            # Pillow encodes on this thread, so its CPU time is the thread's
+            wall, cpu = time.perf_counter(), time.thread_time()
+            native = task["native"]
+            pillow_backend.encode(task["source"], native["format"], entry["path"],
+                                  quality=native["quality"], lossless=native["lossless"])
+            wall_s, cpu_s = time.perf_counter() - wall, time.thread_time() - cpu
+        else:
+            # The tool's own run, not the wait for a free tool slot
+            result = run_command(task["cmd"], check=True)
+            wall_s, cpu_s = result.wall_s, result.cpu_s
+        timing = {"encode_ms": round(wall_s * 1000, 3), "encode_cpu_ms": round(cpu_s * 1000, 3)}
+    entry.update(timing)
+
+    if cache is not None and key:
+        cache.put_file(key, entry["path"], "encode")
+        cache.put_json(make_key(key, "timing"), timing, "encode")
+    return entry
+
+def quality_steps(steps):
+    """Returns the quality settings swept for a given number of steps (1 to MAX_STEPS)."""
+    if not isinstance(steps, int) or not 1 <= steps <= MAX_STEPS:
+        raise ValueError(f"steps must be an integer from 1 to {MAX_STEPS}, got {steps!r}")
+    step_size = 100 // steps
+    qualities = list(range(step_size, 101, step_size))
+    # Ensure 0 is included if desired, or start at low quality
+    if 0 not in qualities:
+        qualities.insert(0, 5) # 0 is often too destructive, 5 is a good low bound
+    return qualities
+
+def run_compressions(input_path, output_dir, formats, steps, jobs=None, cache=None, backend="cli"):
+    """
+    Generates compressed versions of the image.
+    Encodes run concurrently on up to `jobs` workers (default: CPU count).
+    With a ResultCache, variants encoded before are copied from the cache.
+    Returns a list of dictionaries containing file paths and metadata.
+    """
+    generated_files = []
+
+    backend = resolve_backend(backend, formats)
+    tasks = build_tasks(input_path, output_dir, formats, quality_steps(steps), backend=backend)
+    if not tasks:
+        return generated_files
+    if cache is not None:
+        attach_cache_keys(tasks, cache, input_path)
+
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(tasks)))
+    logger.debug(f"Encoding {len(tasks)} variants on {workers} workers")
+
+    # Threads are enough here: each worker just waits on an encoder process.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(bind_active(run_task), task, cache) for task in tasks]
+
+        # Collect in submission order so the result list is deterministic
+        for task, future in zip(tasks, futures):
+            try:
+                generated_files.append(future.result())
+            except Exception as e:
+                logger.error(f"{task['fail_msg']}: {e}")
 
+    release_sources(tasks)
     return generated_files
 
 # ==============================================================================
@@ -100,4 +255,4 @@ if __name__ == "__main__":
     print("\n[!] This is a library file and cannot be run directly.")
     print(f"    Please run the main script instead:\n")
     print(f"    python scripts/compression_analyzer.py <image_path>\n")
-    sys.exit(1)
\ No newline at end of file
+    sys.exit(1)
@@ -0,0 +1,152 @@
+# ==============================================================================
+# Script Name: corpus.py
+# Description: Helper module for the benchmark harness. Generates a
+#              deterministic synthetic image corpus (gradients, noise, text,
+#              fractal "photos", alpha) at fixed megapixel sizes, so timings
+#              are comparable between machines and commits without shipping
+#              test images.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import math
+import logging
+import string
+import sys
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger("Corpus")
+
+# Bump whenever a generator changes, so stale corpus files are not reused
+CORPUS_VERSION = "1"
+
+KINDS = ["gradient", "noise", "text", "fractal", "alpha"]
+SIZES_MP = [1, 12, 48]
+
+# Value-noise octaves summed for the fractal images (coarsest first)
+FRACTAL_OCTAVES = 7
+
+def dimensions(megapixels):
+    """Width and height of a 4:3 image with about this many megapixels (multiples of 8)."""
+    height = math.sqrt(megapixels * 1_000_000 * 3 / 4)
+    width = height * 4 / 3
+    return int(round(width / 8) * 8), int(round(height / 8) * 8)
+
+def corpus_name(kind, megapixels, seed):
+    return f"{kind}-{megapixels}mp-seed{seed}.png"
+
+def _gradient(w, h, rng):
+    # Smooth ramps: the best case for every encoder
+    x = np.linspace(0, 255, w, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+    arr = np.empty((h, w, 3), dtype=np.uint8)
+    arr[..., 0] = x
+    arr[..., 1] = y
+    arr[..., 2] = (x + y) * 0.5
+    return Image.fromarray(arr, "RGB")
+
+def _noise(w, h, rng):
+    # Uniform noise: incompressible, the worst case
+    return Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8), "RGB")
+
+def _text(w, h, rng):
+    # Dark glyphs on a light page: sharp edges that ring under DCT coding
+    img = Image.new("RGB", (w, h), (250, 248, 240))
+    draw = ImageDraw.Draw(img)
+    font_size = max(12, h // 120)
+    font = ImageFont.load_default(size=font_size)
+    alphabet = string.ascii_letters + string.digits + "     .,;:!?"
+    chars = len(alphabet)
+    line_height = int(font_size * 1.4)
+    line_length = int(w / (font_size * 0.55))
+    for top in range(line_height // 2, h - line_height, line_height):
+        line = "".join(alphabet[i] for i in rng.integers(0, chars, line_length))
+        colour = tuple(int(c) for c in rng.integers(0, 90, 3))
+        draw.text((font_size, top), line, fill=colour, font=font)
+    return img
+
+def _fractal_array(w, h, rng, channels=3):
+    """
+    1/f value noise: random grids from 4x3 up to ~1/2 the final size,
+    upscaled bicubically and summed with halving weights. Looks like
+    clouds/foliage, which is close enough to photographic content for
+    encoder timings. Accumulates in uint16 to keep 48 MP images cheap.
+    """
+    acc = np.zeros((h, w, channels), dtype=np.uint16)
+    mode = "RGB" if channels == 3 else "L"
+    for octave in range(FRACTAL_OCTAVES):
+        gw, gh = 4 << octave, 3 << octave
+        grid = rng.integers(0, 256, (gh, gw, channels), dtype=np.uint8)
+        layer = Image.fromarray(grid if channels == 3 else grid[..., 0], mode).resize((w, h), Image.BICUBIC)
+        weight = 1 << (FRACTAL_OCTAVES - 1 - octave)
+        layer_arr = np.asarray(layer).reshape(h, w, channels)
+        acc += layer_arr.astype(np.uint16) * weight
+        del layer, layer_arr
+    total = (1 << FRACTAL_OCTAVES) - 1
+    acc //= total
+    # A little sensor grain on top
+    acc += rng.integers(0, 6, (h, w, channels), dtype=np.uint16)
+    return np.clip(acc, 0, 255).astype(np.uint8)
+
+def _fractal(w, h, rng):
+    return Image.fromarray(_fractal_array(w, h, rng), "RGB")
+
+def _alpha(w, h, rng):
+    # Fractal colour under a radial fade and a noisy matte
+    rgb = _fractal_array(w, h, rng)
+    matte = _fractal_array(w, h, rng, channels=1)[..., 0]
+    y, x = np.ogrid[:h, :w]
+    dist = np.hypot((x - w / 2) / (w / 2), (y - h / 2) / (h / 2)).astype(np.float32)
+    fade = np.clip(1.2 - dist, 0, 1)
+    alpha = (fade * matte.astype(np.float32) * (255 / max(1, matte.max()))).astype(np.uint8)
+    return Image.fromarray(np.dstack([rgb, alpha]), "RGBA")
+
+GENERATORS = {
+    "gradient": _gradient,
+    "noise": _noise,
+    "text": _text,
+    "fractal": _fractal,
+    "alpha": _alpha,
+}
+
+def generate_image(kind, megapixels, seed=0):
+    """Builds one corpus image. The same (kind, size, seed) always gives the same pixels."""
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown corpus image kind '{kind}' (choose from {', '.join(KINDS)})")
+    w, h = dimensions(megapixels)
+    rng = np.random.default_rng([seed, KINDS.index(kind), megapixels])
+    return GENERATORS[kind](w, h, rng)
+
+def generate_corpus(out_dir, kinds=None, sizes=None, seed=0):
+    """
+    Writes the corpus as PNGs into out_dir/v<CORPUS_VERSION>/ and returns
+    their paths. Files from an earlier run are reused, since generating
+    the 48 MP images takes a while.
+    """
+    corpus_dir = os.path.join(out_dir, f"v{CORPUS_VERSION}")
+    os.makedirs(corpus_dir, exist_ok=True)
+
+    paths = []
+    for megapixels in sizes or SIZES_MP:
+        for kind in kinds or KINDS:
+            path = os.path.join(corpus_dir, corpus_name(kind, megapixels, seed))
+            if not os.path.exists(path):
+                logger.info(f"Generating {os.path.basename(path)}")
+                img = generate_image(kind, megapixels, seed)
+                # Write to a temp name first so an interrupted run leaves no truncated file
+                tmp_path = path + ".tmp"
+                img.save(tmp_path, format="PNG", compress_level=1)
+                os.replace(tmp_path, path)
+            paths.append(path)
+    return paths
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
@@ -74,6 +74,12 @@ HTML_HEAD = """
         .graph-box h3 {{ margin-top: 0; color: var(--text-muted); font-size: 1.2rem; }}
         .graph-box picture, .graph-box img {{ width: 100%; height: auto; max-height: 600px; object-fit: contain; cursor: zoom-in; }}
         
+        /* Run Performance */
+        .perf-table {{ border-collapse: collapse; width: 100%; margin-bottom: 30px; font-size: 0.9em; }}
+        .perf-table th, .perf-table td {{ border: 1px solid var(--border-color); padding: 6px 10px; text-align: right; }}
+        .perf-table th:first-child, .perf-table td:first-child {{ text-align: left; }}
+        .perf-table th {{ background: var(--card-bg); }}
+
         /* Comparisons */
         .comparison-row {{ display: flex; flex-wrap: wrap; gap: 30px; padding: 30px 0; border-bottom: 1px solid var(--border-color); align-items: flex-start; }}
         .img-card {{ flex: 1; min-width: 45%; }}
@@ -136,6 +142,7 @@ HTML_HEAD = """
         <div class="metrics-grid">
             {graphs}
         </div>
+        {performance}
 
         <h2 id="comparisons">Visual Inspection</h2>
 """
@@ -193,7 +200,7 @@ HTML_FOOTER = """
     <script>
         // --- DATA COLLECTION ---
         // Charts
-        const chartImgs = Array.from(document.querySelectorAll('.graph-box img'));
+        const chartImgs = Array.from(document.querySelectorAll('.graph-box img, .graph-box svg.js-chart'));
         let chartIdx = 0;
 
         // Comparison Rows (Structured Data)
@@ -222,6 +229,10 @@ HTML_FOOTER = """
             if (isDark && img.dataset.darkSrc) {
                 src = img.dataset.darkSrc;
             }
+            if (img.tagName.toLowerCase() === 'svg') {
+                // In-browser chart: show a snapshot of the drawn SVG
+                src = 'data:image/svg+xml;charset=utf-8,' + encodeURIComponent(new XMLSerializer().serializeToString(img));
+            }
 
             document.getElementById('lb-charts-img').src = src;
             document.getElementById('lb-charts-caption').innerText = img.dataset.caption || "Chart";
@@ -320,6 +331,132 @@ HTML_FOOTER = """
 </html>
 """
 
+HTML_JS_CHART = """
+        <div class="graph-box">
+            <h3>{title}</h3>
+            <svg class="js-chart" data-chart="{index}" data-caption="Chart: {title}" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 960 480" width="100%"></svg>
+        </div>"""
+
+# In-browser charts (report mode charts="js"). Reads the JSON embedded by
+# reporter.chart_data_json() and draws the same charts as the matplotlib
+# renderer as inline SVG, redrawing when the color scheme changes.
+HTML_JS_CHARTS_SCRIPT = """
+        <script>
+        (function () {
+            const payload = JSON.parse(document.getElementById('chart-data').textContent);
+            const col = {};
+            payload.columns.forEach((c, i) => { col[c] = i; });
+            const value = (row, key) => (key in col && typeof row[col[key]] === 'number') ? row[col[key]] : 0;
+            const formats = Array.from(new Set(payload.rows.map(r => r[col.format]))).sort();
+
+            const THEMES = {
+                light: { bg: '#ffffff', text: '#1a202c', grid: '#e2e8f0' },
+                dark: { bg: '#2d3748', text: '#e2e8f0', grid: '#4a5568' }
+            };
+            const CYCLE = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf'];
+            const CHANNEL_COLORS = { Red: '#ff0000', Green: '#008000', Blue: '#0000ff', Alpha: '#00bfbf', All: '#808080' };
+            const DASHES = { webp: '', jpeg: '6,4', png: '2,3' };
+            const W = 960, H = 480, M = { l: 75, r: 20, t: 40, b: 55 };
+
+            const esc = s => String(s).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+
+            function buildSeries(chart) {
+                const series = [];
+                formats.forEach((fmt, fi) => {
+                    const rows = payload.rows.filter(r => r[col.format] === fmt)
+                        // Variants without the value (e.g. encode times of a resumed run) are left out
+                        .filter(r => chart.kind !== 'single' || (chart.y in col && typeof r[col[chart.y]] === 'number'))
+                        .sort((a, b) => value(a, chart.x) - value(b, chart.x));
+                    const xs = rows.map(r => value(r, chart.x));
+                    if (chart.kind === 'single') {
+                        series.push({ label: fmt, color: CYCLE[fi % CYCLE.length], dash: '', r: 4, opacity: 1,
+                                      pts: xs.map((x, i) => [x, value(rows[i], chart.y)]) });
+                        return;
+                    }
+                    chart.ys.forEach(key => {
+                        const parts = key.split('-');
+                        const channel = parts.length > 1 ? parts[1] : 'All';
+                        series.push({ label: fmt + ' ' + channel, color: CHANNEL_COLORS[channel] || '#808080',
+                                      dash: DASHES[fmt] || '', r: 2, opacity: 0.8,
+                                      pts: xs.map((x, i) => [x, value(rows[i], key)]) });
+                    });
+                });
+                return series;
+            }
+
+            function ticks(lo, hi) {
+                const raw = (hi - lo) / 6 || 1;
+                const mag = Math.pow(10, Math.floor(Math.log10(raw)));
+                const step = [1, 2, 5, 10].map(m => m * mag).find(s => s >= raw);
+                const out = [];
+                for (let v = Math.ceil(lo / step) * step; v <= hi + step * 1e-9; v += step) out.push(+v.toPrecision(12));
+                return out;
+            }
+
+            function range(values) {
+                let lo = Math.min(...values), hi = Math.max(...values);
+                if (!isFinite(lo)) { lo = 0; hi = 1; }
+                if (lo === hi) { lo -= 0.5; hi += 0.5; }
+                const pad = (hi - lo) * 0.05;
+                return [lo - pad, hi + pad];
+            }
+
+            function draw(svg, chart, theme) {
+                const t = THEMES[theme];
+                const series = buildSeries(chart);
+                const all = series.flatMap(s => s.pts);
+                const [x0, x1] = range(all.map(p => p[0]));
+                const [y0, y1] = range(all.map(p => p[1]));
+                const sx = x => M.l + (x - x0) / (x1 - x0) * (W - M.l - M.r);
+                const sy = y => H - M.b - (y - y0) / (y1 - y0) * (H - M.t - M.b);
+
+                let out = `<rect width="${W}" height="${H}" fill="${t.bg}"/>`;
+                ticks(x0, x1).forEach(v => {
+                    out += `<line x1="${sx(v)}" x2="${sx(v)}" y1="${M.t}" y2="${H - M.b}" stroke="${t.grid}" stroke-dasharray="4,4"/>`;
+                    out += `<text x="${sx(v)}" y="${H - M.b + 18}" fill="${t.text}" font-size="12" text-anchor="middle">${v}</text>`;
+                });
+                ticks(y0, y1).forEach(v => {
+                    out += `<line x1="${M.l}" x2="${W - M.r}" y1="${sy(v)}" y2="${sy(v)}" stroke="${t.grid}" stroke-dasharray="4,4"/>`;
+                    out += `<text x="${M.l - 8}" y="${sy(v) + 4}" fill="${t.text}" font-size="12" text-anchor="end">${v}</text>`;
+                });
+                out += `<rect x="${M.l}" y="${M.t}" width="${W - M.l - M.r}" height="${H - M.t - M.b}" fill="none" stroke="${t.grid}"/>`;
+
+                series.forEach(s => {
+                    const pts = s.pts.map(p => `${sx(p[0]).toFixed(1)},${sy(p[1]).toFixed(1)}`);
+                    out += `<g opacity="${s.opacity}"><polyline points="${pts.join(' ')}" fill="none" stroke="${s.color}" stroke-width="1.5" stroke-dasharray="${s.dash}"/>`;
+                    pts.forEach(p => { const [x, y] = p.split(','); out += `<circle cx="${x}" cy="${y}" r="${s.r}" fill="${s.color}"/>`; });
+                    out += '</g>';
+                });
+
+                out += `<text x="${W / 2}" y="24" fill="${t.text}" font-size="16" text-anchor="middle">${esc(chart.title)}</text>`;
+                out += `<text x="${(M.l + W - M.r) / 2}" y="${H - 12}" fill="${t.text}" font-size="13" text-anchor="middle">${esc(chart.xlabel)}</text>`;
+                out += `<text transform="translate(18 ${(M.t + H - M.b) / 2}) rotate(-90)" fill="${t.text}" font-size="13" text-anchor="middle">${esc(chart.ylabel)}</text>`;
+
+                // Legend (top right, as matplotlib's 'best' usually lands)
+                const lw = 150, lh = 18 * series.length + 8, lx = W - M.r - lw - 8, ly = M.t + 8;
+                out += `<rect x="${lx}" y="${ly}" width="${lw}" height="${lh}" fill="${t.bg}" stroke="${t.grid}" opacity="0.9"/>`;
+                series.forEach((s, i) => {
+                    const y = ly + 16 + i * 18;
+                    out += `<line x1="${lx + 8}" x2="${lx + 32}" y1="${y - 4}" y2="${y - 4}" stroke="${s.color}" stroke-width="2" stroke-dasharray="${s.dash}"/>`;
+                    out += `<text x="${lx + 40}" y="${y}" fill="${t.text}" font-size="12">${esc(s.label)}</text>`;
+                });
+
+                svg.innerHTML = out;
+            }
+
+            const scheme = window.matchMedia ? window.matchMedia('(prefers-color-scheme: dark)') : null;
+            function drawAll() {
+                const theme = scheme && scheme.matches ? 'dark' : 'light';
+                document.querySelectorAll('svg.js-chart').forEach(svg => {
+                    draw(svg, payload.charts[+svg.dataset.chart], theme);
+                });
+            }
+            drawAll();
+            if (scheme && scheme.addEventListener) scheme.addEventListener('change', drawAll);
+        })();
+        </script>
+"""
+
 if __name__ == "__main__":
     print("\n[!] This is a library file and cannot be run directly.")
     print(f"    Please run the main script instead:\n")
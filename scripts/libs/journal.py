@@ -0,0 +1,136 @@
+# ==============================================================================
+# Script Name: journal.py
+# Description: Helper module for resumable runs. Each image's output folder
+#              keeps a write-ahead journal (data/journal.jsonl) of completed
+#              units (image, format, quality, stage), so --resume can pick an
+#              interrupted run back up instead of starting over.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import json
+import time
+import logging
+import threading
+import sys
+
+logger = logging.getLogger("Journal")
+
+JOURNAL_NAME = "journal.jsonl"
+
+# Header keys that must match for a journal to be resumed
+RUN_KEYS = ["source", "size", "mtime_ns", "formats", "steps", "engine", "backend", "diff_max_size", "sampling"]
+
+def open_append(path):
+    return os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+def append_line(fd, line):
+    """
+    Appends one complete line with a single write() on an O_APPEND
+    descriptor, then fsyncs it. Concurrent writers never interleave, and a
+    killed process leaves the whole line or none of it. After a power loss
+    at most the last line is torn; readers drop a last line that has no
+    newline.
+    """
+    data = line.encode("utf-8")
+    while data:
+        data = data[os.write(fd, data):]
+    os.fsync(fd)
+
+def read_complete_lines(path):
+    """
+    The lines of a file up to its last newline. A torn tail is cut off the
+    file too, so the next append starts on a line of its own.
+    """
+    with open(path, 'r', encoding="utf-8", newline='') as f:
+        text = f.read()
+    end = text.rfind("\n") + 1
+    if end < len(text):
+        logger.warning(f"Dropping a torn last line of {path}")
+        os.truncate(path, len(text[:end].encode("utf-8")))
+    return text[:end]
+
+class RunJournal:
+    """
+    The journal of one image's run. The first record ("start") describes
+    the run (source file and sweep settings); then every unit appends a
+    record once its output is on disk: "encode" and "analyze" per variant,
+    "report" at the end. An entry therefore proves the unit finished, and
+    --resume only has to check that its output is still there.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+        self._fd = None
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            for line in read_complete_lines(path).splitlines():
+                try:
+                    self.records.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"Skipping an unreadable record in {path}")
+
+    def record(self, stage, **data):
+        entry = dict(data, stage=stage, time=round(time.time(), 3))
+        with self._lock:
+            if self._fd is None:
+                self._fd = open_append(self.path)
+            append_line(self._fd, json.dumps(entry) + "\n")
+            self.records.append(entry)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def header(self):
+        """The run description from the "start" record, or None."""
+        if self.records and self.records[0].get("stage") == "start":
+            return {k: self.records[0].get(k) for k in RUN_KEYS}
+        return None
+
+    def units(self, stage):
+        """Records of one stage, keyed by variant filename."""
+        return {r["variant"]: r for r in self.records if r.get("stage") == stage and "variant" in r}
+
+    def reported(self):
+        return any(r.get("stage") == "report" for r in self.records)
+
+def run_header(image_path, formats, steps, engine, backend, diff_max_size, sampling=None):
+    """
+    Describes a run, so --resume only continues one that would produce the
+    same outputs. `sampling` describes adaptive sampling (None for the grid).
+    """
+    st = os.stat(image_path)
+    return {"source": os.path.realpath(image_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "formats": list(formats), "steps": steps, "engine": engine, "backend": backend,
+            "diff_max_size": diff_max_size, "sampling": sampling}
+
+def find_resumable(candidates, header):
+    """
+    Returns the most recently started output folder among `candidates`
+    whose journal was written for the same run (see run_header), or None.
+    """
+    best = None
+    for root in candidates:
+        path = os.path.join(root, "data", JOURNAL_NAME)
+        if not os.path.exists(path):
+            continue
+        journal = RunJournal(path)
+        if journal.header() != header:
+            continue
+        started = journal.records[0].get("time", 0)
+        if best is None or started > best[0]:
+            best = (started, root)
+    return best[1] if best else None
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
@@ -0,0 +1,904 @@
+# ==============================================================================
+# Script Name: metrics.py
+# Description: Helper module for in-process image quality metrics.
+#              Decodes images with Pillow and computes MAE, RMSE, PSNR, SSIM,
+#              MS-SSIM and NCC per channel with NumPy.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import contextlib
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+import PIL
+from PIL import Image
+
+logger = logging.getLogger("Metrics")
+
+# magick compare reports MAE/RMSE on the quantum scale (first number in its
+# output), so we do the same to keep metrics.csv comparable with older runs.
+QUANTUM_RANGE = 65535.0
+
+# PSNR of identical images is infinite; parse_magick_output stores 999.0.
+PSNR_INF = 999.0
+
+# MS-SSIM is stored as "MSSSIM" because metrics.csv splits columns on '-'
+# ("SSIM-Red"), and a hyphenated name would read as metric "MS".
+METRIC_NAMES = ["MAE", "RMSE", "PSNR", "SSIM", "MSSSIM", "NCC"]
+
+# Bump whenever metric math (or diff rendering) changes so cached analyses are recomputed
+ENGINE_VERSION = "4"
+
+# SSIM constants (Wang et al. 2004) for data normalized to [0, 1]
+SSIM_SIGMA = 1.5
+SSIM_RADIUS = 5  # 11x11 window
+SSIM_C1 = 0.01 ** 2
+SSIM_C2 = 0.03 ** 2
+
+# Window statistics are computed in horizontal bands of about this many
+# pixels (plus a halo of SSIM_RADIUS rows each side), so the temporaries of
+# a 100+ MP panorama stay at a few dozen MiB instead of several GiB.
+SSIM_TILE_PIXELS = 1 << 22
+
+# Tiled engine: working memory per pixel of a band (float32 copies of both
+# bands with their halo, the five Gaussian-filtered maps and temporaries).
+# Bands are sized so this times the band stays within the memory budget.
+TILE_BYTES_PER_PIXEL = 96
+TILE_BUDGET_MB = 256
+
+# Decoded images are copied to their spill file in chunks of about this size
+SPILL_CHUNK_BYTES = 1 << 24
+
+# EXIF Orientation tag: Pillow rotates some formats by it on load
+EXIF_ORIENTATION = 0x0112
+
+# Band-by-band decoding (decode_tiles, split_raw_tiles) drives Pillow's
+# decoders directly through internals (Image._getdecoder, setimage, the
+# tile list) that hold across these releases, [first, last). Other versions
+# decode whole through the public load() and crop().
+BANDED_DECODE_PILLOW = ((9, 0), (13, 0))
+
+# A full-resolution diff mask of a gigapixel source would not fit the
+# budget, so the tiled engine caps diff maps unless --diff-max-size is set
+TILED_DIFF_MAX_SIZE = 8192
+
+# MS-SSIM scale weights (Wang, Simoncelli & Bovik 2003), finest scale first
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+# Diff maps follow 'magick compare -fuzz 5% -compose src': a pixel is
+# highlighted when any channel differs by more than the fuzz, drawn in
+# magick's default highlight/lowlight colors.
+DIFF_FUZZ = 0.05
+DIFF_HIGHLIGHT = (241, 0, 30)
+DIFF_LOWLIGHT = (255, 255, 255)
+
+CHANNEL_NAMES = {
+    "L": ["Gray"],
+    "LA": ["Gray", "Alpha"],
+    "RGB": ["Red", "Green", "Blue"],
+    "RGBA": ["Red", "Green", "Blue", "Alpha"],
+}
+
+GRAY_MODES = ("1", "L", "LA", "I", "I;16", "F")
+
+def reference_mode(mode):
+    """Picks the Pillow mode the original (and every variant) is compared in."""
+    has_alpha = mode.endswith("A")
+    if mode in GRAY_MODES:
+        return "LA" if has_alpha else "L"
+    return "RGBA" if has_alpha else "RGB"
+
+def to_array(img, mode):
+    """Converts a Pillow image to a float32 CxHxW array scaled to [0, 1]."""
+    if img.mode in ("I;16", "I") and mode == "L":
+        arr = np.asarray(img, dtype=np.float32) / 65535.0
+    else:
+        if img.mode != mode:
+            img = img.convert(mode)
+        arr = np.asarray(img, dtype=np.float32) / 255.0
+    if arr.ndim == 2:
+        return arr[np.newaxis, :, :]
+    return np.ascontiguousarray(arr.transpose(2, 0, 1))
+
+def load_image(path, mode=None, size=None):
+    """
+    Decodes an image into a CxHxW float32 array.
+    Returns (array, mode). `size` guards against comparing mismatched images.
+    """
+    with Image.open(path) as img:
+        if size is not None and img.size != size:
+            raise ValueError(f"Image sizes differ: {size} vs {img.size}")
+        mode = mode or reference_mode(img.mode)
+        return to_array(img, mode), mode
+
+def gaussian_kernel(sigma=SSIM_SIGMA, radius=SSIM_RADIUS):
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    k = np.exp(-(x ** 2) / (2 * sigma ** 2))
+    return (k / k.sum()).astype(np.float32)
+
+def gaussian_filter(plane, kernel, out=None):
+    """Separable Gaussian blur of a 2D plane with symmetric edge padding."""
+    radius = len(kernel) // 2
+    h, w = plane.shape
+    padded = np.pad(plane, radius, mode="symmetric")
+
+    rows = np.zeros((h + 2 * radius, w), dtype=np.float32)
+    for i, weight in enumerate(kernel):
+        rows += weight * padded[:, i:i + w]
+
+    if out is None:
+        out = np.zeros((h, w), dtype=np.float32)
+    else:
+        out[...] = 0
+    for i, weight in enumerate(kernel):
+        out += weight * rows[i:i + h, :]
+    return out
+
+def downsample(plane):
+    """2x2 box average (odd last row/column dropped), as between MS-SSIM scales."""
+    h, w = plane.shape[0] // 2, plane.shape[1] // 2
+    p = plane[:2 * h, :2 * w]
+    return (p[0::2, 0::2] + p[1::2, 0::2] + p[0::2, 1::2] + p[1::2, 1::2]) * 0.25
+
+def bands(h, w, radius, step=None):
+    """
+    Splits H rows into overlapping bands of `step` rows (default: about
+    SSIM_TILE_PIXELS pixels). Yields (r0, r1, lo, hi, core): output rows
+    r0:r1 are computed from input rows lo:hi (a `radius` halo each side) and
+    are rows `core` of that slice, so banded filtering is identical to
+    filtering the whole plane at once.
+    """
+    step = step or max(2 * radius + 1, SSIM_TILE_PIXELS // max(1, w))
+    for r0 in range(0, h, step):
+        r1 = min(h, r0 + step)
+        lo, hi = max(0, r0 - radius), min(h, r1 + radius)
+        yield r0, r1, lo, hi, slice(r0 - lo, r1 - lo)
+
+def window_stats(x, kernel, mu_out, var_out):
+    """Gaussian-window mean and variance maps of a plane, written band by band."""
+    h, w = x.shape
+    for r0, r1, lo, hi, core in bands(h, w, len(kernel) // 2):
+        xb = x[lo:hi]
+        mu = gaussian_filter(xb, kernel)[core]
+        mu_out[r0:r1] = mu
+        var_out[r0:r1] = gaussian_filter(xb * xb, kernel)[core] - mu * mu
+
+def ssim_band(xb, yb, kernel, core, mu_xb=None, sigma_xxb=None):
+    """
+    SSIM and contrast-structure sums over the `core` rows of one band (xb
+    and yb include the halo). `mu_xb`/`sigma_xxb` are the reference's window
+    maps for the core rows, if precomputed.
+    """
+    if mu_xb is None:
+        mu_xb = gaussian_filter(xb, kernel)[core]
+        sigma_xxb = gaussian_filter(xb * xb, kernel)[core] - mu_xb * mu_xb
+
+    mu_yb = gaussian_filter(yb, kernel)[core]
+    mu_xy = mu_xb * mu_yb
+    mu_yy = mu_yb * mu_yb
+    sigma_yyb = gaussian_filter(yb * yb, kernel)[core] - mu_yy
+    sigma_xyb = gaussian_filter(xb * yb, kernel)[core] - mu_xy
+
+    cs = (2 * sigma_xyb + SSIM_C2) / (sigma_xxb + sigma_yyb + SSIM_C2)
+    luminance = (2 * mu_xy + SSIM_C1) / (mu_xb * mu_xb + mu_yy + SSIM_C1)
+    return float(np.sum(luminance * cs, dtype=np.float64)), float(np.sum(cs, dtype=np.float64))
+
+def ssim_terms(x, y, kernel, mu_x=None, sigma_xx=None):
+    """
+    Mean SSIM and mean contrast-structure term of two planes, computed band
+    by band so temporaries stay bounded. `mu_x` and `sigma_xx` are the
+    reference's precomputed window maps, if available.
+    """
+    h, w = x.shape
+    ssim_sum = cs_sum = 0.0
+
+    for r0, r1, lo, hi, core in bands(h, w, len(kernel) // 2):
+        if mu_x is None:
+            band = ssim_band(x[lo:hi], y[lo:hi], kernel, core)
+        else:
+            band = ssim_band(x[lo:hi], y[lo:hi], kernel, core, mu_x[r0:r1], sigma_xx[r0:r1])
+        ssim_sum += band[0]
+        cs_sum += band[1]
+
+    n = h * w
+    return ssim_sum / n, cs_sum / n
+
+def ms_ssim_scales(shape, kernel):
+    """
+    MS-SSIM scale count and renormalized weights. Scales that would be
+    smaller than the window are dropped, so small images still get a value
+    (a single scale makes MS-SSIM equal SSIM).
+    """
+    scales = 1
+    while scales < len(MS_SSIM_WEIGHTS) and min(shape) >> scales >= len(kernel):
+        scales += 1
+    weights = np.array(MS_SSIM_WEIGHTS[:scales])
+    return scales, weights / weights.sum()
+
+def combine_scales(terms, weights):
+    """MS-SSIM from per-scale (ssim, cs): cs of every scale but the coarsest, then its SSIM."""
+    score = 1.0
+    for (_, cs), weight in zip(terms[:-1], weights[:-1]):
+        # Negative contrast terms (anti-correlated structure) count as zero
+        score *= max(cs, 0.0) ** weight
+    score *= max(terms[-1][0], 0.0) ** weights[-1]
+    return float(score)
+
+def ms_ssim(x, y, kernel, mu_x=None, sigma_xx=None):
+    """
+    Returns (SSIM, MS-SSIM) of two planes. The finest scale is plain SSIM,
+    so both come from one pass.
+    """
+    scales, weights = ms_ssim_scales(x.shape, kernel)
+
+    terms = [ssim_terms(x, y, kernel, mu_x, sigma_xx)]
+    for _ in range(1, scales):
+        x, y = downsample(x), downsample(y)
+        terms.append(ssim_terms(x, y, kernel))
+    return terms[0][0], combine_scales(terms, weights)
+
+def diff_factor(h, w, max_size):
+    """Block size by which a diff map is reduced to fit max_size (1: full resolution)."""
+    if max_size and max(h, w) > max_size:
+        return -(-max(h, w) // max_size)
+    return 1
+
+def reduce_mask(mask, f):
+    """Max-pools a boolean mask by f x f blocks (padding the edges)."""
+    if f == 1:
+        return mask
+    h, w = mask.shape
+    padded = np.zeros((-(-h // f) * f, -(-w // f) * f), dtype=bool)
+    padded[:h, :w] = mask
+    return padded.reshape(padded.shape[0] // f, f, padded.shape[1] // f, f).any(axis=(1, 3))
+
+def write_diff(mask, path, max_size=0):
+    """
+    Writes a boolean HxW difference mask as a two-color image in the format
+    of the path's extension, like 'magick compare' does for diff_<variant>:
+    a 1-bit palette PNG with fast compression, otherwise RGB (JPEG and WebP
+    at high quality, so the two colors stay crisp). With max_size, the
+    longest edge is reduced to at most max_size pixels; a preview pixel is
+    highlighted if any pixel in its block is, so isolated differences stay
+    visible.
+    """
+    mask = reduce_mask(mask, diff_factor(mask.shape[0], mask.shape[1], max_size))
+
+    img = Image.fromarray(mask.astype(np.uint8), "L")
+    img.putpalette(DIFF_LOWLIGHT + DIFF_HIGHLIGHT)
+    fmt = Image.registered_extensions().get(os.path.splitext(path)[1].lower(), "PNG")
+    if fmt == "PNG":
+        img.save(path, format="PNG", compress_level=1)
+    else:
+        img.convert("RGB").save(path, format=fmt, quality=95)
+
+def psnr_from_mse(mse):
+    if mse <= 0:
+        return PSNR_INF
+    return float(10 * np.log10(1.0 / mse))
+
+def channel_metrics(channels, stats):
+    """
+    Builds the metrics dict from per-channel (MAE, MSE, SSIM, MS-SSIM, NCC).
+    Keys match parse_magick_output: 'PSNR' for All, 'PSNR-Red' per channel.
+    """
+    data = {}
+    for channel, (mae, mse, ssim, msssim, ncc) in zip(channels, stats):
+        data[f"MAE-{channel}"] = mae * QUANTUM_RANGE
+        data[f"RMSE-{channel}"] = np.sqrt(mse) * QUANTUM_RANGE
+        data[f"PSNR-{channel}"] = psnr_from_mse(mse)
+        data[f"SSIM-{channel}"] = ssim
+        data[f"MSSSIM-{channel}"] = msssim
+        data[f"NCC-{channel}"] = ncc
+
+    # "All" follows magick: mean over channels (RMSE/PSNR via the mean MSE)
+    maes, mses, ssims, msssims, nccs = zip(*stats)
+    mean_mse = sum(mses) / len(mses)
+    data["MAE"] = sum(maes) / len(maes) * QUANTUM_RANGE
+    data["RMSE"] = np.sqrt(mean_mse) * QUANTUM_RANGE
+    data["PSNR"] = psnr_from_mse(mean_mse)
+    data["SSIM"] = sum(ssims) / len(ssims)
+    data["MSSSIM"] = sum(msssims) / len(msssims)
+    data["NCC"] = sum(nccs) / len(nccs)
+
+    return {k: float(v) for k, v in data.items()}
+
+class ReferenceImage:
+    """
+    The original image, decoded once, plus the per-channel statistics every
+    comparison needs (mean, variance, and the SSIM Gaussian-window mean and
+    variance maps).
+
+    Pixels and window maps live in one (3, C, H, W) float32 buffer. With
+    shared=True that buffer is a SharedMemory block, so analysis worker
+    processes can attach() to it without copying.
+    """
+
+    PIXELS, WINDOW_MEAN, WINDOW_VAR = 0, 1, 2
+
+    def __init__(self, planes, mode, means, variances, shm=None, owner=False):
+        self.planes = planes
+        self.mode = mode
+        self.channels = CHANNEL_NAMES[mode]
+        self.means = means
+        self.variances = variances
+        self.size = (planes.shape[3], planes.shape[2])  # Pillow (width, height)
+        self.kernel = gaussian_kernel()
+        self._shm = shm
+        self._owner = owner
+
+    @classmethod
+    def load(cls, path, shared=False):
+        pixels, mode = load_image(path)
+        shape = (3,) + pixels.shape
+        nbytes = int(np.prod(shape)) * np.dtype(np.float32).itemsize
+
+        shm = None
+        if shared:
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            planes = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        else:
+            planes = np.empty(shape, dtype=np.float32)
+
+        planes[cls.PIXELS] = pixels
+        del pixels
+
+        kernel = gaussian_kernel()
+        means, variances = [], []
+        for c in range(planes.shape[1]):
+            x = planes[cls.PIXELS, c]
+            means.append(float(x.mean(dtype=np.float64)))
+            variances.append(float(x.var(dtype=np.float64)))
+
+            window_stats(x, kernel, planes[cls.WINDOW_MEAN, c], planes[cls.WINDOW_VAR, c])
+
+        logger.debug(f"Decoded reference {path} once: {planes.shape[1]} channels, {nbytes / 2**20:.1f} MiB")
+        return cls(planes, mode, means, variances, shm=shm, owner=True)
+
+    def handle(self):
+        """Picklable description that workers pass to attach()."""
+        if self._shm is None:
+            raise ValueError("Reference image was not loaded with shared=True")
+        return {
+            "name": self._shm.name,
+            "shape": self.planes.shape,
+            "mode": self.mode,
+            "means": self.means,
+            "variances": self.variances,
+        }
+
+    @classmethod
+    def attach(cls, handle):
+        # Workers share the owner's resource tracker, so attaching needs no
+        # extra bookkeeping; only the owner unlinks the block in close().
+        shm = shared_memory.SharedMemory(name=handle["name"])
+        planes = np.ndarray(handle["shape"], dtype=np.float32, buffer=shm.buf)
+        return cls(planes, handle["mode"], handle["means"], handle["variances"], shm=shm)
+
+    def close(self):
+        """Releases the buffer; the owning process also unlinks shared memory."""
+        self.planes = None
+        if self._shm is not None:
+            self._shm.close()
+            if self._owner:
+                self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def compare(self, comp_path, diff_path=None, diff_max_size=0):
+        """
+        Decodes one variant and returns every metric, keyed like metrics.csv.
+        With diff_path, the difference map is written from the same decode.
+        """
+        comp, _ = load_image(comp_path, mode=self.mode, size=self.size)
+        if diff_path is None:
+            return self.compare_array(comp)
+        mask = np.zeros(comp.shape[1:], dtype=bool)
+        data = self.compare_array(comp, mask)
+        write_diff(mask, diff_path, diff_max_size)
+        return data
+
+    def compare_array(self, comp, diff_mask=None):
+        """
+        Computes every metric per channel and for "All" in one pass.
+        Keys match parse_magick_output: 'PSNR' for All, 'PSNR-Red' per channel.
+        An HxW boolean `diff_mask` is filled with the pixels beyond DIFF_FUZZ.
+        """
+        stats = []
+        for c in range(len(self.channels)):
+            x = self.planes[self.PIXELS, c]
+            y = comp[c]
+            diff = x - y
+            abs_diff = np.abs(diff)
+            if diff_mask is not None:
+                diff_mask |= abs_diff > DIFF_FUZZ
+
+            mae = float(np.mean(abs_diff, dtype=np.float64))
+            mse = float(np.mean(diff * diff, dtype=np.float64))
+            ssim, msssim = self._ssim(c, y)
+            stats.append((mae, mse, ssim, msssim, self._ncc(c, x, y)))
+
+        return channel_metrics(self.channels, stats)
+
+    def _ssim(self, c, y):
+        """(SSIM, MS-SSIM) of channel c, reusing the reference's window maps."""
+        return ms_ssim(self.planes[self.PIXELS, c], y, self.kernel,
+                       self.planes[self.WINDOW_MEAN, c], self.planes[self.WINDOW_VAR, c])
+
+    def _ncc(self, c, x, y):
+        """Normalized cross correlation of channel c, reusing the reference mean/variance."""
+        mean_y = float(y.mean(dtype=np.float64))
+        var_y = float(y.var(dtype=np.float64))
+        var_x = self.variances[c]
+        if var_x == 0 or var_y == 0:
+            return 1.0 if np.array_equal(x, y) else 0.0
+        cov = float(np.mean(x * y, dtype=np.float64)) - self.means[c] * mean_y
+        return cov / np.sqrt(var_x * var_y)
+
+class RawImage:
+    """
+    An image (or MS-SSIM pyramid level) spilled to disk as raw CxHxW samples.
+    Bands are read with plain file reads rather than through a memory map,
+    so the pages of a gigapixel file never count against the process.
+    """
+
+    def __init__(self, path, dtype, shape, scale=1.0):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.scale = scale
+
+    @classmethod
+    def create(cls, directory, dtype, shape, scale=1.0):
+        fd, path = tempfile.mkstemp(suffix=".raw", dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            f.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        return cls(path, dtype, shape, scale)
+
+    def _offset(self, c, row):
+        return (c * self.shape[1] + row) * self.shape[2] * self.dtype.itemsize
+
+    def read(self, c, lo, hi):
+        """Rows lo:hi of channel c as float32 in [0, 1]."""
+        width = self.shape[2]
+        band = np.fromfile(self.path, dtype=self.dtype, count=(hi - lo) * width,
+                           offset=self._offset(c, lo)).reshape(hi - lo, width)
+        if self.dtype == np.float32:
+            return band
+        return band.astype(np.float32) / self.scale
+
+    def write(self, c, row, band):
+        with open(self.path, "r+b") as f:
+            f.seek(self._offset(c, row))
+            np.ascontiguousarray(band, dtype=self.dtype).tofile(f)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def handle(self):
+        return {"path": self.path, "dtype": self.dtype.str, "shape": self.shape, "scale": self.scale}
+
+# Pillow's decompression-bomb limit (about 179 MP) guards full decodes; the
+# tiled engine bounds its own memory, so it lifts the limit while it decodes
+_pixel_limit_lock = threading.Lock()
+_pixel_limit_users = 0
+_pixel_limit_saved = None
+
+@contextlib.contextmanager
+def unbounded_pixels():
+    """Lifts Image.MAX_IMAGE_PIXELS until the last concurrent user leaves, then restores it."""
+    global _pixel_limit_users, _pixel_limit_saved
+    with _pixel_limit_lock:
+        if _pixel_limit_users == 0:
+            _pixel_limit_saved = Image.MAX_IMAGE_PIXELS
+            Image.MAX_IMAGE_PIXELS = None
+        _pixel_limit_users += 1
+    try:
+        yield
+    finally:
+        with _pixel_limit_lock:
+            _pixel_limit_users -= 1
+            if _pixel_limit_users == 0:
+                Image.MAX_IMAGE_PIXELS = _pixel_limit_saved
+
+def raw_row_bytes(mode, args, width):
+    """
+    Bytes per row of a 'raw' tile. Unless the tile gives a stride, the
+    decoder derives it from the raw mode's bits per pixel, which Pillow does
+    not expose: an 8-pixel row takes exactly that many bytes, so the
+    smallest feed that fills one is measured.
+    """
+    if args[1]:
+        return abs(args[1])
+    lo, hi = 1, 256
+    while lo < hi:
+        mid = (lo + hi) // 2
+        decoder = Image._getdecoder(mode, "raw", args)
+        try:
+            decoder.setimage(Image.new(mode, (8, 1)).im, (0, 0, 8, 1))
+            full = decoder.decode(bytes(mid))[0] < 0
+        finally:
+            decoder.cleanup()
+        if full:
+            hi = mid
+        else:
+            lo = mid + 1
+    return (lo * width + 7) // 8
+
+def split_raw_tiles(img, rows):
+    """A lazily opened image's tiles, with 'raw' ones cut into strips of `rows` rows."""
+    tiles = []
+    for name, (x0, y0, x1, y1), offset, args in img.tile:
+        if name != "raw" or y1 - y0 <= rows:
+            tiles.append((name, (x0, y0, x1, y1), offset, args))
+            continue
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        stride = raw_row_bytes(img.mode, args, x1 - x0)
+        bottom_up = len(args) > 2 and args[2] < 0
+        for top in range(y0, y1, rows):
+            bottom = min(y1, top + rows)
+            # Bottom-up data (BMP) stores the last row first
+            skip = y1 - bottom if bottom_up else top - y0
+            tiles.append((name, (x0, top, x1, bottom), offset + skip * stride, args))
+    return tiles
+
+def tile_bands(tiles, rows):
+    """
+    Groups tiles (see split_raw_tiles) into row bands of at least `rows`
+    rows that no tile straddles. Returns a list of (top, bottom, tiles).
+    Single-tile formats (PNG, JPEG) give one band.
+    """
+    bands, band, top, bottom = [], [], 0, 0
+    for tile in sorted(tiles, key=lambda t: (t[1][1], t[1][0])):
+        y0, y1 = tile[1][1], tile[1][3]
+        if band and y0 >= bottom and bottom - top >= rows:
+            bands.append((top, bottom, band))
+            band, top = [], bottom
+        band.append(tile)
+        bottom = max(bottom, y1)
+    if band:
+        bands.append((top, bottom, band))
+    return bands
+
+def decode_tiles(img, tiles, top, height):
+    """
+    Decodes some tiles of a lazily opened image into a new band image whose
+    first row is image row `top`, much as ImageFile.load decodes them all.
+    """
+    band = Image.new(img.mode, (img.width, height))
+    for name, (x0, y0, x1, y1), offset, args in tiles:
+        decoder = Image._getdecoder(img.mode, name, args, img.decoderconfig)
+        try:
+            decoder.setimage(band.im, (x0, y0 - top, x1, y1 - top))
+            img.fp.seek(offset)
+            if decoder.pulls_fd:
+                decoder.setfd(img.fp)
+                err = decoder.decode(b"")[1]
+            else:
+                data = b""
+                while True:
+                    chunk = img.fp.read(img.decodermaxblock)
+                    if not chunk:
+                        raise OSError(f"{img.filename} is truncated")
+                    n, err = decoder.decode(data + chunk)
+                    if n < 0:
+                        break
+                    data = (data + chunk)[n:]
+        finally:
+            decoder.cleanup()
+        if err < 0:
+            raise OSError(f"Could not decode {img.filename} (decoder error {err})")
+    if img.palette is not None:
+        rawmode, data = img.palette.getdata()
+        band.putpalette(data, rawmode)
+    band.info = dict(img.info)
+    return band
+
+def banded_decode_supported():
+    try:
+        version = tuple(int(part) for part in PIL.__version__.split(".")[:2])
+    except ValueError:
+        return False
+    first, last = BANDED_DECODE_PILLOW
+    return first <= version < last
+
+def decoded_bands(path, rows):
+    """
+    Yields (top, band image) covering an image from top to bottom. Where its
+    tiles allow (uncompressed or striped TIFF, BMP, PPM), each band is
+    decoded on its own, so only about `rows` rows are ever in memory;
+    otherwise (PNG, JPEG, WebP, or an untested Pillow) the image is decoded
+    once and cropped.
+    """
+    with Image.open(path) as img:
+        w, h = img.size
+        bands = []
+        if banded_decode_supported():
+            try:
+                bands = tile_bands(split_raw_tiles(img, rows), rows)
+            except (AttributeError, TypeError, ValueError) as e:
+                logger.debug(f"Decoding {path} whole, its tiles cannot be split: {e}")
+        # Formats with their own read hooks, or rotated by an EXIF tag on load, decode whole
+        if len(bands) <= 1 or hasattr(img, "load_read") or img.getexif().get(EXIF_ORIENTATION, 1) != 1:
+            img.load()
+            for r0 in range(0, h, rows):
+                yield r0, img.crop((0, r0, w, min(h, r0 + rows)))
+            return
+        for top, bottom, tiles in bands:
+            yield top, decode_tiles(img, tiles, top, bottom - top)
+
+def spill_image(path, directory, mode=None, size=None):
+    """
+    Decodes an image once and copies it to a RawImage (8-bit, or 16-bit for
+    16-bit grayscale) in chunks, converting each chunk to the compare mode,
+    so no full-size converted or float copy is ever made. Striped sources
+    are decoded band by band (see decoded_bands). Returns (raw, mode).
+    """
+    with unbounded_pixels():
+        with Image.open(path) as img:
+            if size is not None and img.size != size:
+                raise ValueError(f"Image sizes differ: {size} vs {img.size}")
+            mode = mode or reference_mode(img.mode)
+            deep = img.mode in ("I;16", "I") and mode == "L"
+            w, h = img.size
+        channels = len(CHANNEL_NAMES[mode])
+        raw = RawImage.create(directory, np.uint16 if deep else np.uint8, (channels, h, w),
+                              65535.0 if deep else 255.0)
+        try:
+            for r0, chunk in decoded_bands(path, max(1, SPILL_CHUNK_BYTES // (w * channels))):
+                if not deep and chunk.mode != mode:
+                    chunk = chunk.convert(mode)
+                arr = np.asarray(chunk)
+                if deep:
+                    arr = np.clip(arr, 0, 65535)
+                if arr.ndim == 2:
+                    arr = arr[:, :, np.newaxis]
+                for c in range(channels):
+                    raw.write(c, r0, arr[:, :, c])
+        except BaseException:
+            raw.remove()
+            raise
+    return raw, mode
+
+def downsample_level(src, directory, step):
+    """Writes the next MS-SSIM scale of a RawImage band by band. Returns it."""
+    channels, h, w = src.shape
+    dst = RawImage.create(directory, np.float32, (channels, h // 2, w // 2))
+    for c in range(channels):
+        for r0 in range(0, h, step):
+            dst.write(c, r0 // 2, downsample(src.read(c, r0, min(h, r0 + step))))
+    return dst
+
+class TiledReference:
+    """
+    The original image for the 'tiled' engine, meant for sources too large
+    to hold as float arrays: it is decoded once and spilled next to the
+    image as raw samples, together with its MS-SSIM pyramid. compare()
+    spills each variant the same way and accumulates every metric over row
+    bands sized to `budget_bytes`, so memory follows the budget, not the
+    image. Results match ReferenceImage up to float summation order.
+
+    Worker processes attach() to the same files; the owner removes them in
+    close().
+    """
+
+    def __init__(self, spill_dir, levels, mode, means, variances, budget_bytes, owner=False):
+        self.spill_dir = spill_dir
+        self.levels = levels
+        self.mode = mode
+        self.channels = CHANNEL_NAMES[mode]
+        self.means = means
+        self.variances = variances
+        self.budget_bytes = budget_bytes
+        self.size = (levels[0].shape[2], levels[0].shape[1])  # Pillow (width, height)
+        self.kernel = gaussian_kernel()
+        self.scales, self.weights = ms_ssim_scales(levels[0].shape[1:], self.kernel)
+        self._owner = owner
+
+    def band_rows(self, width, multiple=2):
+        """Rows per band for planes of this width; a multiple of `multiple` (even, for downsampling)."""
+        rows = max(2 * SSIM_RADIUS + 2, self.budget_bytes // (max(1, width) * TILE_BYTES_PER_PIXEL))
+        return max(multiple, rows // multiple * multiple)
+
+    @classmethod
+    def load(cls, path, budget_mb=TILE_BUDGET_MB, spill_dir=None):
+        spill_dir = tempfile.mkdtemp(prefix=".tiles-", dir=spill_dir or os.path.dirname(os.path.abspath(path)))
+        reference = None
+        try:
+            raw, mode = spill_image(path, spill_dir)
+            reference = cls(spill_dir, [raw], mode, [], [], budget_mb * 2**20, owner=True)
+            channels, h, w = raw.shape
+            step = reference.band_rows(w)
+
+            for c in range(channels):
+                total = squares = 0.0
+                lowest, highest = np.inf, -np.inf
+                for r0 in range(0, h, step):
+                    x = raw.read(c, r0, min(h, r0 + step))
+                    total += float(np.sum(x, dtype=np.float64))
+                    squares += float(np.sum(x * x, dtype=np.float64))
+                    lowest, highest = min(lowest, float(x.min())), max(highest, float(x.max()))
+                mean = total / (h * w)
+                reference.means.append(mean)
+                # A constant plane has exactly zero variance (NCC depends on it)
+                reference.variances.append(0.0 if lowest == highest else max(0.0, squares / (h * w) - mean * mean))
+
+            for _ in range(1, reference.scales):
+                level = reference.levels[-1]
+                reference.levels.append(downsample_level(level, spill_dir, reference.band_rows(level.shape[2])))
+        except BaseException:
+            if reference is not None:
+                reference.close()
+            else:
+                shutil.rmtree(spill_dir, ignore_errors=True)
+            raise
+
+        logger.debug(f"Spilled reference {path} to {spill_dir}: {len(reference.channels)} channels, "
+                     f"{reference.scales} scales, {budget_mb} MiB budget")
+        return reference
+
+    def handle(self):
+        """Picklable description that workers pass to attach_reference()."""
+        return {
+            "kind": "tiled",
+            "spill_dir": self.spill_dir,
+            "levels": [level.handle() for level in self.levels],
+            "mode": self.mode,
+            "means": self.means,
+            "variances": self.variances,
+            "budget_bytes": self.budget_bytes,
+        }
+
+    @classmethod
+    def attach(cls, handle):
+        levels = [RawImage(**level) for level in handle["levels"]]
+        return cls(handle["spill_dir"], levels, handle["mode"], handle["means"], handle["variances"],
+                   handle["budget_bytes"])
+
+    def close(self):
+        """The owning process removes the spill files."""
+        if self._owner:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self._owner = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def compare(self, comp_path, diff_path=None, diff_max_size=0):
+        """
+        Spills one variant and returns every metric, keyed like metrics.csv.
+        With diff_path, the difference map is written from the same pass,
+        reduced to at most TILED_DIFF_MAX_SIZE unless diff_max_size is set.
+        """
+        comp, _ = spill_image(comp_path, self.spill_dir, mode=self.mode, size=self.size)
+        spilled = [comp]
+        try:
+            return self._compare_raw(comp, diff_path, diff_max_size or TILED_DIFF_MAX_SIZE, spilled)
+        finally:
+            for raw in spilled:
+                raw.remove()
+
+    def _compare_raw(self, comp, diff_path, diff_max_size, spilled):
+        channels, h, w = comp.shape
+        n = h * w
+        radius = len(self.kernel) // 2
+        f = diff_factor(h, w, diff_max_size) if diff_path is not None else 1
+        mask = np.zeros((-(-h // f), -(-w // f)), dtype=bool) if diff_path is not None else None
+
+        # Per-channel sums over the full-resolution pass
+        abs_sums, sq_sums, y_sums, yy_sums, xy_sums, ssim_sums, cs_sums = np.zeros((7, channels))
+        lowest, highest = np.full(channels, np.inf), np.full(channels, -np.inf)
+
+        # The variant's second scale is written while the first is measured
+        following = None
+        if self.scales > 1:
+            following = RawImage.create(self.spill_dir, np.float32, (channels, h // 2, w // 2))
+            spilled.append(following)
+
+        for r0, r1, lo, hi, core in bands(h, w, radius, self.band_rows(w, int(np.lcm(2, f)))):
+            band_mask = np.zeros((r1 - r0, w), dtype=bool) if mask is not None else None
+            for c in range(channels):
+                xb, yb = self.levels[0].read(c, lo, hi), comp.read(c, lo, hi)
+                x, y = xb[core], yb[core]
+                diff = x - y
+                abs_diff = np.abs(diff)
+                if band_mask is not None:
+                    band_mask |= abs_diff > DIFF_FUZZ
+
+                abs_sums[c] += np.sum(abs_diff, dtype=np.float64)
+                sq_sums[c] += np.sum(diff * diff, dtype=np.float64)
+                y_sums[c] += np.sum(y, dtype=np.float64)
+                yy_sums[c] += np.sum(y * y, dtype=np.float64)
+                xy_sums[c] += np.sum(x * y, dtype=np.float64)
+                lowest[c], highest[c] = min(lowest[c], y.min()), max(highest[c], y.max())
+
+                ssim_sum, cs_sum = ssim_band(xb, yb, self.kernel, core)
+                ssim_sums[c] += ssim_sum
+                cs_sums[c] += cs_sum
+                if following is not None:
+                    following.write(c, r0 // 2, downsample(y))
+            if mask is not None:
+                mask[r0 // f:-(-r1 // f)] = reduce_mask(band_mask, f)
+
+        terms = [[(ssim_sums[c] / n, cs_sums[c] / n)] for c in range(channels)]
+        for j in range(1, self.scales):
+            following = self._scale_terms(self.levels[j], following, terms, spilled)
+
+        if mask is not None:
+            write_diff(mask, diff_path)
+
+        stats = []
+        for c in range(channels):
+            mean_y = y_sums[c] / n
+            var_y = 0.0 if lowest[c] == highest[c] else max(0.0, yy_sums[c] / n - mean_y * mean_y)
+            var_x = self.variances[c]
+            if var_x == 0 or var_y == 0:
+                ncc = 1.0 if abs_sums[c] == 0 else 0.0
+            else:
+                ncc = (xy_sums[c] / n - self.means[c] * mean_y) / np.sqrt(var_x * var_y)
+            stats.append((abs_sums[c] / n, sq_sums[c] / n, terms[c][0][0],
+                          combine_scales(terms[c], self.weights), ncc))
+        return channel_metrics(self.channels, stats)
+
+    def _scale_terms(self, x_level, y_level, terms, spilled):
+        """
+        Appends each channel's (SSIM, cs) at one coarser scale. Returns the
+        variant's next scale (also added to `spilled`), or None after the last.
+        """
+        channels, h, w = x_level.shape
+        radius = len(self.kernel) // 2
+        following = None
+        if len(terms[0]) + 1 < self.scales:
+            following = RawImage.create(self.spill_dir, np.float32, (channels, h // 2, w // 2))
+            spilled.append(following)
+
+        for c in range(channels):
+            ssim_sum = cs_sum = 0.0
+            for r0, r1, lo, hi, core in bands(h, w, radius, self.band_rows(w)):
+                yb = y_level.read(c, lo, hi)
+                band = ssim_band(x_level.read(c, lo, hi), yb, self.kernel, core)
+                ssim_sum += band[0]
+                cs_sum += band[1]
+                if following is not None:
+                    following.write(c, r0 // 2, downsample(yb[core]))
+            terms[c].append((ssim_sum / (h * w), cs_sum / (h * w)))
+        y_level.remove()
+        return following
+
+def attach_reference(handle):
+    """Attaches to a ReferenceImage or TiledReference from its handle()."""
+    if handle.get("kind") == "tiled":
+        return TiledReference.attach(handle)
+    return ReferenceImage.attach(handle)
+
+def compare_images(original_path, comp_path):
+    """Decodes the pair once and returns every metric, keyed like metrics.csv."""
+    with ReferenceImage.load(original_path) as reference:
+        return reference.compare(comp_path)
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
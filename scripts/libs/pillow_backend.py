@@ -0,0 +1,180 @@
+# ==============================================================================
+# Script Name: pillow_backend.py
+# Description: Helper module for the in-process encoder backend. Decodes the
+#              source once with Pillow and encodes WebP/JPEG/PNG variants from
+#              the in-memory image instead of spawning cwebp / magick. Also
+#              times how fast variants decode.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import io
+import time
+import logging
+import statistics
+import threading
+import sys
+
+from PIL import Image, features
+
+logger = logging.getLogger("PillowBackend")
+
+# Pillow format name per variant format
+PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG", "png": "PNG"}
+
+# cwebp's default effort (-q 75 -m 4) also applies to its lossless mode
+WEBP_METHOD = 4
+WEBP_LOSSLESS_EFFORT = 75
+
+# ImageMagick switches JPEG chroma subsampling off (4:4:4) from quality 90
+JPEG_NO_SUBSAMPLING_FROM = 90
+
+# Decode benchmark: stop repeating once this many seconds are spent, as long
+# as DECODE_MIN_REPEATS decodes were timed, so huge variants stay affordable
+DECODE_TIME_LIMIT_S = 2.0
+DECODE_MIN_REPEATS = 3
+
+def available(fmt):
+    """True if this Pillow build can encode the given variant format."""
+    if fmt == "webp":
+        return features.check("webp")
+    return fmt in PIL_FORMATS
+
+def version(fmt):
+    """Encoder version string used in cache keys."""
+    import PIL
+    codec = {"webp": "webp", "jpeg": "jpg", "png": "zlib"}.get(fmt)
+    lib_version = features.version(codec) if codec else None
+    return f"Pillow {PIL.__version__} / {codec} {lib_version}"
+
+def to_8bit(img):
+    """Scales 16/32-bit integer images to 8-bit (Pillow's convert() would clip)."""
+    if img.mode in ("I", "I;16", "I;16B", "I;16L"):
+        return img.convert("I").point(lambda v: v * (1 / 256)).convert("L")
+    if img.mode == "F":
+        return img.convert("L")
+    return img
+
+def mode_for(img, fmt):
+    """Picks a mode the target format can store, keeping alpha where supported."""
+    mode = img.mode
+    has_alpha = mode in ("RGBA", "LA", "PA") or (mode == "P" and "transparency" in img.info)
+
+    if fmt == "jpeg":
+        return mode if mode in ("L", "RGB", "CMYK") else "RGB"
+    if fmt == "webp":
+        return "RGBA" if has_alpha else "RGB"
+    # PNG stores nearly everything natively
+    if mode == "CMYK" or mode.startswith("YCbCr"):
+        return "RGB"
+    return mode
+
+class PillowSource:
+    """
+    The source image decoded once (lazily, thread-safe) and shared by every
+    variant of one image. Conversions per target mode are cached as well.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.icc_profile = None
+        self._image = None
+        self._converted = {}
+        self._lock = threading.Lock()
+
+    def for_format(self, fmt):
+        """
+        Returns a private copy of the source in a mode `fmt` can store.
+        Image.save() writes encoder state onto the image object, so threads
+        must not save the shared instance concurrently; a copy is a memcpy,
+        far cheaper than decoding again.
+        """
+        with self._lock:
+            if self._image is None:
+                with Image.open(self.path) as img:
+                    img.load()
+                    self._image = img.copy()
+                    self.icc_profile = img.info.get("icc_profile")
+                logger.debug(f"Decoded {self.path} once ({self._image.mode} {self._image.size})")
+
+            base = self._image
+            if fmt != "png":
+                base = to_8bit(base)
+            mode = mode_for(base, fmt)
+            key = (fmt == "png", mode)
+            if key not in self._converted:
+                self._converted[key] = base if base.mode == mode else base.convert(mode)
+            converted = self._converted[key]
+        return converted.copy()
+
+    def close(self):
+        with self._lock:
+            self._image = None
+            self._converted = {}
+
+def encode(source, fmt, output_path, quality=None, lossless=False):
+    """Encodes one variant from the shared in-memory source."""
+    img = source.for_format(fmt)
+    icc = source.icc_profile
+    options = {}
+
+    if fmt == "webp":
+        if lossless:
+            options = {"lossless": True, "quality": WEBP_LOSSLESS_EFFORT, "method": WEBP_METHOD}
+        else:
+            options = {"quality": quality, "method": WEBP_METHOD}
+    elif fmt == "jpeg":
+        options = {
+            "quality": quality,
+            "subsampling": 0 if quality >= JPEG_NO_SUBSAMPLING_FROM else 2,
+            "optimize": True,
+        }
+        if icc:
+            options["icc_profile"] = icc
+    elif fmt == "png":
+        if icc:
+            options["icc_profile"] = icc
+
+    try:
+        img.save(output_path, format=PIL_FORMATS[fmt], **options)
+    except OSError:
+        # Pillow sizes the optimized-Huffman buffer from the pixel count, which
+        # near-incompressible content can overflow; plain coding has no limit.
+        if not options.get("optimize"):
+            raise
+        logger.debug(f"Optimized coding overflowed for {output_path}, retrying without it")
+        options["optimize"] = False
+        img.save(output_path, format=PIL_FORMATS[fmt], **options)
+
+def decode_benchmark(path, repeats):
+    """
+    Times `repeats` full decodes of an image file from memory, after one
+    untimed warm-up decode, so the figure is the codec's alone (no disk
+    reads or first-use set-up). Returns (median seconds, pixel count).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    def decode():
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            return img.width * img.height
+
+    pixels = decode()
+    times = []
+    started = time.perf_counter()
+    for _ in range(max(1, repeats)):
+        t = time.perf_counter()
+        decode()
+        times.append(time.perf_counter() - t)
+        if len(times) >= DECODE_MIN_REPEATS and time.perf_counter() - started > DECODE_TIME_LIMIT_S:
+            break
+    return statistics.median(times), pixels
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
@@ -0,0 +1,125 @@
+# ==============================================================================
+# Script Name: probe.py
+# Description: Helper module for reading image metadata straight from file
+#              headers (JPEG SOF, PNG IHDR, WebP VP8/VP8L/VP8X). Gives the
+#              same fields as 'magick identify' without decoding pixels or
+#              spawning a process.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import struct
+import logging
+import sys
+
+logger = logging.getLogger("Probe")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG colour types without colour information
+PNG_GRAY_TYPES = (0, 4)
+
+# SOFn markers (C4 = DHT, C8 = JPG extension, CC = DAC are not frame headers)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Markers without a length field
+JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xD8)) | {0x01}
+
+JPEG_COLORSPACES = {1: "Gray", 3: "sRGB", 4: "CMYK"}
+
+def details(width, height, depth, colorspace, fmt):
+    """The fields (and key order) of the 'magick identify' format string in analyzer."""
+    return {"width": width, "height": height, "depth": depth, "colorspace": colorspace, "format": fmt}
+
+def probe_png(f, head):
+    if not head.startswith(PNG_SIGNATURE) or head[12:16] != b"IHDR":
+        return None
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", head[16:26])
+    colorspace = "Gray" if color_type in PNG_GRAY_TYPES else "sRGB"
+    # Palette entries are always 8 bits per channel, whatever the index depth
+    depth = 8 if color_type == 3 else bit_depth
+    return details(width, height, depth, colorspace, "PNG")
+
+def probe_webp(f, head):
+    if head[:4] != b"RIFF" or head[8:12] != b"WEBP":
+        return None
+    chunk, body = head[12:16], head[20:]
+    if chunk == b"VP8 ":
+        # Key frame: 3-byte frame tag, start code, then 14-bit dimensions
+        if body[3:6] != b"\x9d\x01\x2a":
+            return None
+        width, height = struct.unpack("<HH", body[6:10])
+        width, height = width & 0x3FFF, height & 0x3FFF
+    elif chunk == b"VP8L":
+        if body[:1] != b"\x2f":
+            return None
+        bits = struct.unpack("<I", body[1:5])[0]
+        width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    elif chunk == b"VP8X":
+        # Flags (4 bytes), then 24-bit canvas width-1 and height-1
+        width = int.from_bytes(body[4:7], "little") + 1
+        height = int.from_bytes(body[7:10], "little") + 1
+    else:
+        return None
+    return details(width, height, 8, "sRGB", "WEBP")
+
+def probe_jpeg(f, head):
+    """Walks the marker segments up to the frame header, seeking over EXIF/ICC payloads."""
+    if head[:2] != b"\xff\xd8":
+        return None
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code == 0xFF:
+            # Fill byte before the actual marker
+            f.seek(-1, 1)
+            continue
+        if code in JPEG_STANDALONE_MARKERS:
+            continue
+        if code in (0xD9, 0xDA):
+            # End of image / start of scan before any frame header
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if code in JPEG_SOF_MARKERS:
+            segment = f.read(6)
+            if len(segment) < 6:
+                return None
+            precision, height, width, components = struct.unpack(">BHHB", segment)
+            colorspace = JPEG_COLORSPACES.get(components)
+            if colorspace is None:
+                return None
+            return details(width, height, precision, colorspace, "JPEG")
+        f.seek(length - 2, 1)
+
+PROBES = (probe_png, probe_webp, probe_jpeg)
+
+def read_details(path):
+    """
+    Returns identify-style details from the file header, or None if the
+    format is not recognized (or the header is damaged) so the caller can
+    fall back to 'magick identify'.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(64)
+            for probe in PROBES:
+                info = probe(f, head)
+                if info is not None:
+                    return info
+    except (OSError, struct.error) as e:
+        logger.debug(f"Could not probe {path}: {e}")
+    return None
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
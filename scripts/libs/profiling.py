@@ -0,0 +1,266 @@
+# ==============================================================================
+# Script Name: profiling.py
+# Description: Helper module for profiling the tool itself. Measures how long
+#              each module takes to import (--profile-startup) and records
+#              wall/CPU time, subprocesses and memory per pipeline stage
+#              (data/profile.json). The tools themselves are run by
+#              runner.py, which reports each one here.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import json
+import time
+import builtins
+import functools
+import threading
+import importlib.util
+import sys
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage, so neither peak nor current RSS is reported
+    resource = None
+
+# Linux: current resident pages of this process (second field)
+STATM_PATH = "/proc/self/statm"
+
+# Per-thread state: the RunProfile being recorded and its open stages
+_local = threading.local()
+
+class ImportProfiler:
+    """
+    Times every module imported inside the `with` block, like
+    'python -X importtime' but without restarting the interpreter.
+    Records self time (excluding nested imports) and cumulative time.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.records = []  # (name, self_seconds, cumulative_seconds, depth)
+        self.total = 0.0
+        self._stack = []
+        self._recorded = set()
+        self._original_import = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        if self.enabled:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._import
+        return self
+
+    def __exit__(self, *exc):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+        self.total = time.perf_counter() - self._start
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        base = name
+        if level:
+            try:
+                base = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__"))
+            except (ImportError, ValueError):
+                return self._original_import(name, globals, locals, fromlist, level)
+
+        # 'from pkg import submodule' loads submodules without passing through here again
+        candidates = [base] + [f"{base}.{f}" for f in fromlist or () if f != "*"]
+        pending = [m for m in candidates if m not in sys.modules]
+        if not pending:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            # Submodules already timed by a nested import are not repeated here
+            loaded = [m for m in pending if m in sys.modules and m not in self._recorded]
+            if loaded:
+                self._recorded.update(loaded)
+                label = loaded[0] if len(loaded) == 1 else f"{loaded[0]} (+{len(loaded) - 1} more)"
+                self.records.append((label, elapsed - children, elapsed, len(self._stack)))
+
+    def report(self, limit=25, stream=None):
+        """Prints the slowest imports (by cumulative time) and the total."""
+        stream = stream or sys.stderr
+        print(f"\nStartup imports: {self.total * 1000:.1f} ms total, {len(self.records)} modules", file=stream)
+        print(f"  {'self ms':>9} {'cumul ms':>9}  module", file=stream)
+        for name, own, cumulative, depth in sorted(self.records, key=lambda r: -r[2])[:limit]:
+            print(f"  {own * 1000:9.1f} {cumulative * 1000:9.1f}  {'  ' * depth}{name}", file=stream)
+
+def _rss_mb(maxrss):
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+def peak_rss_mb():
+    """High-water mark of this process's resident memory, in MiB (None if unknown)."""
+    if resource is None:
+        return None
+    return round(_rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss), 1)
+
+def current_rss_mb():
+    """This process's resident memory right now, in MiB (None where /proc is missing)."""
+    if resource is None:
+        return None
+    try:
+        with open(STATM_PATH) as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(pages * resource.getpagesize() / 2**20, 1)
+
+class RunProfile:
+    """
+    Stage timings for one image. Work done inside bind()-wrapped callables
+    (on any thread) is recorded by stage() and runner.run_command() without the
+    profile being passed down the call chain.
+
+    Memory per stage is the process's RSS when the stage ends (`rss_mb`)
+    and how much it grew during the stage (`rss_growth_mb`). RSS is shared
+    by every thread, so concurrent stages see each other's allocations;
+    `peak_rss_mb` is the process high-water mark for the whole run.
+    """
+
+    def __init__(self, label=None):
+        self.label = label
+        self.records = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def bind(self, fn):
+        """Wraps fn so stages it runs are recorded into this profile."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            previous = getattr(_local, "profile", None)
+            _local.profile = self
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _local.profile = previous
+        return wrapper
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def stages(self):
+        """Totals per stage name, in first-seen order."""
+        totals = {}
+        with self._lock:
+            records = list(self.records)
+        for r in records:
+            t = totals.setdefault(r["stage"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "subprocesses": 0,
+                                               "subprocess_cpu_s": 0.0, "rss_mb": None, "rss_growth_mb": None,
+                                               "subprocess_peak_rss_mb": None})
+            t["calls"] += 1
+            for k in ("wall_s", "cpu_s", "subprocesses", "subprocess_cpu_s"):
+                t[k] += r[k]
+            # The largest of each call: RSS at its end, its growth and its biggest tool
+            for k in ("rss_mb", "rss_growth_mb", "subprocess_peak_rss_mb"):
+                if r[k] is not None:
+                    t[k] = max(t[k] or 0.0, r[k])
+        for t in totals.values():
+            for k in ("wall_s", "cpu_s", "subprocess_cpu_s"):
+                t[k] = round(t[k], 4)
+        return totals
+
+    def variants(self):
+        """Per-variant stage records: {variant: {stage: {...}}}."""
+        out = {}
+        with self._lock:
+            records = [r for r in self.records if r["variant"]]
+        for r in records:
+            stages = out.setdefault(r["variant"], {})
+            entry = stages.setdefault(r["stage"], {"wall_s": 0.0, "cpu_s": 0.0, "subprocesses": 0})
+            entry["wall_s"] = round(entry["wall_s"] + r["wall_s"], 4)
+            entry["cpu_s"] = round(entry["cpu_s"] + r["cpu_s"], 4)
+            entry["subprocesses"] += r["subprocesses"]
+        return out
+
+    def to_dict(self):
+        return {
+            "image": self.label,
+            "wall_s": round(time.perf_counter() - self._start, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": self.stages(),
+            "variants": self.variants(),
+        }
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+@contextmanager
+def stage(name, variant=None):
+    """
+    Times a block as one stage (of one variant) of the active RunProfile:
+    wall time, CPU time of this thread plus any subprocesses, subprocess
+    count, and RSS sampled at entry and exit. A no-op outside
+    RunProfile.bind().
+    """
+    profile = getattr(_local, "profile", None)
+    if profile is None:
+        yield None
+        return
+
+    record = {"stage": name, "variant": variant, "subprocesses": 0, "subprocess_cpu_s": 0.0,
+              "subprocess_peak_rss_mb": None}
+    stack = _local.__dict__.setdefault("stack", [])
+    stack.append(record)
+    rss = current_rss_mb()
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield record
+    finally:
+        stack.remove(record)
+        record["wall_s"] = time.perf_counter() - wall
+        record["cpu_s"] = time.thread_time() - cpu + record["subprocess_cpu_s"]
+        record["rss_mb"] = current_rss_mb()
+        record["rss_growth_mb"] = (round(record["rss_mb"] - rss, 1)
+                                   if rss is not None and record["rss_mb"] is not None else None)
+        profile.add(record)
+
+def bind_active(fn):
+    """Binds fn to the calling thread's active RunProfile (if any), for handing work to a pool."""
+    profile = getattr(_local, "profile", None)
+    return profile.bind(fn) if profile is not None else fn
+
+def record_external(name, variant, timings):
+    """Adds a stage measured elsewhere (e.g. in a worker process) to the active profile."""
+    profile = getattr(_local, "profile", None)
+    if profile is None:
+        return
+    record = {"stage": name, "variant": variant, "subprocesses": 0, "subprocess_cpu_s": 0.0,
+              "subprocess_peak_rss_mb": None, "wall_s": 0.0, "cpu_s": 0.0, "rss_mb": None, "rss_growth_mb": None}
+    record.update(timings)
+    profile.add(record)
+
+def count_subprocess(cpu_s, maxrss=None):
+    """
+    Counts one finished tool call (its CPU time and ru_maxrss) against the
+    calling thread's open stages. runner.run_command calls it for every tool.
+    """
+    rss_mb = _rss_mb(maxrss) if maxrss is not None else None
+    for record in getattr(_local, "stack", ()):
+        record["subprocesses"] += 1
+        record["subprocess_cpu_s"] += cpu_s
+        if rss_mb is not None:
+            record["subprocess_peak_rss_mb"] = round(max(record["subprocess_peak_rss_mb"] or 0.0, rss_mb), 1)
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
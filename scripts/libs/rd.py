@@ -0,0 +1,255 @@
+# ==============================================================================
+# Script Name: rd.py
+# Description: Helper module for rate-distortion analysis. Fits monotone
+#              curves per format over (size, quality metric) and computes
+#              Bjontegaard delta-rate and delta-quality between formats.
+#              Every curve of a batch (one image or a whole corpus) is
+#              fitted and integrated in one vectorized NumPy pass.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import logging
+import sys
+
+import numpy as np
+
+logger = logging.getLogger("RD")
+
+# Quality metrics the RD analysis runs on (higher is better for each)
+RD_METRICS = ["SSIM", "MSSSIM", "PSNR"]
+
+# SSIM-type scores crowd against 1.0, so curves are fitted on the usual dB
+# scale, -10 * log10(1 - score); BD-quality for them is in dB as well
+DB_METRICS = ("SSIM", "MSSSIM")
+
+# PSNR of identical images (see parse_magick_output); not a curve point
+PSNR_INF = 999.0
+
+# Formats compared against first, so "webp vs jpeg" reads as savings over JPEG
+ANCHOR_FORMATS = ["jpeg", "png"]
+
+def quality_scale(metric, values):
+    """Maps metric values to the axis curves are fitted on; unusable values become NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if metric in DB_METRICS:
+            values = -10 * np.log10(1 - values)
+        elif metric == "PSNR":
+            values = np.where(values >= PSNR_INF, np.nan, values)
+    return np.where(np.isfinite(values), values, np.nan)
+
+def curve_points(rows):
+    """
+    Groups metrics rows into RD points per format: {format: (size_kb, {metric: values})}.
+    Lossless variants are left out: they are not points on the lossy curve.
+    """
+    points = {}
+    for fmt in sorted({row["format"] for row in rows}):
+        fmt_rows = [row for row in rows if row["format"] == fmt and "lossless" not in str(row["params"])]
+        if not fmt_rows:
+            continue
+        sizes = np.array([row["size_kb"] for row in fmt_rows], dtype=np.float64)
+        metrics = {m: quality_scale(m, [row.get(m) for row in fmt_rows])
+                   for m in RD_METRICS if m in fmt_rows[0]}
+        points[fmt] = (sizes, metrics)
+    return points
+
+def format_pairs(formats):
+    """(anchor, test) for every pair of formats, anchors from ANCHOR_FORMATS first."""
+    ordered = sorted(formats, key=lambda f: (ANCHOR_FORMATS.index(f) if f in ANCHOR_FORMATS
+                                              else len(ANCHOR_FORMATS), f))
+    return [(a, b) for i, a in enumerate(ordered) for b in ordered[i + 1:]]
+
+def monotone_curves(rates, qualities):
+    """
+    Packs N curves into (N, K) arrays of (log rate, quality), sorted by rate
+    and reduced to their non-dominated points (no smaller file reaches the
+    same quality), so both coordinates strictly increase. Rows are padded by
+    repeating their last point, which adds only zero-width segments.
+    Returns (log_rate, quality, counts).
+    """
+    n = len(rates)
+    k = max((len(r) for r in rates), default=0) or 1
+    r = np.full((n, k), np.nan)
+    q = np.full((n, k), np.nan)
+    for i, (rate, quality) in enumerate(zip(rates, qualities)):
+        r[i, :len(rate)] = rate
+        q[i, :len(quality)] = quality
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        valid = np.isfinite(r) & np.isfinite(q) & (r > 0)
+
+    # Sort by rate, the best quality first among equal rates (two stable passes)
+    order = np.argsort(np.where(valid, -q, np.inf), axis=1, kind="stable")
+    r, q, valid = (np.take_along_axis(a, order, axis=1) for a in (r, q, valid))
+    order = np.argsort(np.where(valid, r, np.inf), axis=1, kind="stable")
+    r, q, valid = (np.take_along_axis(a, order, axis=1) for a in (r, q, valid))
+
+    # Keep a point only if it beats every smaller file
+    best = np.maximum.accumulate(np.where(valid, q, -np.inf), axis=1)
+    best_before = np.concatenate([np.full((n, 1), -np.inf), best[:, :-1]], axis=1)
+    keep = valid & (q > best_before)
+
+    # Move kept points to the front, then pad with the last one
+    order = np.argsort(~keep, axis=1, kind="stable")
+    r, q = np.take_along_axis(r, order, axis=1), np.take_along_axis(q, order, axis=1)
+    counts = keep.sum(axis=1)
+    pad = np.minimum(np.arange(k)[np.newaxis, :], np.maximum(counts - 1, 0)[:, np.newaxis])
+    r, q = np.take_along_axis(r, pad, axis=1), np.take_along_axis(q, pad, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.log(r), q, counts
+
+def _edge_slope(h0, h1, m0, m1):
+    """End-point slope of a PCHIP curve (three-point formula, kept shape-preserving)."""
+    d = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+    d = np.where(np.sign(d) != np.sign(m0), 0.0, d)
+    return np.where((np.sign(m0) != np.sign(m1)) & (np.abs(d) > 3 * np.abs(m0)), 3 * m0, d)
+
+def pchip_slopes(x, y, counts):
+    """
+    Fritsch-Carlson slopes of the monotone piecewise cubic (PCHIP) through
+    each row's first `counts` points, for all rows at once.
+    """
+    n, k = x.shape
+    slopes = np.zeros((n, k))
+    if k < 2:
+        return slopes
+    h = np.diff(x, axis=1)
+    segment = h > 0
+    delta = np.divide(np.diff(y, axis=1), h, out=np.zeros_like(h), where=segment)
+
+    if k > 2:
+        h0, h1, d0, d1 = h[:, :-1], h[:, 1:], delta[:, :-1], delta[:, 1:]
+        w1, w2 = 2 * h1 + h0, h1 + 2 * h0
+        same = segment[:, :-1] & segment[:, 1:] & (d0 * d1 > 0)
+        # Weighted harmonic mean of the neighbouring secants, 0 at extrema
+        denominator = np.where(same, w1 / np.where(same, d0, 1) + w2 / np.where(same, d1, 1), 1)
+        slopes[:, 1:-1] = np.where(same, (w1 + w2) / denominator, 0.0)
+
+    rows = np.arange(n)
+    last = np.maximum(counts - 1, 1)
+    three = counts >= 3
+    i1 = np.minimum(1, k - 2)
+    left = np.where(three, _edge_slope(h[:, 0], h[:, i1], delta[:, 0], delta[:, i1]), delta[:, 0])
+    j0, j1 = last - 1, np.maximum(last - 2, 0)
+    right = np.where(three, _edge_slope(h[rows, j0], h[rows, j1], delta[rows, j0], delta[rows, j1]),
+                     delta[rows, j0])
+    slopes[:, 0] = left
+    slopes[rows, last] = right
+    return slopes
+
+def pchip_integral(x, y, counts, lo, hi):
+    """Integral of each row's PCHIP curve from lo to hi (per-row bounds within its range)."""
+    with np.errstate(invalid="ignore"):
+        d = pchip_slopes(x, y, counts)
+        h = np.diff(x, axis=1)
+        segment = h > 0
+        x0, x1, y0 = x[:, :-1], x[:, 1:], y[:, :-1]
+        dy = np.diff(y, axis=1)
+        d0, d1 = d[:, :-1], d[:, 1:]
+
+        # Cubic per segment in t = (x - x0) / h
+        c1 = h * d0
+        c2 = 3 * dy - h * (2 * d0 + d1)
+        c3 = h * (d0 + d1) - 2 * dy
+
+        def antiderivative(t):
+            return t * (y0 + t * (c1 / 2 + t * (c2 / 3 + t * c3 / 4)))
+
+        a = np.clip(lo[:, np.newaxis], x0, x1)
+        b = np.clip(hi[:, np.newaxis], x0, x1)
+        ta = np.divide(a - x0, h, out=np.zeros_like(h), where=segment)
+        tb = np.divide(b - x0, h, out=np.zeros_like(h), where=segment)
+        return np.sum(np.where(segment, h * (antiderivative(tb) - antiderivative(ta)), 0.0), axis=1)
+
+def bd_batch(anchor_rates, anchor_qualities, test_rates, test_qualities):
+    """
+    Bjontegaard deltas of N (anchor, test) curve pairs in one pass.
+    Returns (bd_rate, bd_quality) arrays: the average file size difference
+    in percent at equal quality (negative = test is smaller), and the
+    average quality difference at equal size (positive = test is better),
+    each over the range both curves cover. Pairs without two usable
+    points per curve or without overlap are NaN.
+    """
+    ra, qa, na = monotone_curves(anchor_rates, anchor_qualities)
+    rb, qb, nb = monotone_curves(test_rates, test_qualities)
+    usable = (na >= 2) & (nb >= 2)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Delta-rate: log rate as a function of quality
+        lo = np.maximum(qa[:, 0], qb[:, 0])
+        hi = np.minimum(qa[:, -1], qb[:, -1])
+        ok = usable & (hi > lo)
+        lo, hi = np.where(ok, lo, 0.0), np.where(ok, hi, 1.0)
+        diff = (pchip_integral(qb, rb, nb, lo, hi) - pchip_integral(qa, ra, na, lo, hi)) / (hi - lo)
+        bd_rate = np.where(ok, (np.exp(diff) - 1) * 100, np.nan)
+
+        # Delta-quality: quality as a function of log rate
+        lo = np.maximum(ra[:, 0], rb[:, 0])
+        hi = np.minimum(ra[:, -1], rb[:, -1])
+        ok = usable & (hi > lo)
+        lo, hi = np.where(ok, lo, 0.0), np.where(ok, hi, 1.0)
+        diff = (pchip_integral(rb, qb, nb, lo, hi) - pchip_integral(ra, qa, na, lo, hi)) / (hi - lo)
+        bd_quality = np.where(ok, diff, np.nan)
+    return bd_rate, bd_quality
+
+def bd_comparisons(images):
+    """
+    Bjontegaard deltas for every format pair and RD metric of every image,
+    fitted in one batch. `images` is a list of curve_points() results.
+    Returns a list of {"image", "anchor", "test", "metric", "bd_rate", "bd_quality"}
+    (image = index into `images`).
+    """
+    combos = []
+    anchor_rates, anchor_qualities, test_rates, test_qualities = [], [], [], []
+    for idx, points in enumerate(images):
+        for anchor, test in format_pairs(points):
+            (sizes_a, metrics_a), (sizes_b, metrics_b) = points[anchor], points[test]
+            for metric in RD_METRICS:
+                if metric in metrics_a and metric in metrics_b:
+                    combos.append({"image": idx, "anchor": anchor, "test": test, "metric": metric})
+                    anchor_rates.append(sizes_a)
+                    anchor_qualities.append(metrics_a[metric])
+                    test_rates.append(sizes_b)
+                    test_qualities.append(metrics_b[metric])
+    if not combos:
+        return []
+
+    bd_rate, bd_quality = bd_batch(anchor_rates, anchor_qualities, test_rates, test_qualities)
+    for combo, rate, quality in zip(combos, bd_rate.tolist(), bd_quality.tolist()):
+        combo["bd_rate"] = rate
+        combo["bd_quality"] = quality
+    return combos
+
+def summarize(comparisons):
+    """
+    Aggregates per-image comparisons per (anchor, test, metric): image count,
+    mean and median BD-rate and BD-quality over the images where defined.
+    """
+    groups = {}
+    for c in comparisons:
+        groups.setdefault((c["anchor"], c["test"], c["metric"]), []).append((c["bd_rate"], c["bd_quality"]))
+
+    summary = []
+    for (anchor, test, metric), values in sorted(groups.items()):
+        values = np.array(values, dtype=np.float64)
+        defined = ~np.isnan(values[:, 0])
+        if not defined.any():
+            continue
+        rates, qualities = values[defined, 0], values[defined, 1]
+        summary.append({
+            "anchor": anchor, "test": test, "metric": metric, "images": int(defined.sum()),
+            "bd_rate_mean": float(rates.mean()), "bd_rate_median": float(np.median(rates)),
+            "bd_quality_mean": float(np.nanmean(qualities)) if (~np.isnan(qualities)).any() else None,
+            "bd_quality_median": float(np.nanmedian(qualities)) if (~np.isnan(qualities)).any() else None,
+        })
+    return summary
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
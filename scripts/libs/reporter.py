@@ -1,7 +1,7 @@
 # ==============================================================================
 # Script Name: reporter.py
 # Description: Helper module for generating HTML reports and graphs.
-#              Uses Matplotlib for SVG charting.
+#              Uses Matplotlib for SVG charting (rendered in worker processes).
 # Note:        This is a library file. Do not run directly.
 # ==============================================================================
 
@@ -9,14 +9,32 @@ import os
 import csv
 import logging
 import json
+import time
 import sys
-import matplotlib.pyplot as plt
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 try:
-    from libs.html_templates import HTML_HEAD, HTML_ROW, HTML_FOOTER
+    from libs.cache import make_key
+    from libs.html_templates import HTML_HEAD, HTML_ROW, HTML_FOOTER, HTML_JS_CHART, HTML_JS_CHARTS_SCRIPT
+    from libs.profiling import record_external, stage
 except ImportError:
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from libs.html_templates import HTML_HEAD, HTML_ROW, HTML_FOOTER
+    from libs.cache import make_key
+    from libs.html_templates import HTML_HEAD, HTML_ROW, HTML_FOOTER, HTML_JS_CHART, HTML_JS_CHARTS_SCRIPT
+    from libs.profiling import record_external, stage
+
+try:
+    from libs import store as metrics_store
+except ImportError:
+    # NumPy not installed: reports are read from metrics.csv
+    metrics_store = None
+
+try:
+    from libs import rd
+except ImportError:
+    # NumPy not installed: no rate-distortion comparison in the report
+    rd = None
 
 logger = logging.getLogger("Reporter")
 
@@ -31,6 +49,11 @@ METRIC_INFO = {
         "desc": "Perceptual metric that quantifies image quality degradation caused by processing. Higher is better (Max 1.0).",
         "link": "https://en.wikipedia.org/wiki/Structural_similarity"
     },
+    "MSSSIM": {
+        "name": "Multi-Scale Structural Similarity",
+        "desc": "SSIM combined over five successively halved resolutions, so it also weighs coarse structure as seen from a distance. Higher is better (Max 1.0).",
+        "link": "https://en.wikipedia.org/wiki/Structural_similarity#Multi-Scale_SSIM"
+    },
     "RMSE": {
         "name": "Root Mean Squared Error",
         "desc": "Measure of the differences between values predicted by a model or an estimator and the values observed. Lower is better.",
@@ -48,10 +71,29 @@ METRIC_INFO = {
     }
 }
 
-def generate_report(original_image, csv_path, report_dir, root_dir):
-    graph_dir = os.path.join(report_dir, "graphs")
-    os.makedirs(graph_dir, exist_ok=True)
-    
+# Bump whenever chart drawing changes so cached charts are redrawn
+CHART_VERSION = "2"
+
+THEMES = {
+    "light": {"bg": '#ffffff', "text": '#1a202c', "grid": '#e2e8f0'},
+    "dark": {"bg": '#2d3748', "text": '#e2e8f0', "grid": '#4a5568'},
+}
+
+CHART_MANIFEST = ".charts.json"
+
+# Encode/decode speed columns (see run_task and analyzer.decode_timing): not quality metrics
+SPEED_FIELDS = ["encode_ms", "encode_cpu_ms", "decode_ms", "decode_mps"]
+
+# (filename_base, column, title, y label) of the speed charts, each plotted against file size
+SPEED_CHARTS = [
+    ("encode_time", "encode_ms", "Encode Time vs File Size", "Encode wall time (ms)"),
+    ("encode_cpu", "encode_cpu_ms", "Encode CPU Time vs File Size", "Encode CPU time (ms)"),
+    ("decode_time", "decode_ms", "Decode Time vs File Size", "Median decode time (ms)"),
+    ("decode_speed", "decode_mps", "Decode Throughput vs File Size", "Decode throughput (MP/s)"),
+]
+
+def read_metrics_csv(csv_path):
+    """Parses metrics.csv into rows, converting every numeric field. Returns (rows, headers)."""
     data = []
     headers = []
     
@@ -59,6 +101,10 @@ def generate_report(original_image, csv_path, report_dir, root_dir):
         reader = csv.DictReader(f)
         headers = reader.fieldnames
         for row in reader:
+            if None in row.values():
+                # A row cut short by a crash (see MetricsWriter): skipped, not fatal
+                logger.warning(f"Skipping an incomplete row in {csv_path}")
+                continue
             for key in row:
                 if key not in ['filename', 'format', 'params', 'relative_path', 'diff_path', 'details']:
                     try:
@@ -67,17 +113,59 @@ def generate_report(original_image, csv_path, report_dir, root_dir):
                         pass 
             row['quality'] = int(row['quality'])
             data.append(row)
+    return data, headers
+
+def load_metrics(metrics_path):
+    """
+    Loads a run's rows from the typed store (metrics.npz) or, for CSV
+    paths and installs without NumPy, from metrics.csv. Returns (rows, headers).
+    """
+    if metrics_path.endswith(".npz"):
+        if metrics_store is not None:
+            columns, headers = metrics_store.read_metrics_store(metrics_path)
+            return metrics_store.to_rows(columns, headers), headers
+        metrics_path = os.path.join(os.path.dirname(metrics_path), "metrics.csv")
+    return read_metrics_csv(metrics_path)
+
+def generate_report(original_image, metrics_path, report_dir, root_dir, pool=None, cache=None, charts="svg",
+                    profile=None):
+    """
+    Writes index.html for one image from metrics.npz (or metrics.csv).
+    charts="svg" renders matplotlib SVGs into graphs/; charts="js" embeds
+    the data and draws the charts in the browser instead. With a
+    RunProfile, a "Run performance" section is added.
+    """
+    with stage("load_metrics"):
+        data, headers = load_metrics(metrics_path)
 
     metric_cols = [h for h in headers if h not in [
         'filename', 'format', 'quality', 'params', 'relative_path', 'diff_path', 'details', 'size_kb'
-    ]]
+    ] + SPEED_FIELDS]
     
-    generate_graphs(data, graph_dir, metric_cols)
-    generate_html(original_image, data, report_dir, root_dir, metric_cols)
+    if charts == "svg":
+        graph_dir = os.path.join(report_dir, "graphs")
+        os.makedirs(graph_dir, exist_ok=True)
+        with stage("charts"):
+            generate_graphs(data, graph_dir, metric_cols, pool, cache)
+    with stage("html"):
+        generate_html(original_image, data, report_dir, root_dir, metric_cols, charts,
+                      profile.to_dict() if profile is not None else None)
 
-def generate_graphs(data, graph_dir, metric_cols):
-    formats = list(set(d['format'] for d in data))
-    
+def speed_columns(data):
+    """The SPEED_FIELDS measured for at least one variant."""
+    return [c for c in SPEED_FIELDS if any(isinstance(d.get(c), (int, float)) for d in data)]
+
+def speed_layout(speed_cols):
+    return [(base, {"kind": "single", "x": "size_kb", "y": col, "title": title,
+                    "xlabel": "Size (KB)", "ylabel": ylabel})
+            for base, col, title, ylabel in SPEED_CHARTS if col in speed_cols]
+
+def chart_layout(metric_cols, speed_cols=()):
+    """
+    Lists every chart as (filename_base, definition): which columns it plots
+    and its titles. Both the SVG renderer and the in-browser charts build
+    their series from this, so the two report modes show the same charts.
+    """
     metric_groups = {}
     for col in metric_cols:
         base = col.split('-')[0]
@@ -86,101 +174,197 @@ def generate_graphs(data, graph_dir, metric_cols):
             metric_groups[base_upper] = []
         metric_groups[base_upper].append(col)
 
-    # Helper to generate both light and dark versions
-    def make_charts(x_key, y_key, title, xlabel, ylabel, filename_base, group_cols=None):
-        # Light Mode (Default)
-        create_chart_variant(
-            data, formats, x_key, y_key, title, xlabel, ylabel, 
-            os.path.join(graph_dir, f"{filename_base}.svg"),
-            dark_mode=False, group_cols=group_cols
-        )
-        # Dark Mode
-        create_chart_variant(
-            data, formats, x_key, y_key, title, xlabel, ylabel, 
-            os.path.join(graph_dir, f"{filename_base}_dark.svg"),
-            dark_mode=True, group_cols=group_cols
-        )
-
     # 1. Size vs Quality
-    make_charts("quality", "size_kb", "Quality Setting vs File Size", "Quality", "Size (KB)", "size_vs_quality")
+    layout = [("size_vs_quality", {"kind": "single", "x": "quality", "y": "size_kb",
+                                   "title": "Quality Setting vs File Size", "xlabel": "Quality", "ylabel": "Size (KB)"})]
 
     # 2. Metric Groups
     for group_name, cols in metric_groups.items():
         # Efficiency
         main_col = next((c for c in cols if c.upper() == group_name), None)
         if main_col:
-            make_charts("size_kb", main_col, f"{group_name} Efficiency (vs Size)", "Size (KB)", group_name, f"{group_name}_efficiency")
+            layout.append((f"{group_name}_efficiency", {"kind": "single", "x": "size_kb", "y": main_col,
+                                                        "title": f"{group_name} Efficiency (vs Size)",
+                                                        "xlabel": "Size (KB)", "ylabel": group_name}))
         
         # Channels
-        make_charts("quality", None, f"{group_name} Detail (Channels)", "Quality", group_name, f"{group_name}_channels", group_cols=cols)
+        layout.append((f"{group_name}_channels", {"kind": "channels", "x": "quality", "ys": cols,
+                                                  "title": f"{group_name} Detail (Channels)",
+                                                  "xlabel": "Quality", "ylabel": group_name}))
 
-def create_chart_variant(data, formats, x_key, y_key, title, xlabel, ylabel, path, dark_mode=False, group_cols=None):
-    # Style Config
-    bg_color = '#2d3748' if dark_mode else '#ffffff'
-    text_color = '#e2e8f0' if dark_mode else '#1a202c'
-    grid_color = '#4a5568' if dark_mode else '#e2e8f0'
-    
-    plt.figure(figsize=(12, 6))
-    
-    # Set global style context
-    with plt.rc_context({
-        'axes.facecolor': bg_color,
-        'figure.facecolor': bg_color,
-        'text.color': text_color,
-        'axes.labelcolor': text_color,
-        'xtick.color': text_color,
-        'ytick.color': text_color,
-        'axes.edgecolor': grid_color
-    }):
-        if group_cols:
-            # Multi-channel chart
-            create_multi_metric_plot(data, formats, x_key, group_cols)
-        else:
-            # Single metric plot
-            for fmt in formats:
-                subset = sorted([d for d in data if d['format'] == fmt], key=lambda x: x[x_key])
-                x_vals = [d[x_key] for d in subset]
-                y_vals = [d.get(y_key, 0) for d in subset]
-                plt.plot(x_vals, y_vals, marker='o', label=fmt)
-
-        plt.title(title, color=text_color)
-        plt.xlabel(xlabel, color=text_color)
-        plt.ylabel(ylabel, color=text_color)
-        plt.grid(True, which="both", linestyle='--', alpha=0.5, color=grid_color)
-        
-        # Legend styling
-        legend = plt.legend()
-        frame = legend.get_frame()
-        frame.set_facecolor(bg_color)
-        frame.set_edgecolor(grid_color)
-        for text in legend.get_texts():
-            text.set_color(text_color)
-
-        plt.tight_layout()
-        plt.savefig(path, format='svg', transparent=False)
-        plt.close()
-
-def create_multi_metric_plot(data, formats, x_key, y_keys):
+    # 3. Encode/decode speed
+    return layout + speed_layout(speed_cols)
+
+def chart_specs(data, metric_cols):
+    """
+    Describes every chart as plain data (titles plus the plotted series), so
+    charts can be hashed, skipped when unchanged, and drawn in other processes.
+    Returns a list of (filename_base, spec).
+    """
+    # Sorted so colors and legend order (and the spec hash) are stable
+    formats = sorted(set(d['format'] for d in data))
     styles = {'Red': 'r', 'Green': 'g', 'Blue': 'b', 'Alpha': 'c', 'All': 'gray'}
     linestyles = {'webp': '-', 'jpeg': '--', 'png': ':'}
-    
-    for fmt in formats:
-        subset = sorted([d for d in data if d['format'] == fmt], key=lambda x: x[x_key])
-        x_vals = [d[x_key] for d in subset]
-        
-        for y_key in y_keys:
-            parts = y_key.split('-')
-            channel = parts[1] if len(parts) > 1 else "All"
-            
-            # Map "gray" to white in dark mode for visibility if needed, but let's stick to 'gray' or 'cyan'
-            color = styles.get(channel, 'gray')
-            ls = linestyles.get(fmt, '-')
-            
-            y_vals = [d.get(y_key, 0) for d in subset]
-            label = f"{fmt} {channel}"
-            
-            plt.plot(x_vals, y_vals, marker='.', linestyle=ls, color=color, label=label, alpha=0.8)
 
+    specs = []
+    for base, chart in chart_layout(metric_cols, speed_columns(data)):
+        x_key = chart["x"]
+        series = []
+        for fmt in formats:
+            rows = sorted([d for d in data if d['format'] == fmt], key=lambda x: x[x_key])
+            if chart["kind"] == "single":
+                # Variants without the value (e.g. encode times of a resumed run) are left out
+                rows = [d for d in rows if isinstance(d.get(chart["y"]), (int, float))]
+                if not rows:
+                    continue
+            x_vals = [d[x_key] for d in rows]
+            if chart["kind"] == "single":
+                series.append({"label": fmt, "x": x_vals, "y": [d.get(chart["y"], 0) for d in rows], "marker": 'o'})
+                continue
+            for y_key in chart["ys"]:
+                parts = y_key.split('-')
+                channel = parts[1] if len(parts) > 1 else "All"
+                series.append({"label": f"{fmt} {channel}", "x": x_vals,
+                               "y": [d.get(y_key, 0) for d in rows], "marker": '.',
+                               "linestyle": linestyles.get(fmt, '-'), "color": styles.get(channel, 'gray'),
+                               "alpha": 0.8})
+        specs.append((base, {"title": chart["title"], "xlabel": chart["xlabel"], "ylabel": chart["ylabel"],
+                             "series": series}))
+    return specs
+
+def chart_data_json(data, metric_cols):
+    """Compact JSON of the plotted columns plus the chart layout, for the in-browser charts."""
+    speed_cols = speed_columns(data)
+    columns = ["format", "quality", "size_kb"] + list(metric_cols) + speed_cols
+    payload = {
+        "columns": columns,
+        "rows": [[row.get(c) for c in columns] for row in data],
+        "charts": [dict(chart, id=base) for base, chart in chart_layout(metric_cols, speed_cols)],
+    }
+    # "</" would end the inline <script> early
+    return json.dumps(payload, separators=(',', ':')).replace("</", "<\\/")
+
+def apply_theme(fig, ax, legend, theme):
+    """Recolors an already drawn chart; the plotted lines are left untouched."""
+    colors = THEMES[theme]
+    fig.set_facecolor(colors["bg"])
+    ax.set_facecolor(colors["bg"])
+    for text in (ax.title, ax.xaxis.label, ax.yaxis.label):
+        text.set_color(colors["text"])
+    ax.tick_params(which="both", colors=colors["text"])
+    for spine in ax.spines.values():
+        spine.set_edgecolor(colors["grid"])
+    ax.grid(True, which="both", linestyle='--', alpha=0.5, color=colors["grid"])
+
+    for text in ax.texts:
+        text.set_color(colors["text"])
+
+    # Legend styling
+    if legend is None:
+        return
+    frame = legend.get_frame()
+    frame.set_facecolor(colors["bg"])
+    frame.set_edgecolor(colors["grid"])
+    for text in legend.get_texts():
+        text.set_color(colors["text"])
+
+def render_chart(spec, light_path, dark_path):
+    """
+    Draws one chart once and saves it in both themes. Uses a bare Figure
+    (no pyplot state), so it is safe in threads and worker processes.
+    Returns the wall/CPU time spent, for the run profile.
+    """
+    wall, cpu = time.perf_counter(), time.process_time()
+    # Imported here so the in-browser chart mode never loads matplotlib
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(12, 6))
+    ax = fig.add_subplot()
+    for series in spec["series"]:
+        style = {k: series[k] for k in ("marker", "linestyle", "color", "alpha") if k in series}
+        ax.plot(series["x"], series["y"], label=series["label"], **style)
+
+    ax.set_title(spec["title"])
+    ax.set_xlabel(spec["xlabel"])
+    ax.set_ylabel(spec["ylabel"])
+    # legend() warns when nothing was plotted (e.g. no variant has the value)
+    legend = ax.legend() if spec["series"] else None
+    if legend is None:
+        ax.text(0.5, 0.5, "No data", transform=ax.transAxes, ha="center", va="center")
+    fig.tight_layout()
+
+    for theme, path in (("light", light_path), ("dark", dark_path)):
+        apply_theme(fig, ax, legend, theme)
+        fig.savefig(path, format='svg', transparent=False)
+    return {"wall_s": time.perf_counter() - wall, "cpu_s": time.process_time() - cpu}
+
+def warm_chart_worker():
+    """Loads matplotlib in a chart worker ahead of its first chart (see BatchScheduler.warm_up)."""
+    from matplotlib.figure import Figure
+    Figure()
+
+def generate_graphs(data, graph_dir, metric_cols, pool=None, cache=None):
+    """
+    Renders every chart (light + dark SVG). Charts whose spec hash matches the
+    last render in graph_dir are skipped, and with a ResultCache identical
+    charts from earlier runs are copied instead of drawn. The rest render on
+    `pool` (a process pool) or, without one, on a pool created here.
+    """
+    manifest_path = os.path.join(graph_dir, CHART_MANIFEST)
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    todo = []
+    for base, spec in chart_specs(data, metric_cols):
+        key = make_key("chart", CHART_VERSION, spec)
+        light_path = os.path.join(graph_dir, f"{base}.svg")
+        dark_path = os.path.join(graph_dir, f"{base}_dark.svg")
+
+        if manifest.get(base) == key and os.path.exists(light_path) and os.path.exists(dark_path):
+            continue
+        if cache is not None and cache.get_file(make_key(key, "light"), light_path) \
+                and cache.get_file(make_key(key, "dark"), dark_path):
+            manifest[base] = key
+            continue
+        todo.append((base, key, spec, light_path, dark_path))
+
+    logger.debug(f"Rendering {len(todo)} charts ({len(manifest)} unchanged or cached)")
+
+    def finished(base, key, light_path, dark_path):
+        if cache is not None:
+            cache.put_file(make_key(key, "light"), light_path, "chart")
+            cache.put_file(make_key(key, "dark"), dark_path, "chart")
+        manifest[base] = key
+
+    if len(todo) <= 1 or pool is not None:
+        own_pool = None
+    else:
+        own_pool = ProcessPoolExecutor(max_workers=min(len(todo), os.cpu_count() or 1),
+                                       mp_context=multiprocessing.get_context("spawn"))
+    try:
+        executor = pool or own_pool
+        if executor is None:
+            for base, key, spec, light_path, dark_path in todo:
+                record_external("chart", base, render_chart(spec, light_path, dark_path))
+                finished(base, key, light_path, dark_path)
+        else:
+            futures = [(item, executor.submit(render_chart, item[2], item[3], item[4])) for item in todo]
+            for (base, key, spec, light_path, dark_path), future in futures:
+                try:
+                    record_external("chart", base, future.result())
+                except Exception as e:
+                    logger.error(f"Failed to render chart {base}: {e}")
+                    continue
+                finished(base, key, light_path, dark_path)
+    finally:
+        if own_pool is not None:
+            own_pool.shutdown()
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
 
 def get_rel_path(target_path, start_path):
     try:
@@ -188,7 +372,79 @@ def get_rel_path(target_path, start_path):
     except ValueError:
         return target_path
 
-def generate_html(original_path, data, report_dir, root_dir, metric_cols):
+def performance_html(performance):
+    """The "Run performance" section: per-stage totals, then per-variant wall times."""
+    def num(v, fmt="{:.3f}"):
+        return "" if v is None else fmt.format(v)
+
+    stage_rows = "".join(
+        f"<tr><td>{name}</td><td>{s['calls']}</td><td>{num(s['wall_s'])}</td><td>{num(s['cpu_s'])}</td>"
+        f"<td>{s['subprocesses']}</td><td>{num(s['rss_mb'], '{:.1f}')}</td><td>{num(s['rss_growth_mb'], '{:+.1f}')}</td>"
+        f"<td>{num(s['subprocess_peak_rss_mb'], '{:.1f}')}</td></tr>"
+        for name, s in performance["stages"].items()
+    )
+
+    variant_stages = sorted({st for v in performance["variants"].values() for st in v})
+    variant_rows = "".join(
+        f"<tr><td>{name}</td>" + "".join(
+            f"<td>{num(stages[st]['wall_s']) if st in stages else ''}</td>" for st in variant_stages
+        ) + "</tr>"
+        for name, stages in sorted(performance["variants"].items())
+    )
+
+    return f"""
+        <h2 id="performance">Run Performance</h2>
+        <p>Up to report generation: {performance['wall_s']:.2f} s wall, peak RSS {num(performance['peak_rss_mb'], '{:.1f}')} MiB.
+        Full timings are in <code>data/profile.json</code>.</p>
+        <table class="perf-table">
+            <tr><th>Stage</th><th>Calls</th><th>Wall (s)</th><th>CPU (s)</th><th>Subprocesses</th><th>RSS at end (MiB)</th><th>RSS growth (MiB)</th><th>Tool peak RSS (MiB)</th></tr>
+            {stage_rows}
+        </table>
+        <h3>Per variant (wall seconds)</h3>
+        <table class="perf-table">
+            <tr><th>Variant</th>{''.join(f'<th>{st}</th>' for st in variant_stages)}</tr>
+            {variant_rows}
+        </table>
+    """
+
+def rd_html(data):
+    """
+    The "Rate-distortion comparison" table: Bjontegaard deltas of every
+    format pair per metric, or "" with fewer than two comparable formats.
+    """
+    comparisons = rd.bd_comparisons([rd.curve_points(data)])
+    comparisons = [c for c in comparisons if c["bd_rate"] == c["bd_rate"] or c["bd_quality"] == c["bd_quality"]]
+    if not comparisons:
+        return ""
+
+    def num(v, fmt):
+        return "" if v != v else fmt.format(v)
+
+    metrics = [m for m in rd.RD_METRICS if any(c["metric"] == m for c in comparisons)]
+    pairs = list(dict.fromkeys((c["anchor"], c["test"]) for c in comparisons))
+    values = {(c["anchor"], c["test"], c["metric"]): c for c in comparisons}
+
+    rows = ""
+    for anchor, test in pairs:
+        cells = ""
+        for m in metrics:
+            c = values.get((anchor, test, m), {"bd_rate": float("nan"), "bd_quality": float("nan")})
+            cells += f"<td>{num(c['bd_rate'], '{:+.1f}%')}</td><td>{num(c['bd_quality'], '{:+.3f}')}</td>"
+        rows += f"<tr><td>{test} vs {anchor}</td>{cells}</tr>"
+
+    return f"""
+        <h3>Rate-distortion comparison</h3>
+        <p>Bjontegaard deltas over the quality range both formats cover (lossless variants excluded).
+        BD-rate: average size difference at equal quality, negative when the first format is smaller.
+        BD-quality: average quality difference at equal size, positive when the first format is better.
+        SSIM and MS-SSIM are compared in dB, -10&middot;log10(1 - score).</p>
+        <table class="perf-table">
+            <tr><th>Formats</th>{''.join(f'<th>BD-rate {m}</th><th>BD-{m} (dB)</th>' for m in metrics)}</tr>
+            {rows}
+        </table>
+    """
+
+def generate_html(original_path, data, report_dir, root_dir, metric_cols, charts="svg", performance=None):
     data.sort(key=lambda x: (x['format'], -x['quality']))
     abs_report_dir = os.path.abspath(report_dir)
     abs_root_dir = os.path.abspath(root_dir)
@@ -206,25 +462,42 @@ def generate_html(original_path, data, report_dir, root_dir, metric_cols):
         </div>
         """
 
-    graphs_html = ""
-    # Add Size vs Quality (Light and Dark)
-    graphs_html += f"""
-    <div class="graph-box">
-        <h3>Size vs Quality</h3>
-        <img src="graphs/size_vs_quality.svg" data-dark-src="graphs/size_vs_quality_dark.svg" data-caption="Chart: File Size vs Quality Setting">
-    </div>"""
-    
-    for m in metric_names:
+    speed_cols = speed_columns(data)
+    if charts == "js":
+        graphs_html = "".join(
+            HTML_JS_CHART.format(index=i, title=chart["title"])
+            for i, (_, chart) in enumerate(chart_layout(metric_cols, speed_cols))
+        )
         graphs_html += f"""
-        <div class="graph-box">
-            <h3>{m} Efficiency</h3>
-            <img src="graphs/{m}_efficiency.svg" data-dark-src="graphs/{m}_efficiency_dark.svg" data-caption="Chart: {m} Efficiency (vs Size)">
-        </div>"""
+        <script id="chart-data" type="application/json">{chart_data_json(data, metric_cols)}</script>
+        {HTML_JS_CHARTS_SCRIPT}"""
+    else:
+        graphs_html = ""
+        # Add Size vs Quality (Light and Dark)
         graphs_html += f"""
         <div class="graph-box">
-            <h3>{m} Channels</h3>
-            <img src="graphs/{m}_channels.svg" data-dark-src="graphs/{m}_channels_dark.svg" data-caption="Chart: {m} Channel Breakdown">
+            <h3>Size vs Quality</h3>
+            <img src="graphs/size_vs_quality.svg" data-dark-src="graphs/size_vs_quality_dark.svg" data-caption="Chart: File Size vs Quality Setting">
         </div>"""
+    
+        for m in metric_names:
+            graphs_html += f"""
+            <div class="graph-box">
+                <h3>{m} Efficiency</h3>
+                <img src="graphs/{m}_efficiency.svg" data-dark-src="graphs/{m}_efficiency_dark.svg" data-caption="Chart: {m} Efficiency (vs Size)">
+            </div>"""
+            graphs_html += f"""
+            <div class="graph-box">
+                <h3>{m} Channels</h3>
+                <img src="graphs/{m}_channels.svg" data-dark-src="graphs/{m}_channels_dark.svg" data-caption="Chart: {m} Channel Breakdown">
+            </div>"""
+
+        for base, chart in speed_layout(speed_cols):
+            graphs_html += f"""
+            <div class="graph-box">
+                <h3>{chart['title']}</h3>
+                <img src="graphs/{base}.svg" data-dark-src="graphs/{base}_dark.svg" data-caption="Chart: {chart['title']}">
+            </div>"""
 
     rows_html = ""
     for idx, row in enumerate(data):
@@ -248,6 +521,11 @@ def generate_html(original_path, data, report_dir, root_dir, metric_cols):
             if k_upper in metric_names and isinstance(v, (int, float)):
                 if '-' not in k:
                     metrics_html += f"<strong>{k.upper()}:</strong> {v:.2f} "
+        if isinstance(row.get('encode_ms'), (int, float)):
+            metrics_html += f"<strong>Encode:</strong> {row['encode_ms']:.1f} ms "
+        if isinstance(row.get('decode_ms'), (int, float)):
+            mps = f" ({row['decode_mps']:.1f} MP/s)" if isinstance(row.get('decode_mps'), (int, float)) else ""
+            metrics_html += f"<strong>Decode:</strong> {row['decode_ms']:.1f} ms{mps} "
 
         try:
             rows_html += HTML_ROW.format(
@@ -272,13 +550,15 @@ def generate_html(original_path, data, report_dir, root_dir, metric_cols):
         <p><strong>Total Variants:</strong> {len(data)}</p>
         <p><strong>Formats Tested:</strong> {', '.join(set(d['format'] for d in data))}</p>
         <p><strong>Metrics Captured:</strong> {', '.join(metric_names)}</p>
+        {rd_html(data) if rd is not None else ""}
     </div>
     """
 
     full_html = HTML_HEAD.format(
         summary=summary_html, 
         metric_explanations=explanations_html, 
-        graphs=graphs_html
+        graphs=graphs_html,
+        performance=performance_html(performance) if performance else ""
     ) + rows_html + HTML_FOOTER
     
     with open(os.path.join(report_dir, "index.html"), "w") as f:
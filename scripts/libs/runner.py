@@ -0,0 +1,252 @@
+# ==============================================================================
+# Script Name: runner.py
+# Description: Helper module that runs the external tools (cwebp, magick)
+#              from one asyncio event loop: a semaphore caps how many run at
+#              once across every thread, each call has a timeout after which
+#              the tool is killed, and running tools can be cancelled.
+#              run_command()/run_commands() are the subprocess.run()
+#              style entry points, and count each call in the run profile.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import time
+import locale
+import asyncio
+import logging
+import tempfile
+import threading
+import subprocess
+import sys
+from concurrent.futures import CancelledError
+
+try:
+    from libs.profiling import count_subprocess
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from libs.profiling import count_subprocess
+
+logger = logging.getLogger("Runner")
+
+# Seconds before a tool is considered hung and killed (None: wait forever)
+DEFAULT_TIMEOUT = 600
+
+class ToolResult:
+    """Outcome of one tool call: exit code, raw output and its resource usage."""
+
+    def __init__(self, returncode, stdout, stderr, wall_s, cpu_s=0.0, maxrss=None):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.wall_s = wall_s
+        self.cpu_s = cpu_s
+        self.maxrss = maxrss  # ru_maxrss units (KiB on Linux, bytes on macOS)
+
+class ProcessRunner:
+    """
+    Runs commands on a private event loop thread. Callers on any thread
+    block in run() (or run_many() for a batch) while the loop multiplexes
+    every tool process: it waits on a pidfd per child where the kernel has
+    them (Linux), so no thread is parked per running tool.
+
+    Children are spawned with Popen and reaped with os.wait4() rather than
+    through asyncio.create_subprocess_exec(), whose child watcher reaps them
+    itself and would lose the per-call CPU time and peak RSS the run
+    profile records.
+    """
+
+    def __init__(self, max_processes=None, timeout=DEFAULT_TIMEOUT):
+        self.max_processes = max(1, max_processes or os.cpu_count() or 1)
+        self.timeout = timeout
+        self._loop = None
+        self._semaphore = None
+        self._futures = set()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._closed:
+                raise CancelledError("Tool runner is shut down")
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="tool-runner", daemon=True).start()
+            return self._loop
+
+    async def _wait_exit(self, proc):
+        """Waits for the child to exit and reaps it. Returns (returncode, cpu_s, maxrss)."""
+        loop = asyncio.get_running_loop()
+        pidfd = None
+        if hasattr(os, "pidfd_open"):
+            try:
+                pidfd = os.pidfd_open(proc.pid)
+            except OSError:
+                pidfd = None
+
+        if pidfd is not None:
+            exited = loop.create_future()
+            loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+            try:
+                await exited
+            finally:
+                loop.remove_reader(pidfd)
+                os.close(pidfd)
+            _, status, usage = os.wait4(proc.pid, 0)
+        elif hasattr(os, "wait4"):
+            _, status, usage = await loop.run_in_executor(None, os.wait4, proc.pid, 0)
+        else:
+            # Windows: no rusage
+            return await loop.run_in_executor(None, proc.wait), 0.0, None
+
+        # Popen must not try to reap the pid again
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        return proc.returncode, usage.ru_utime + usage.ru_stime, usage.ru_maxrss
+
+    async def _run(self, cmd, capture_output, timeout):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_processes)
+
+        async with self._semaphore:
+            with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+                # Output goes to files, not pipes: nothing to drain while the tool runs
+                wall = time.perf_counter()
+                proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
+                                        stdout=out if capture_output else subprocess.DEVNULL,
+                                        stderr=err if capture_output else subprocess.DEVNULL)
+                exit_task = asyncio.ensure_future(self._wait_exit(proc))
+                try:
+                    done, _ = await asyncio.wait({exit_task}, timeout=timeout)
+                except asyncio.CancelledError:
+                    self._kill(proc, exit_task)
+                    await asyncio.shield(exit_task)
+                    raise
+                if not done:
+                    logger.warning(f"{os.path.basename(cmd[0])} did not finish in {timeout} s, killing it")
+                    self._kill(proc, exit_task)
+                    await exit_task
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+
+                returncode, cpu_s, maxrss = exit_task.result()
+                stdout = stderr = None
+                if capture_output:
+                    out.seek(0)
+                    err.seek(0)
+                    stdout, stderr = out.read(), err.read()
+        return ToolResult(returncode, stdout, stderr, time.perf_counter() - wall, cpu_s, maxrss)
+
+    def _kill(self, proc, exit_task):
+        if not exit_task.done():
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def _submit(self, cmd, capture_output, timeout):
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(list(cmd), capture_output, self.timeout if timeout is None else timeout or None), loop)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def run(self, cmd, capture_output=False, timeout=None):
+        """
+        Runs one command and returns its ToolResult. Blocks the calling
+        thread only. Raises subprocess.TimeoutExpired (after killing the
+        tool) if it runs longer than `timeout` seconds (default: the
+        runner's; 0 disables it), and CancelledError if cancel_all() stops it.
+        """
+        return self._submit(cmd, capture_output, timeout).result()
+
+    def run_many(self, cmds, capture_output=False, timeout=None):
+        """
+        Runs independent commands concurrently (still within the semaphore).
+        Returns one ToolResult or exception per command, in order.
+        """
+        futures = [self._submit(cmd, capture_output, timeout) for cmd in cmds]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except (Exception, CancelledError) as e:
+                results.append(e)
+        return results
+
+    def cancel_all(self):
+        """Kills every running tool; their callers get CancelledError."""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+        if futures:
+            logger.info(f"Cancelled {len(futures)} running tool(s)")
+
+    def shutdown(self):
+        """Cancels running tools, refuses new ones and stops the loop."""
+        with self._lock:
+            self._closed = True
+            loop = self._loop
+        self.cancel_all()
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+
+_runner = ProcessRunner()
+
+def get_runner():
+    return _runner
+
+def configure_runner(max_processes=None, timeout=DEFAULT_TIMEOUT):
+    """Sets the process-wide tool concurrency and timeout (call before the first tool runs)."""
+    _runner.max_processes = max(1, max_processes or os.cpu_count() or 1)
+    _runner.timeout = timeout or None
+
+def cancel_tools():
+    """Kills every running external tool, e.g. when a run is interrupted."""
+    _runner.cancel_all()
+
+def run_command(cmd, capture_output=False, text=False, check=False, timeout=None):
+    """
+    subprocess.run() for the external tools, on the shared ProcessRunner: at
+    most --jobs tools at once across all threads, killed after
+    --tool-timeout seconds. Each call is counted against the open profiling
+    stages with the child's own CPU time and peak RSS. The result also
+    carries the call's `wall_s` and the tool's `cpu_s`.
+    """
+    return _completed(cmd, _runner.run(cmd, capture_output, timeout), text, check)
+
+def run_commands(cmds, capture_output=False, text=False, timeout=None):
+    """
+    Runs independent commands concurrently. Returns a CompletedProcess or
+    the raised exception per command, in order.
+    """
+    results = []
+    for cmd, res in zip(cmds, _runner.run_many(cmds, capture_output, timeout)):
+        results.append(res if isinstance(res, BaseException) else _completed(cmd, res, text, False))
+    return results
+
+def _completed(cmd, res, text, check):
+    count_subprocess(res.cpu_s, res.maxrss)
+    stdout, stderr = res.stdout, res.stderr
+    if text and stdout is not None:
+        encoding = locale.getpreferredencoding(False)
+        stdout = stdout.decode(encoding, errors="replace")
+        stderr = stderr.decode(encoding, errors="replace")
+    if check and res.returncode:
+        raise subprocess.CalledProcessError(res.returncode, cmd, stdout, stderr)
+    completed = subprocess.CompletedProcess(cmd, res.returncode, stdout, stderr)
+    completed.wall_s, completed.cpu_s = res.wall_s, res.cpu_s
+    return completed
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
@@ -0,0 +1,85 @@
+# ==============================================================================
+# Script Name: sampling.py
+# Description: Helper module for adaptive quality sampling. Starts each
+#              format on a coarse quality grid and adds points only inside
+#              intervals where file size or quality still changes by more
+#              than a tolerance, until a per-format encode budget is spent.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import math
+import logging
+import sys
+
+logger = logging.getLogger("Sampling")
+
+SAMPLING_MODES = ["grid", "adaptive"]
+
+# Same bounds as the fixed grid (see quality_steps)
+QUALITY_MIN = 5
+QUALITY_MAX = 100
+
+# Points of the starting grid per format
+COARSE_POINTS = 5
+
+# Share of a curve's total size or quality change above which an interval is split
+DEFAULT_TOLERANCE = 0.05
+
+# Quality metric the curve is followed on: the first one the engine measures
+REFINE_METRICS = ["SSIM", "MSSSIM", "PSNR"]
+
+def coarse_qualities(budget, points=COARSE_POINTS):
+    """Evenly spaced qualities from QUALITY_MIN to QUALITY_MAX, at most `budget` of them."""
+    points = max(2, min(points, budget))
+    span = QUALITY_MAX - QUALITY_MIN
+    return sorted({QUALITY_MIN + round(i * span / (points - 1)) for i in range(points)})
+
+def refine_metric(row):
+    """The REFINE_METRICS column a row carries, or None."""
+    for metric in REFINE_METRICS:
+        value = row.get(metric)
+        if isinstance(value, (int, float)) and math.isfinite(value):
+            return metric
+    return None
+
+def refine_qualities(points, sampled, budget, tolerance=DEFAULT_TOLERANCE):
+    """
+    Picks the next qualities to encode for one format. `points` maps each
+    measured quality to (size_kb, metric value); `sampled` holds every
+    quality already tried, failed ones included, and counts against
+    `budget`. Each interval between neighbouring points is scored by its
+    share of the curve's total change in log size and in the metric; the
+    midpoints of those above `tolerance` are returned, largest share first.
+    """
+    remaining = budget - len(sampled)
+    usable = sorted((q, size, value) for q, (size, value) in points.items()
+                    if size > 0 and math.isfinite(value))
+    if remaining <= 0 or len(usable) < 2:
+        return []
+
+    log_sizes = [math.log(size) for _, size, _ in usable]
+    values = [value for _, _, value in usable]
+    size_span = (max(log_sizes) - min(log_sizes)) or 1.0
+    value_span = (max(values) - min(values)) or 1.0
+
+    candidates = []
+    for i in range(len(usable) - 1):
+        (qa, _, va), (qb, _, vb) = usable[i], usable[i + 1]
+        mid = (qa + qb) // 2
+        if mid <= qa or mid in sampled:
+            continue
+        share = max(abs(log_sizes[i + 1] - log_sizes[i]) / size_span, abs(vb - va) / value_span)
+        if share > tolerance:
+            candidates.append((share, mid))
+
+    candidates.sort(reverse=True)
+    return sorted(mid for _, mid in candidates[:remaining])
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
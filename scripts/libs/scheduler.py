@@ -0,0 +1,721 @@
+# ==============================================================================
+# Script Name: scheduler.py
+# Description: Helper module that drives runs. Streams every variant of every
+#              image through encode -> measure -> row-append on one shared
+#              worker pool, so encoding and analysis overlap within and across
+#              images, and aggregates a corpus summary.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import csv
+import json
+import logging
+import datetime
+import threading
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+try:
+    from libs.compressor import attach_cache_keys, build_tasks, quality_steps, release_sources, run_task
+    from libs import analyzer
+    from libs.analyzer import STANDARD_FIELDS, LazyReference, MetricsWriter, analyze_variant, get_image_details
+    from libs.budget import MemoryBudget, analysis_cost, encode_cost, image_footprint
+    from libs.journal import JOURNAL_NAME, RunJournal, find_resumable, run_header
+    from libs.profiling import RunProfile
+    from libs.reporter import generate_report, read_metrics_csv, warm_chart_worker
+    from libs.runner import cancel_tools
+    from libs.sampling import DEFAULT_TOLERANCE, coarse_qualities, refine_metric, refine_qualities
+    from libs.workspace import create_workspace, find_workspaces, open_workspace
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from libs.compressor import attach_cache_keys, build_tasks, quality_steps, release_sources, run_task
+    from libs import analyzer
+    from libs.analyzer import STANDARD_FIELDS, LazyReference, MetricsWriter, analyze_variant, get_image_details
+    from libs.budget import MemoryBudget, analysis_cost, encode_cost, image_footprint
+    from libs.journal import JOURNAL_NAME, RunJournal, find_resumable, run_header
+    from libs.profiling import RunProfile
+    from libs.reporter import generate_report, read_metrics_csv, warm_chart_worker
+    from libs.runner import cancel_tools
+    from libs.sampling import DEFAULT_TOLERANCE, coarse_qualities, refine_metric, refine_qualities
+    from libs.workspace import create_workspace, find_workspaces, open_workspace
+
+try:
+    from libs import rd
+except ImportError:
+    # NumPy not installed: no corpus rate-distortion summary
+    rd = None
+
+logger = logging.getLogger("Scheduler")
+
+class CorpusSummary:
+    """
+    Running means per (format, quality, params) across every analyzed image.
+    Only sums are kept for those; for the rate-distortion summary each
+    image's RD points (a few floats per variant) are kept until write_rd().
+    """
+
+    def __init__(self):
+        self.groups = {}
+        self.images = []
+        self.curves = []
+        self._lock = threading.Lock()
+
+    def add(self, image_path, status, rows, output_dir=None):
+        # A failed image is listed, but its rows stay out of the corpus means and curves
+        if status != "ok":
+            rows = []
+        points = rd.curve_points(rows) if rd is not None and rows else None
+        with self._lock:
+            self.images.append({"image": image_path, "status": status,
+                                "variants": len(rows), "output_dir": output_dir or ""})
+            if points:
+                self.curves.append(points)
+            for row in rows:
+                key = (row['format'], row['quality'], row['params'])
+                group = self.groups.setdefault(key, {"count": 0, "sums": {}})
+                group["count"] += 1
+                for k, v in row.items():
+                    # size plus the "All" value of every metric
+                    if k in STANDARD_FIELDS and k != "size_kb":
+                        continue
+                    if '-' in k or not isinstance(v, (int, float)):
+                        continue
+                    group["sums"][k] = group["sums"].get(k, 0.0) + v
+
+    def write(self, csv_path):
+        columns = sorted({k for g in self.groups.values() for k in g["sums"]},
+                         key=lambda k: (k != "size_kb", k))
+        fieldnames = ["format", "quality", "params", "images"] + [f"{c}_mean" for c in columns]
+
+        with open(csv_path, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            for (fmt, quality, params), group in sorted(self.groups.items(), key=lambda kv: (kv[0][0], kv[0][1], kv[0][2])):
+                row = {"format": fmt, "quality": quality, "params": params, "images": group["count"]}
+                for c in columns:
+                    if c in group["sums"]:
+                        row[f"{c}_mean"] = round(group["sums"][c] / group["count"], 6)
+                writer.writerow(row)
+        return csv_path
+
+    def write_rd(self, csv_path):
+        """
+        Writes the corpus rate-distortion summary: per format pair and
+        metric, the mean and median Bjontegaard deltas over the images where
+        both curves overlap. All images are fitted in one batch. Returns the
+        path, or None without NumPy or comparable formats.
+        """
+        if rd is None:
+            return None
+        summary = rd.summarize(rd.bd_comparisons(self.curves))
+        if not summary:
+            return None
+
+        fieldnames = ["anchor", "test", "metric", "images", "bd_rate_mean", "bd_rate_median",
+                      "bd_quality_mean", "bd_quality_median"]
+        with open(csv_path, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in summary:
+                writer.writerow({k: round(v, 6) if isinstance(v, float) else v for k, v in row.items()})
+        return csv_path
+
+class ImageJob:
+    """
+    One image streaming through the pipeline. Each variant flows
+    encode -> measure -> row-append on its own: as soon as an encode
+    finishes, its analysis is queued and the next encode is submitted.
+    Only a window of `jobs` variants is in flight per image, which bounds
+    memory regardless of sweep size. The report runs once every row is in.
+    `formats`/`steps` override the scheduler's for this image; `listener`
+    is called with (event, data) as the image progresses.
+
+    With a memory budget, the image reserves its resident footprint (the
+    decoded reference and source) while open, and each encode and analysis
+    is admitted on its own estimated peak.
+
+    Every finished unit is recorded in the image's RunJournal. With the
+    scheduler's `resume`, an interrupted run's folder is reused: variants
+    whose encode or analysis is journaled (and whose outputs still check
+    out) are not redone.
+
+    With adaptive sampling, each format starts on a coarse quality grid.
+    Whenever all of a format's variants are measured, points are added
+    where its curve still changes by more than the tolerance (see
+    sampling.refine_qualities), until its encode budget is spent.
+    """
+
+    def __init__(self, image_path, scheduler, formats=None, steps=None, listener=None):
+        self.image_path = image_path
+        self.scheduler = scheduler
+        self.formats = formats or scheduler.formats
+        self.steps = steps or scheduler.steps
+        self.listener = listener
+        self.finished = threading.Event()
+        self.dirs = None
+        self.original = None
+        self.reference = None
+        self.writer = None
+        self.journal = None
+        self.tasks = []
+        self.todo = []
+        self.encoded = set()
+        self.resumed = False
+        self.pixels = 0
+        self.footprint = 0
+        self.reserved = False
+        self.rows = []
+        self.pending = 0
+        self.next_task = 0
+        self.encoding = 0
+        self.format_order = {}
+        self.format_pending = {}
+        self.sampled = {}
+        self.points = {}
+        self.max_encodes = scheduler.max_encodes or len(quality_steps(self.steps))
+        self.status = "ok"
+        self.failed = 0
+        self.settled = set()
+        self.done = False
+        self.profile = RunProfile(image_path)
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._guard(self._start_encoding)
+
+    def _emit(self, event, **data):
+        if self.listener is None:
+            return
+        try:
+            self.listener(event, data)
+        except Exception as e:
+            logger.warning(f"Progress listener failed for {self.image_path}: {e}")
+
+    def _guard(self, stage, *args):
+        """Runs a stage; any unexpected error fails the image instead of hanging the batch."""
+        try:
+            stage(*args)
+        except Exception as e:
+            logger.error(f"Failed to process {self.image_path}: {e}")
+            self.status = "failed"
+            self._finish()
+
+    def _callback(self, idx, stage):
+        """
+        Wraps a variant's done-callback. concurrent.futures swallows what a
+        callback raises, which would leave the job waiting on the variant
+        forever, so an error fails the variant instead.
+        """
+        def run(future):
+            try:
+                stage(future)
+            except Exception as e:
+                self._fail_variant(idx, e)
+        return run
+
+    def _fail_variant(self, idx, error):
+        name = os.path.basename(self.tasks[idx]["entry"]["path"])
+        logger.error(f"Failed to process {name}: {error}")
+        self._emit("variant_failed", filename=name, error=str(error))
+        self._variant_done(idx)
+
+    def _reserve_memory(self):
+        """Reads the image's dimensions and reserves its footprint from the memory budget."""
+        sched = self.scheduler
+        try:
+            details = json.loads(get_image_details(self.image_path) or "{}")
+            self.pixels = int(details.get("width", 0)) * int(details.get("height", 0))
+        except (ValueError, TypeError):
+            # e.g. identify prints one object per frame of an animation
+            self.pixels = 0
+        if not self.pixels:
+            logger.warning(f"Unknown dimensions for {self.image_path}; its memory use is not budgeted")
+        self.footprint = image_footprint(self.pixels, sched.engine, sched.backend)
+        sched.budget.reserve(self.footprint)
+        self.reserved = True
+        logger.debug(f"{self.image_path}: {self.pixels / 1e6:.1f} MP, {self.footprint / 2**20:.0f} MiB reserved "
+                     f"({sched.budget.in_use / 2**20:.0f} of {sched.budget.budget / 2**20:.0f} MiB in use)")
+
+    def _start_encoding(self):
+        sched = self.scheduler
+        if sched.budget is not None:
+            self._reserve_memory()
+        sampling = None
+        if sched.sampling == "adaptive":
+            sampling = {"mode": "adaptive", "max_encodes": self.max_encodes, "tolerance": sched.refine_tolerance}
+        header = run_header(self.image_path, self.formats, self.steps, sched.engine, sched.backend,
+                            sched.diff_max_size, sampling)
+        previous = None
+        if sched.resume:
+            previous = find_resumable(find_workspaces(self.image_path, sched.report_root), header)
+        if previous is not None:
+            self.dirs, self.original = open_workspace(previous, self.image_path)
+        else:
+            self.dirs, self.original = create_workspace(self.image_path, sched.report_root)
+        logger.info(f"Queued {self.image_path} -> {self.dirs['root']}")
+
+        self.journal = RunJournal(os.path.join(self.dirs["data"], JOURNAL_NAME))
+        if previous is None:
+            self.journal.record("start", **header)
+        elif self._resume_finished():
+            return
+
+        if sched.sampling == "adaptive":
+            self.tasks = self._adaptive_tasks(previous is not None)
+        else:
+            self.tasks = build_tasks(self.original, self.dirs["images"], self.formats, quality_steps(self.steps),
+                                     backend=sched.backend)
+        if sched.cache is not None:
+            attach_cache_keys(self.tasks, sched.cache, self.original)
+            self.source_hash = sched.cache.file_hash(self.original)
+        else:
+            self.source_hash = None
+        for task in self.tasks:
+            entry = task["entry"]
+            self.format_order.setdefault(entry["format"], len(self.format_order))
+            self.format_pending.setdefault(entry["format"], 0)
+
+        self.reference = LazyReference(self.original, sched.engine)
+        self.writer = MetricsWriter(os.path.join(self.dirs["data"], "metrics.csv"))
+        self.todo = list(range(len(self.tasks)))
+        if previous is not None:
+            self._resume_variants()
+        self.pending = len(self.todo)
+        for idx in self.todo:
+            self.format_pending[self.tasks[idx]["entry"]["format"]] += 1
+        self._emit("started", output_dir=self.dirs["root"], variants=len(self.tasks))
+        if sched.sampling == "adaptive":
+            # Formats whose variants were all kept by --resume may still need refining
+            with self._lock:
+                for fmt, pending in self.format_pending.items():
+                    if not pending:
+                        self._refine(fmt)
+        if not self.todo:
+            self._start_report()
+            return
+
+        self._fill_window()
+
+    def _adaptive_tasks(self, resumed):
+        """
+        Each format's coarse grid plus its lossless variant. A resumed run
+        also gets back the qualities its journal shows were tried, so the
+        refinement continues where it stopped.
+        """
+        tried = {}
+        if resumed:
+            for record in self.journal.units("encode").values():
+                tried.setdefault(record["format"], set()).add(record["quality"])
+
+        tasks = []
+        source = None
+        for fmt in self.formats:
+            name = "jpeg" if fmt.lower() == "jpg" else fmt.lower()
+            qualities = sorted(set(coarse_qualities(self.max_encodes)) | tried.get(name, set()))
+            built = build_tasks(self.original, self.dirs["images"], [fmt], qualities,
+                                backend=self.scheduler.backend, source=source)
+            source = source or next((t.get("source") for t in built if t.get("source") is not None), None)
+            self.sampled.setdefault(name, set()).update(qualities)
+            tasks.extend(built)
+        return tasks
+
+    def _row_key(self, idx):
+        """Sort key of a variant's row: format, then quality, lossless last (as build_tasks orders them)."""
+        entry = self.tasks[idx]["entry"]
+        return (self.format_order[entry["format"]], "lossless" in entry["params"], entry["quality"])
+
+    def _refine(self, fmt):
+        """
+        Queues the next qualities of an adaptively sampled format once all
+        of its variants are in (lock held). Returns how many were queued.
+        """
+        qualities = refine_qualities(self.points.get(fmt, {}), self.sampled.get(fmt, set()),
+                                     self.max_encodes, self.scheduler.refine_tolerance)
+        if not qualities:
+            return 0
+        sched = self.scheduler
+        source = next((t.get("source") for t in self.tasks if t.get("source") is not None), None)
+        tasks = build_tasks(self.original, self.dirs["images"], [fmt], qualities, lossless=False,
+                            backend=sched.backend, source=source)
+        if sched.cache is not None:
+            attach_cache_keys(tasks, sched.cache, self.original)
+        logger.info(f"{os.path.basename(self.image_path)}: refining {fmt} at quality "
+                    f"{', '.join(str(q) for q in qualities)}")
+        self.sampled[fmt].update(qualities)
+        self.todo.extend(range(len(self.tasks), len(self.tasks) + len(tasks)))
+        self.tasks.extend(tasks)
+        self.pending += len(tasks)
+        self.format_pending[fmt] += len(tasks)
+        return len(tasks)
+
+    def _resume_finished(self):
+        """An already reported image is only re-read for the corpus summary. Returns True if so."""
+        csv_path = os.path.join(self.dirs["data"], "metrics.csv")
+        if not (self.journal.reported() and os.path.exists(csv_path)
+                and os.path.exists(os.path.join(self.dirs["report"], "index.html"))):
+            return False
+        self.rows, _ = read_metrics_csv(csv_path)
+        self.resumed = True
+        logger.info(f"{self.image_path}: already complete in {self.dirs['root']}")
+        self._emit("started", output_dir=self.dirs["root"], variants=len(self.rows))
+        self._finish()
+        return True
+
+    def _resume_variants(self):
+        """
+        Keeps the journaled work that still checks out: encodes whose file
+        has the recorded size, and analyses whose metrics.csv row (and diff
+        map) exist. Everything else is queued again.
+        """
+        encoded = self.journal.units("encode")
+        analyzed = self.journal.units("analyze")
+        csv_path = os.path.join(self.dirs["data"], "metrics.csv")
+        rows = {}
+        if os.path.exists(csv_path):
+            rows = {row["filename"]: row for row in read_metrics_csv(csv_path)[0]}
+
+        kept = {}
+        for idx, task in enumerate(self.tasks):
+            path = task["entry"]["path"]
+            name = os.path.basename(path)
+            record = encoded.get(name)
+            if record is None or not os.path.isfile(path) or os.path.getsize(path) != record["size"]:
+                continue
+            self.encoded.add(idx)
+            # The encode times travel with the entry into the variant's row
+            task["entry"].update({k: record[k] for k in analyzer.ENCODE_TIMING_FIELDS if k in record})
+            row = rows.get(name)
+            if name in analyzed and row is not None and (
+                    not row["diff_path"] or os.path.exists(os.path.join(self.dirs["root"], row["diff_path"]))):
+                kept[idx] = row
+
+        self.writer.restore({self._row_key(idx): row for idx, row in kept.items()})
+        for idx, row in kept.items():
+            self._add_point(idx, row)
+        self.todo = [idx for idx in range(len(self.tasks)) if idx not in kept]
+        logger.info(f"Resuming {self.image_path}: {len(kept)} of {len(self.tasks)} variants measured, "
+                    f"{len(self.encoded) - len(kept)} more encoded")
+
+    def _restore_encoded(self, task):
+        logger.info(f"{task['start_msg']} (resumed)")
+        return task["entry"]
+
+    def _fill_window(self):
+        for _ in range(self.scheduler.jobs):
+            self._submit_next_encode()
+
+    def _submit_next_encode(self):
+        with self._lock:
+            if self.scheduler.cancelled.is_set():
+                # Interrupted: the variants not yet started are left for --resume
+                skipped = self.todo[self.next_task:]
+                self.next_task = len(self.todo)
+            elif self.next_task >= len(self.todo) or self.encoding >= self.scheduler.jobs:
+                return
+            else:
+                skipped = None
+                idx = self.todo[self.next_task]
+                self.next_task += 1
+                self.encoding += 1
+        if skipped is not None:
+            for idx in skipped:
+                self._variant_done(idx)
+            return
+        task = self.tasks[idx]
+        try:
+            if idx in self.encoded:
+                future = self.scheduler.submit_work(0, self._restore_encoded, task)
+            else:
+                future = self.scheduler.submit_work(encode_cost(self.pixels, task), self.profile.bind(run_task),
+                                                    task, self.scheduler.cache)
+        except Exception as e:
+            with self._lock:
+                self.encoding -= 1
+            self._fail_variant(idx, e)
+            return
+        future.add_done_callback(self._callback(idx, partial(self._encoded, idx, task)))
+
+    def _encoded(self, idx, task, future):
+        # Keep the encode window full, then queue this variant's measurement
+        with self._lock:
+            self.encoding -= 1
+        self._submit_next_encode()
+        try:
+            entry = future.result()
+        except Exception as e:
+            logger.error(f"{task['fail_msg']}: {e}")
+            self._emit("variant_failed", filename=os.path.basename(task["entry"]["path"]), error=str(e))
+            self._variant_done(idx)
+            return
+        if idx not in self.encoded:
+            timing = {k: entry[k] for k in analyzer.ENCODE_TIMING_FIELDS if k in entry}
+            self.journal.record("encode", variant=os.path.basename(entry["path"]), format=entry["format"],
+                                quality=entry["quality"], size=os.path.getsize(entry["path"]), **timing)
+        if self.scheduler.cancelled.is_set():
+            self._variant_done(idx)
+            return
+        cost = analysis_cost(self.pixels, self.scheduler.engine, analyzer.tile_budget_mb)
+        analysis = self.scheduler.submit_work(cost, self.profile.bind(self._analyze_one), entry)
+        analysis.add_done_callback(self._callback(idx, partial(self._analyzed, idx, entry)))
+
+    def _analyze_one(self, item):
+        sched = self.scheduler
+        return analyze_variant(item, self.original, self.dirs["diffs"], self.dirs["data"],
+                               sched.engine, self.reference, sched.cache, self.source_hash, sched.diff_max_size)
+
+    def _analyzed(self, idx, entry, future):
+        try:
+            row = future.result()
+            self.writer.append(self._row_key(idx), row)
+            # Write-ahead order: the row is on disk before the journal says so
+            self.journal.record("analyze", variant=row["filename"], format=row["format"], quality=row["quality"])
+        except Exception as e:
+            logger.error(f"Failed to analyze {os.path.basename(entry['path'])}: {e}")
+            self._emit("variant_failed", filename=os.path.basename(entry['path']), error=str(e))
+        else:
+            self._emit("variant", row=row)
+            self._variant_done(idx, row)
+            return
+        self._variant_done(idx)
+
+    def _add_point(self, idx, row):
+        """Remembers a measured variant as a point of its format's curve (lossless ones excepted)."""
+        entry = self.tasks[idx]["entry"]
+        metric = refine_metric(row)
+        if metric is not None and "lossless" not in entry["params"]:
+            self.points.setdefault(entry["format"], {})[entry["quality"]] = (row["size_kb"], row[metric])
+
+    def _variant_done(self, idx, row=None):
+        fmt = self.tasks[idx]["entry"]["format"]
+        with self._lock:
+            # A callback that failed after settling its variant must not settle it again
+            if idx in self.settled:
+                return
+            self.settled.add(idx)
+            if row is not None:
+                self._add_point(idx, row)
+            else:
+                self.failed += 1
+            self.format_pending[fmt] -= 1
+            refined = 0
+            if (self.scheduler.sampling == "adaptive" and self.format_pending[fmt] == 0
+                    and not self.scheduler.cancelled.is_set()):
+                refined = self._refine(fmt)
+            self.pending -= 1
+            last = self.pending == 0
+        if refined:
+            self._fill_window()
+        if last and self.scheduler.cancelled.is_set():
+            # No report: the journal must not call a partial run complete
+            self.status = "cancelled"
+            self._finish()
+        elif last:
+            self._guard(self._start_report)
+
+    def _start_report(self):
+        sched = self.scheduler
+        release_sources(self.tasks)
+        self.reference.close()
+        metrics_path, self.rows = self.writer.finalize()
+        if not self.rows:
+            logger.error(f"{self.image_path}: no variant could be encoded and measured")
+            self.status = "failed"
+            self._finish()
+            return
+
+        # Reports are assembled one at a time on their own thread, which hands
+        # the charts to the chart process pool while other images keep encoding.
+        future = sched.report_pool.submit(self.profile.bind(generate_report), self.original, metrics_path,
+                                          self.dirs["report"], self.dirs["root"], sched.chart_pool, sched.cache,
+                                          sched.charts, self.profile if sched.report_performance else None)
+        future.add_done_callback(self._reported)
+
+    def _reported(self, future):
+        try:
+            future.result()
+            # Only a complete run is final: --resume redoes the failed variants of any other
+            if self.failed:
+                logger.error(f"{self.image_path}: {self.failed} variant(s) failed; --resume will retry them")
+                self.status = "failed"
+            else:
+                self.journal.record("report")
+        except Exception as e:
+            logger.error(f"Report failed for {self.image_path}: {e}")
+            self.status = "failed"
+        self._finish()
+
+    def _finish(self):
+        # A failing stage and a late callback can both get here: release the slot and budget once
+        with self._lock:
+            if self.done:
+                return
+            self.done = True
+        release_sources(self.tasks)
+        if self.journal is not None:
+            self.journal.close()
+        # A resumed, already complete image did no work: keep its profile
+        if self.dirs is not None and not self.resumed:
+            try:
+                self.profile.write(os.path.join(self.dirs["data"], "profile.json"))
+            except OSError as e:
+                logger.warning(f"Could not write run profile for {self.image_path}: {e}")
+        if self.reference is not None:
+            self.reference.close()
+        if self.reserved:
+            self.scheduler.budget.unreserve(self.footprint)
+            self.reserved = False
+        if self.scheduler.summary is not None:
+            self.scheduler.summary.add(self.image_path, self.status, self.rows,
+                                       self.dirs["root"] if self.dirs else None)
+        logger.info(f"Finished {self.image_path} ({self.status}, {len(self.rows)} variants)")
+        self.scheduler.open_slots.release()
+        self.finished.set()
+        self._emit("finished", status=self.status, variants=len(self.rows),
+                   output_dir=self.dirs["root"] if self.dirs else None,
+                   report=os.path.join(self.dirs["report"], "index.html") if self.dirs else None)
+
+class BatchScheduler:
+    """
+    Runs the full analysis for many images on one pool of `jobs` workers.
+    At most `max_open_images` images are in flight at once, which bounds
+    memory (each holds a decoded reference) while still letting the next
+    image's encodes fill the cores during the previous image's tail.
+    With `memory_budget_mb`, work is also admitted against estimated peak
+    memory (see MemoryBudget), so huge images run at lower concurrency.
+    With sampling="adaptive", each format gets at most `max_encodes` lossy
+    variants (default: as many as the --steps grid), placed where its
+    curve bends rather than evenly.
+    With aggregate=False (a long-running service), no CorpusSummary is
+    kept, as it would grow with every job served.
+    """
+
+    def __init__(self, formats, steps, report_root, jobs=None, engine="numpy", max_open_images=2, cache=None,
+                 backend="cli", diff_max_size=0, charts="svg", report_performance=False, resume=False,
+                 memory_budget_mb=None, sampling="grid", max_encodes=None, refine_tolerance=DEFAULT_TOLERANCE,
+                 aggregate=True):
+        self.formats = formats
+        self.steps = steps
+        self.report_root = report_root
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.engine = engine
+        self.max_open_images = max(1, max_open_images)
+        self.cache = cache
+        self.backend = backend
+        self.diff_max_size = diff_max_size
+        self.charts = charts
+        self.report_performance = report_performance
+        self.resume = resume
+        self.sampling = sampling
+        self.max_encodes = max_encodes
+        self.refine_tolerance = refine_tolerance
+        self.budget = MemoryBudget(memory_budget_mb * 2**20) if memory_budget_mb else None
+        self.summary = CorpusSummary() if aggregate else None
+        self.cancelled = threading.Event()
+        self.work_pool = None
+        self.report_pool = None
+        self.chart_pool = None
+        self.open_slots = None
+
+    def start(self):
+        """
+        Opens the worker pools. run() does this itself; a long-running
+        service calls it once and keeps the pools warm between jobs.
+        """
+        self.open_slots = threading.BoundedSemaphore(self.max_open_images)
+        # Threads suffice: encoders are subprocesses or GIL-releasing Pillow codecs, as is NumPy.
+        # Matplotlib holds the GIL, so charts get processes (spawned, as this
+        # process is already multi-threaded when they start).
+        self.work_pool = ThreadPoolExecutor(max_workers=self.jobs)
+        self.report_pool = ThreadPoolExecutor(max_workers=1)
+        self.chart_pool = ProcessPoolExecutor(max_workers=self.jobs, mp_context=multiprocessing.get_context("spawn"))
+
+    def warm_up(self):
+        """Starts every chart worker and loads matplotlib in it, so the first report pays no start-up."""
+        if self.charts == "svg":
+            futures = [self.chart_pool.submit(warm_chart_worker) for _ in range(self.jobs)]
+            for future in futures:
+                future.result()
+
+    def cancel(self):
+        """
+        Stops an interrupted run: running tools are killed and no further
+        encodes, analyses or reports are queued. Images in flight finish as
+        "cancelled" without a journaled report, so --resume completes them.
+        """
+        self.cancelled.set()
+        cancel_tools()
+
+    def shutdown(self):
+        """Waits for queued work (drops it after cancel()) and closes the pools."""
+        for pool in (self.work_pool, self.report_pool, self.chart_pool):
+            if pool is not None:
+                pool.shutdown(cancel_futures=self.cancelled.is_set())
+        self.work_pool = self.report_pool = self.chart_pool = None
+
+    def submit_work(self, cost, fn, *args):
+        """Queues fn(*args) on the worker pool, once `cost` bytes fit the memory budget (if any)."""
+        if self.budget is None:
+            return self.work_pool.submit(fn, *args)
+        return self.budget.submit(self.work_pool, cost, fn, *args)
+
+    def submit(self, image_path, formats=None, steps=None, listener=None):
+        """
+        Starts one image on the open pools and returns its ImageJob (wait on
+        job.finished). Blocks while `max_open_images` images are in flight.
+        """
+        self.open_slots.acquire()
+        try:
+            job = ImageJob(image_path, self, formats, steps, listener)
+        except BaseException:
+            # No job owns the slot yet, so nothing else would give it back
+            self.open_slots.release()
+            raise
+        job.start()
+        return job
+
+    def run(self, image_paths):
+        """Processes every image. Returns the CorpusSummary (None with aggregate=False)."""
+        jobs = []
+        self.start()
+        try:
+            for idx, path in enumerate(image_paths, start=1):
+                logger.info(f"[{idx}/{len(image_paths)}] Starting {path}")
+                jobs.append(self.submit(path))
+
+            for job in jobs:
+                job.finished.wait()
+        except BaseException:
+            # Interrupted: kill the running tools so the pools drain quickly
+            self.cancel()
+            raise
+        finally:
+            self.shutdown()
+
+        return self.summary
+
+def write_corpus_summary(summary, report_root):
+    """
+    Writes corpus_summary.csv and, next to it, corpus_rd.csv (both
+    timestamped if a summary already exists). Returns the summary's path.
+    """
+    suffix = ""
+    if os.path.exists(os.path.join(os.path.abspath(report_root), "corpus_summary.csv")):
+        suffix = "_" + datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_path = os.path.join(os.path.abspath(report_root), f"corpus_summary{suffix}.csv")
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    rd_path = summary.write_rd(os.path.join(os.path.abspath(report_root), f"corpus_rd{suffix}.csv"))
+    if rd_path:
+        logger.info(f"Rate-distortion summary: {rd_path}")
+    return summary.write(csv_path)
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
@@ -0,0 +1,176 @@
+# ==============================================================================
+# Script Name: search.py
+# Description: Helper module for target-quality mode. Bisects the quality
+#              setting of each format to find the smallest file that still
+#              meets a metric threshold (e.g. SSIM >= 0.98).
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import csv
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from libs.compressor import attach_cache_keys, build_tasks, release_sources, run_task
+    from libs.analyzer import METRICS_MAP, LazyReference, analyze_variant, write_metrics
+    from libs.profiling import bind_active
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from libs.compressor import attach_cache_keys, build_tasks, release_sources, run_task
+    from libs.analyzer import METRICS_MAP, LazyReference, analyze_variant, write_metrics
+    from libs.profiling import bind_active
+
+logger = logging.getLogger("Search")
+
+# Metrics where a smaller value means a closer match
+LOWER_IS_BETTER = {"MAE", "RMSE"}
+
+QUALITY_MIN = 1
+QUALITY_MAX = 100
+
+# Metric columns a target can name: every engine's metrics (MS-SSIM is NumPy only), optionally per channel
+TARGET_METRICS = sorted(set(METRICS_MAP) | {"MSSSIM"})
+TARGET_CHANNELS = ["Red", "Green", "Blue", "Alpha", "Gray"]
+
+def parse_target(spec):
+    """
+    Parses 'METRIC=VALUE' (e.g. 'SSIM=0.98', 'PSNR-Red=40', 'MS-SSIM=0.99').
+    Returns (metric_column, threshold). Raises ValueError for unknown
+    metrics, before any encode is spent on them.
+    """
+    if '=' not in spec:
+        raise ValueError(f"Target must look like METRIC=VALUE, got '{spec}'")
+    metric, value = spec.split('=', 1)
+    metric = metric.strip()
+    # Accept the usual spelling; the CSV column is MSSSIM
+    if metric.upper().startswith("MS-SSIM"):
+        metric = "MSSSIM" + metric[len("MS-SSIM"):]
+    parts = metric.split('-', 1)
+    parts[0] = parts[0].upper()
+    if len(parts) > 1:
+        parts[1] = parts[1].title()
+    if parts[0] not in TARGET_METRICS or (len(parts) > 1 and parts[1] not in TARGET_CHANNELS):
+        raise ValueError(f"Unknown target metric '{metric}'. Valid metrics: {', '.join(TARGET_METRICS)} "
+                         f"(MSSSIM may be written MS-SSIM), optionally per channel as METRIC-CHANNEL with "
+                         f"CHANNEL one of {', '.join(TARGET_CHANNELS)}")
+    try:
+        threshold = float(value)
+    except ValueError:
+        raise ValueError(f"Target value must be a number, got '{value.strip()}'")
+    return '-'.join(parts), threshold
+
+def meets_target(row, metric, threshold):
+    value = row.get(metric)
+    if not isinstance(value, (int, float)):
+        return False
+    if metric.split('-')[0] in LOWER_IS_BETTER:
+        return value <= threshold
+    return value >= threshold
+
+def search_format(fmt, evaluate, metric, threshold):
+    """
+    Finds the lowest quality whose variant meets the target, assuming the
+    metric improves monotonically with quality. Bisection over 1..100 needs
+    at most 8 encodes (the q100 feasibility check plus 7 halvings).
+    Returns (best_row or None, rows evaluated).
+    """
+    rows = {}
+
+    def measure(q):
+        if q not in rows:
+            rows[q] = evaluate(fmt, q)
+        return rows[q]
+
+    lo, hi = QUALITY_MIN, QUALITY_MAX
+    if not meets_target(measure(hi), metric, threshold):
+        logger.warning(f"{fmt}: even quality {hi} does not reach {metric}={threshold}")
+        return None, list(rows.values())
+
+    # Invariant: hi meets the target; everything below lo is known to miss it
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if meets_target(measure(mid), metric, threshold):
+            hi = mid
+        else:
+            lo = mid + 1
+
+    return rows[hi], list(rows.values())
+
+def run_target_search(input_path, dirs, formats, target, engine="numpy", jobs=None, cache=None, backend="cli",
+                      diff_max_size=0):
+    """
+    Runs the search for every format (formats in parallel, each search is
+    sequential). Writes metrics.csv with every measured point and
+    target_search.csv with the winning setting per format.
+    Returns (metrics_path, results), metrics_path as from write_metrics().
+    """
+    metric, threshold = parse_target(target)
+    reference = LazyReference(input_path, engine)
+    source_hash = cache.file_hash(input_path) if cache is not None else None
+    # One decoded source serves every probe of every format
+    sources = build_tasks(input_path, dirs["images"], formats, [QUALITY_MAX], lossless=False, backend=backend)
+    source = sources[0].get("source") if sources else None
+
+    def evaluate(fmt, q):
+        tasks = build_tasks(input_path, dirs["images"], [fmt], [q], lossless=False, backend=backend, source=source)
+        if cache is not None:
+            attach_cache_keys(tasks, cache, input_path)
+        entry = run_task(tasks[0], cache)
+        row = analyze_variant(entry, input_path, dirs["diffs"], dirs["data"], engine,
+                              reference, cache, source_hash, diff_max_size)
+        logger.info(f"{fmt} q{q}: {metric}={row.get(metric)} size={row['size_kb']} KB")
+        return row
+
+    searchable = [f for f in formats if build_tasks(input_path, dirs["images"], [f], [QUALITY_MAX], lossless=False)]
+    for fmt in formats:
+        if fmt not in searchable:
+            logger.warning(f"Format '{fmt}' has no quality setting to search, skipping")
+
+    all_rows = []
+    results = []
+    try:
+        workers = max(1, min(jobs or os.cpu_count() or 1, len(searchable) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(bind_active(search_format), fmt, evaluate, metric, threshold) for fmt in searchable]
+            for fmt, future in zip(searchable, futures):
+                try:
+                    best, rows = future.result()
+                except Exception as e:
+                    logger.error(f"Target search failed for {fmt}: {e}")
+                    continue
+                all_rows.extend(sorted(rows, key=lambda r: r['quality']))
+                results.append({
+                    "format": rows[0]['format'] if rows else fmt,
+                    "target": f"{metric}={threshold}",
+                    "quality": best['quality'] if best else "",
+                    "params": best['params'] if best else "",
+                    "size_kb": best['size_kb'] if best else "",
+                    "value": best.get(metric, "") if best else "",
+                    "met": best is not None,
+                    "encodes": len(rows),
+                    "filename": best['filename'] if best else "",
+                })
+    finally:
+        release_sources(sources)
+        reference.close()
+
+    metrics_path = write_metrics(os.path.join(dirs["data"], "metrics.csv"), all_rows)
+
+    with open(os.path.join(dirs["data"], "target_search.csv"), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=["format", "target", "quality", "params", "size_kb",
+                                               "value", "met", "encodes", "filename"])
+        writer.writeheader()
+        writer.writerows(results)
+
+    return metrics_path, results
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
@@ -0,0 +1,260 @@
+# ==============================================================================
+# Script Name: service.py
+# Description: Helper module for daemon mode (--serve). A localhost HTTP
+#              service that keeps one warm BatchScheduler (worker threads,
+#              chart processes, imports, cache) and runs analysis jobs sent
+#              to it, streaming progress back as JSON lines. Concurrent
+#              requests for the same image share one job.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import json
+import logging
+import itertools
+import threading
+import urllib.request
+import sys
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from libs.compressor import MAX_STEPS
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from libs.compressor import MAX_STEPS
+
+logger = logging.getLogger("Service")
+
+DEFAULT_HOST = "127.0.0.1"
+
+# Finished jobs kept for GET /jobs/<id>
+FINISHED_JOBS_KEPT = 100
+
+class ServiceJob:
+    """
+    One analysis job and its event log. Any number of clients can follow
+    it: each replays the events so far, then waits for new ones.
+    """
+
+    def __init__(self, job_id, key, image, formats, steps):
+        self.id = job_id
+        self.key = key
+        self.image = image
+        self.formats = formats
+        self.steps = steps
+        self.events = []
+        self.done = False
+        self._cond = threading.Condition()
+
+    def emit(self, event, data):
+        with self._cond:
+            self.events.append(dict(data, event=event, job=self.id))
+            if event == "finished":
+                self.done = True
+            self._cond.notify_all()
+
+    def follow(self):
+        """Yields every event of the job, blocking until the next one, up to 'finished'."""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.events) and not self.done:
+                    self._cond.wait()
+                pending = self.events[index:]
+                index = len(self.events)
+                done = self.done
+            yield from pending
+            if done and index >= len(self.events):
+                return
+
+    def info(self):
+        return {"job": self.id, "image": self.image, "formats": self.formats, "steps": self.steps,
+                "done": self.done, "events": len(self.events)}
+
+class AnalysisService:
+    """Accepts jobs for a started BatchScheduler and de-duplicates identical in-flight ones."""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.active = {}
+        self.finished = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def job_key(self, image, formats, steps):
+        # Same file (path, size and mtime) with the same sweep = same results
+        st = os.stat(image)
+        return (os.path.realpath(image), st.st_size, st.st_mtime_ns, tuple(formats), steps)
+
+    def submit(self, image, formats=None, steps=None):
+        """Returns (job, deduplicated). Raises ValueError for bad requests."""
+        if not isinstance(image, str) or not os.path.isfile(image):
+            raise ValueError(f"Image not found: {image}")
+        formats = formats or self.scheduler.formats
+        steps = self.scheduler.steps if steps is None else steps
+        if not isinstance(formats, list) or not all(isinstance(f, str) for f in formats):
+            raise ValueError("'formats' must be a list of format names")
+        if not isinstance(steps, int) or isinstance(steps, bool) or not 1 <= steps <= MAX_STEPS:
+            raise ValueError(f"'steps' must be an integer from 1 to {MAX_STEPS}")
+
+        key = self.job_key(image, formats, steps)
+        with self._lock:
+            job = self.active.get(key)
+            if job is not None:
+                logger.info(f"Job {job.id}: joined by a duplicate request for {image}")
+                return job, True
+            job = ServiceJob(next(self._ids), key, os.path.abspath(image), formats, steps)
+            self.active[key] = job
+        job.emit("queued", {"image": job.image, "formats": formats, "steps": steps})
+
+        def listener(event, data):
+            if event == "variant":
+                data = data["row"]
+            job.emit(event, data)
+            if event == "finished":
+                self._retire(job)
+
+        # Runs on its own thread: the scheduler blocks while max_open_images are in flight
+        threading.Thread(target=self._start, args=(job, listener), daemon=True).start()
+        return job, False
+
+    def _start(self, job, listener):
+        try:
+            self.scheduler.submit(job.image, job.formats, job.steps, listener)
+        except Exception as e:
+            logger.error(f"Job {job.id} could not start: {e}")
+            job.emit("finished", {"status": "failed", "error": str(e)})
+            self._retire(job)
+
+    def _retire(self, job):
+        with self._lock:
+            self.active.pop(job.key, None)
+            self.finished[job.id] = job
+            while len(self.finished) > FINISHED_JOBS_KEPT:
+                self.finished.popitem(last=False)
+
+    def get(self, job_id):
+        with self._lock:
+            for job in self.active.values():
+                if job.id == job_id:
+                    return job
+            return self.finished.get(job_id)
+
+    def status(self):
+        with self._lock:
+            return {"status": "ok", "workers": self.scheduler.jobs,
+                    "active": [job.info() for job in self.active.values()],
+                    "finished": len(self.finished)}
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    POST /jobs        {"image": path, "formats": [...], "steps": N} -> streams the job's events
+    GET  /jobs/<id>   streams a job's events (replayed from the start)
+    GET  /health      service and queue status
+    Events are newline-delimited JSON, one object per line.
+    """
+
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def send_json(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, job, deduplicated):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            self.wfile.write((json.dumps({"event": "accepted", "job": job.id,
+                                          "deduplicated": deduplicated}) + "\n").encode())
+            for event in job.follow():
+                self.wfile.write((json.dumps(event, default=str) + "\n").encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; the job itself carries on
+            logger.info(f"Client stopped following job {job.id}")
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/health":
+            self.send_json(200, service.status())
+            return
+        if self.path.startswith("/jobs/"):
+            try:
+                job = service.get(int(self.path[len("/jobs/"):]))
+            except ValueError:
+                job = None
+            if job is None:
+                self.send_json(404, {"error": "unknown job"})
+                return
+            self.stream(job, False)
+            return
+        self.send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("Request body must be a JSON object")
+            job, deduplicated = self.server.service.submit(request.get("image"), request.get("formats"),
+                                                           request.get("steps"))
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.stream(job, deduplicated)
+
+def serve(scheduler, port, host=DEFAULT_HOST):
+    """
+    Starts the scheduler's pools, warms them up and serves until interrupted.
+    Binds to localhost by default: jobs name files on this machine.
+    """
+    scheduler.start()
+    server = None
+    try:
+        scheduler.warm_up()
+        server = ThreadingHTTPServer((host, port), ServiceHandler)
+        server.daemon_threads = True
+        server.service = AnalysisService(scheduler)
+        logger.warning(f"Serving on http://{host}:{server.server_address[1]} ({scheduler.jobs} workers)")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        scheduler.cancel()
+    finally:
+        if server is not None:
+            server.server_close()
+        scheduler.shutdown()
+
+def submit_job(url, image, formats=None, steps=None):
+    """Client side: posts one job to a running service and yields its events."""
+    payload = {"image": os.path.abspath(image)}
+    if formats:
+        payload["formats"] = formats
+    if steps:
+        payload["steps"] = steps
+    request = urllib.request.Request(url.rstrip("/") + "/jobs", data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request) as response:
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
@@ -0,0 +1,98 @@
+# ==============================================================================
+# Script Name: store.py
+# Description: Helper module for the typed, columnar metrics store
+#              (data/metrics.npz). Every column is one NumPy array, so the
+#              reporter and corpus tools load a run without parsing CSV text.
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import json
+import math
+import logging
+import sys
+
+import numpy as np
+
+logger = logging.getLogger("Store")
+
+# Bump on incompatible layout changes; readers reject other versions
+SCHEMA_VERSION = 1
+
+STORE_NAME = "metrics.npz"
+
+# Columns with a fixed type; every other column is a float64 metric
+STRING_COLUMNS = ["filename", "format", "params", "relative_path", "diff_path", "details"]
+INT_COLUMNS = ["quality"]
+
+SCHEMA_KEY = "__schema__"
+
+def store_path(csv_path):
+    """The store written next to a metrics.csv."""
+    return os.path.join(os.path.dirname(csv_path), STORE_NAME)
+
+def to_column(name, values):
+    """Returns (type, array) for one column."""
+    if name in STRING_COLUMNS:
+        return "str", np.array(["" if v is None else str(v) for v in values], dtype=np.str_)
+    if name in INT_COLUMNS:
+        return "int", np.array(values, dtype=np.int32)
+    # Metrics: missing values (a failed metric, None or "") are stored as NaN
+    try:
+        return "float", np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return "float", np.array([None if v == "" else v for v in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        # Not a metric after all: kept as text rather than dropped
+        return "str", np.array(["" if v is None else str(v) for v in values], dtype=np.str_)
+
+def write_metrics_store(path, rows, fieldnames):
+    """
+    Writes rows as one typed array per column, in `fieldnames` order
+    (the metrics.csv column order). The schema (column names, types and
+    version) is stored alongside, so readers need no guessing.
+    """
+    columns = {}
+    schema = []
+    for name in fieldnames:
+        values = [row.get(name) for row in rows]
+        kind, columns[name] = to_column(name, values)
+        schema.append([name, kind])
+
+    meta = json.dumps({"version": SCHEMA_VERSION, "rows": len(rows), "columns": schema})
+    # np.savez appends .npz to names without it, so the temp name keeps the extension
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, **{SCHEMA_KEY: np.array(meta)}, **columns)
+    os.replace(tmp_path, path)
+    return path
+
+def read_metrics_store(path):
+    """Returns (columns, fieldnames): a dict of NumPy arrays and the column order."""
+    with np.load(path, allow_pickle=False) as npz:
+        meta = json.loads(str(npz[SCHEMA_KEY]))
+        if meta.get("version") != SCHEMA_VERSION:
+            raise ValueError(f"{path} has schema version {meta.get('version')}, expected {SCHEMA_VERSION}")
+        fieldnames = [name for name, _ in meta["columns"]]
+        columns = {name: npz[name] for name in fieldnames}
+    return columns, fieldnames
+
+def to_rows(columns, fieldnames):
+    """Row dicts with plain Python values (ints, floats, str); NaN metrics become None."""
+    lists = {}
+    for name in fieldnames:
+        values = columns[name].tolist()
+        if columns[name].dtype.kind == "f":
+            values = [None if math.isnan(v) else v for v in values]
+        lists[name] = values
+    return [dict(zip(fieldnames, values)) for values in zip(*(lists[name] for name in fieldnames))]
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
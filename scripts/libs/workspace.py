@@ -0,0 +1,151 @@
+# ==============================================================================
+# Script Name: workspace.py
+# Description: Helper module for locating input images and creating the
+#              per-image output folders (images/, diffs/, data/).
+# Note:        This is a library file. Do not run directly.
+# ==============================================================================
+
+import os
+import glob
+import itertools
+import logging
+import datetime
+import shutil
+import sys
+
+logger = logging.getLogger("Workspace")
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".tif", ".tiff", ".bmp", ".gif")
+
+def is_image(path):
+    return os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS)
+
+def read_manifest(manifest_path):
+    """
+    Reads one input per line. Blank lines and '#' comments are ignored.
+    Relative entries are resolved against the manifest's folder.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    with open(manifest_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if not os.path.isabs(line):
+                line = os.path.join(base_dir, line)
+            entries.append(line)
+    return entries
+
+def is_workspace(path):
+    """True for an output folder created by create_workspace()."""
+    return all(os.path.isdir(os.path.join(path, d)) for d in ("images", "diffs", "data"))
+
+def find_images(inputs, manifest=None):
+    """
+    Expands files, directories (recursively) and glob patterns into a sorted,
+    de-duplicated list of image paths. Missing inputs are logged and skipped.
+    Output folders from earlier runs are not descended into.
+    """
+    candidates = list(inputs)
+    if manifest:
+        candidates.extend(read_manifest(manifest))
+
+    explicit = []
+    discovered = []
+    for entry in candidates:
+        if os.path.isdir(entry):
+            for dirpath, dirnames, filenames in os.walk(entry):
+                dirnames[:] = [d for d in dirnames if not is_workspace(os.path.join(dirpath, d))]
+                discovered.extend(os.path.join(dirpath, f) for f in filenames)
+        elif os.path.isfile(entry):
+            # Files named explicitly are taken as-is, whatever their extension
+            explicit.append(entry)
+        elif glob.has_magic(entry):
+            matches = glob.glob(entry, recursive=True)
+            if not matches:
+                logger.warning(f"No files match pattern: {entry}")
+            discovered.extend(matches)
+        else:
+            logger.error(f"Input file not found: {entry}")
+
+    images = []
+    seen = set()
+    for path in explicit + sorted(p for p in discovered if is_image(p)):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            images.append(path)
+    return images
+
+def unique_output_dir(base_output_dir):
+    """
+    Creates and returns a new output folder: `base_output_dir`, or with a
+    timestamp (and a counter if needed) appended when it exists. Creating
+    the folder is what claims a name, so concurrent jobs never share one.
+    """
+    os.makedirs(os.path.dirname(base_output_dir) or ".", exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    candidates = itertools.chain([base_output_dir, f"{base_output_dir}_{timestamp}"],
+                                 (f"{base_output_dir}_{timestamp}_{n}" for n in itertools.count(2)))
+    for candidate in candidates:
+        try:
+            os.makedirs(candidate, exist_ok=False)
+            return candidate
+        except FileExistsError:
+            continue
+
+def workspace_dirs(base_output_dir):
+    return {
+        "root": base_output_dir,
+        "images": os.path.join(base_output_dir, "images"),
+        "diffs": os.path.join(base_output_dir, "diffs"),
+        "data": os.path.join(base_output_dir, "data"),
+        "report": os.path.join(base_output_dir, ".") # Report at root of project folder
+    }
+
+def create_workspace(image_path, report_root):
+    """
+    Creates the output folders for one image and copies the original into it.
+    Returns (dirs, original_copy).
+    """
+    filename = os.path.basename(image_path)
+    image_name_no_ext, ext = os.path.splitext(filename)
+
+    # If folder exists, append timestamp (the root folder is created here)
+    dirs = workspace_dirs(unique_output_dir(os.path.join(os.path.abspath(report_root), image_name_no_ext)))
+
+    for d in dirs.values():
+        os.makedirs(d, exist_ok=True)
+
+    # Copy original using its ACTUAL filename, not "original.ext"
+    original_copy = os.path.join(dirs["images"], filename)
+    shutil.copy(image_path, original_copy)
+
+    return dirs, original_copy
+
+def find_workspaces(image_path, report_root):
+    """Output folders earlier runs may have created for this image (see unique_output_dir)."""
+    base = os.path.join(os.path.abspath(report_root), os.path.splitext(os.path.basename(image_path))[0])
+    candidates = [base] + sorted(glob.glob(f"{glob.escape(base)}_*"))
+    return [path for path in candidates if is_workspace(path)]
+
+def open_workspace(base_output_dir, image_path):
+    """
+    Reuses an existing output folder (for --resume). The original is copied
+    again if its copy is missing or incomplete. Returns (dirs, original_copy).
+    """
+    dirs = workspace_dirs(base_output_dir)
+    original_copy = os.path.join(dirs["images"], os.path.basename(image_path))
+    if not os.path.isfile(original_copy) or os.path.getsize(original_copy) != os.path.getsize(image_path):
+        shutil.copy(image_path, original_copy)
+    return dirs, original_copy
+
+# ==============================================================================
+# Execution Guard
+# ==============================================================================
+if __name__ == "__main__":
+    print("\n[!] This is a library file and cannot be run directly.")
+    print(f"    Please run the main script instead:\n")
+    print(f"    python scripts/compression_analyzer.py <image_path>\n")
+    sys.exit(1)
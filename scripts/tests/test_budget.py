@@ -0,0 +1,116 @@
+# ==============================================================================
+# Script Name: test_budget.py
+# Description: Tests for memory-aware admission control: work only starts
+#              while its estimated peak fits the budget, oversized work runs
+#              alone, and small work fills the gaps without starving large.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs import budget as budget_module
+from libs.budget import MemoryBudget
+
+class Gates:
+    """Tasks that block until released, recording the order they started in."""
+
+    def __init__(self):
+        self.started = []
+        self.events = {}
+        self._lock = threading.Lock()
+
+    def task(self, name):
+        with self._lock:
+            self.started.append(name)
+            event = self.events.setdefault(name, threading.Event())
+        assert event.wait(10)
+        return name
+
+    def wait_started(self, name, timeout=10):
+        deadline = time.monotonic() + timeout
+        while name not in self.started:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    def release(self, name):
+        with self._lock:
+            self.events.setdefault(name, threading.Event()).set()
+
+@pytest.fixture
+def pool():
+    pool = ThreadPoolExecutor(max_workers=8)
+    yield pool
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def test_work_waits_for_memory(pool):
+    budget, gates = MemoryBudget(100), Gates()
+    a = budget.submit(pool, 60, gates.task, "a")
+    b = budget.submit(pool, 60, gates.task, "b")
+    assert budget.in_use == 60 and list(budget.waiting)
+
+    gates.release("a")
+    assert a.result(10) == "a"
+    gates.release("b")
+    assert b.result(10) == "b"
+    assert gates.started == ["a", "b"]
+    assert budget.in_use == 0 and budget.running == 0
+
+def test_oversized_work_runs_alone(pool):
+    budget, gates = MemoryBudget(100), Gates()
+    small = budget.submit(pool, 10, gates.task, "small")
+    huge = budget.submit(pool, 500, gates.task, "huge")
+    assert not huge.done() and budget.running == 1
+
+    gates.release("small")
+    small.result(10)
+    gates.release("huge")
+    assert huge.result(10) == "huge"
+    assert budget.in_use == 0
+
+def test_small_work_overtakes_a_waiting_task_a_bounded_number_of_times(pool, monkeypatch):
+    monkeypatch.setattr(budget_module, "MAX_OVERTAKES", 2)
+    budget, gates = MemoryBudget(100), Gates()
+    first = budget.submit(pool, 50, gates.task, "first")
+    big = budget.submit(pool, 80, gates.task, "big")
+    smalls = [budget.submit(pool, 10, gates.task, f"small{i}") for i in range(4)]
+
+    # Two small tasks start in the gap; the rest queue behind the big one, though they would fit
+    assert budget.running == 3 and budget.in_use == 70
+    assert [item[3] for item in budget.waiting] == [("big",), ("small2",), ("small3",)]
+
+    gates.release("first")
+    gates.wait_started("big")
+    assert [item[3] for item in budget.waiting] == [("small2",), ("small3",)]
+    for name in ["small0", "small1", "big", "small2", "small3"]:
+        gates.release(name)
+    assert big.result(10) == "big"
+    assert [f.result(10) for f in smalls] == [f"small{i}" for i in range(4)]
+
+def test_failed_work_returns_its_memory(pool):
+    budget = MemoryBudget(100)
+
+    def fail():
+        raise RuntimeError("encoder crashed")
+
+    with pytest.raises(RuntimeError):
+        budget.submit(pool, 90, fail).result(10)
+    assert budget.in_use == 0 and budget.running == 0
+
+def test_reservations_block_only_when_another_image_holds_memory():
+    budget = MemoryBudget(100)
+    budget.reserve(500)                  # the only open image: admitted despite its size
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (budget.reserve(30), acquired.set()), daemon=True)
+    waiter.start()
+    assert not acquired.wait(0.2)
+    budget.unreserve(500)
+    assert acquired.wait(10)
+    assert budget.in_use == 30 and budget.reserved == 1
@@ -0,0 +1,66 @@
+# ==============================================================================
+# Script Name: test_cache.py
+# Description: Tests for the content-addressed result cache: hits, keys and
+#              LRU eviction.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.cache import ResultCache, make_key
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+def test_file_and_json_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    src = write(tmp_path / "a.webp", b"RIFF" + bytes(100))
+    key = make_key(cache.file_hash(src), "cwebp", "1.0", ["-q", 50])
+
+    assert not cache.get_file(key, str(tmp_path / "miss.webp"))
+    cache.put_file(key, src, "encode")
+    assert cache.get_file(key, str(tmp_path / "hit.webp"))
+    assert (tmp_path / "hit.webp").read_bytes() == (tmp_path / "a.webp").read_bytes()
+
+    assert cache.get_json("0" * 64) is None
+    cache.put_json(key[::-1], {"PSNR": 31.5}, "analyze")
+    assert cache.get_json(key[::-1]) == {"PSNR": 31.5}
+
+def test_keys_follow_content_and_params(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    a = write(tmp_path / "a.png", b"one")
+    b = write(tmp_path / "b.png", b"one")
+    assert cache.file_hash(a) == cache.file_hash(b)
+    assert make_key("h", "cwebp", "1.0", ["-q", 50]) != make_key("h", "cwebp", "1.0", ["-q", 51])
+
+    time.sleep(0.01)
+    write(tmp_path / "a.png", b"two")
+    assert cache.file_hash(a) != cache.file_hash(b)
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+    src = write(tmp_path / "blob", bytes(100))
+    keys = [make_key("blob", i) for i in range(3)]
+
+    cache.put_file(keys[0], src, "encode")
+    cache.put_file(keys[1], src, "encode")
+    time.sleep(0.01)
+    assert cache.get_file(keys[0], str(tmp_path / "out"))    # keys[1] is now the oldest
+    cache.put_file(keys[2], src, "encode")
+
+    assert cache.has(keys[0]) and cache.has(keys[2])
+    assert not cache.has(keys[1])
+    assert not os.path.exists(cache._object_path(keys[1]))
+
+def test_a_missing_object_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    key = make_key("gone")
+    cache.put_json(key, {"PSNR": 1.0}, "analyze")
+    os.remove(cache._object_path(key))
+    assert cache.get_json(key) is None
@@ -0,0 +1,55 @@
+# ==============================================================================
+# Script Name: test_probe.py
+# Description: Tests for the header-only metadata probe against files written
+#              by Pillow.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image, features
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.probe import read_details
+
+SIZE = (37, 21)
+
+def pixels(mode):
+    rng = np.random.default_rng(3)
+    channels = {"L": 1, "RGB": 3, "RGBA": 4}[mode]
+    data = rng.integers(0, 256, (SIZE[1], SIZE[0], channels), dtype=np.uint8)
+    return Image.fromarray(data[:, :, 0] if channels == 1 else data, mode)
+
+@pytest.mark.parametrize("mode, fmt, options, expected", [
+    ("RGB", "PNG", {}, (8, "sRGB", "PNG")),
+    ("L", "PNG", {}, (8, "Gray", "PNG")),
+    ("RGB", "JPEG", {"quality": 80, "exif": b"Exif\x00\x00" + bytes(2000)}, (8, "sRGB", "JPEG")),
+    ("L", "JPEG", {"progressive": True}, (8, "Gray", "JPEG")),
+    ("RGB", "WEBP", {"quality": 80}, (8, "sRGB", "WEBP")),
+    ("RGB", "WEBP", {"lossless": True}, (8, "sRGB", "WEBP")),
+    ("RGBA", "WEBP", {"quality": 80}, (8, "sRGB", "WEBP")),
+])
+def test_header_matches_the_image(tmp_path, mode, fmt, options, expected):
+    if fmt == "WEBP" and not features.check("webp"):
+        pytest.skip("Pillow was built without WebP")
+    path = str(tmp_path / f"image.{fmt.lower()}")
+    pixels(mode).save(path, fmt, **options)
+
+    info = read_details(path)
+    assert (info["width"], info["height"]) == SIZE
+    assert (info["depth"], info["colorspace"], info["format"]) == expected
+
+def test_palette_png_reports_eight_bit_depth(tmp_path):
+    path = str(tmp_path / "palette.png")
+    pixels("RGB").convert("P", colors=4).save(path, bits=2)
+    assert read_details(path)["depth"] == 8
+
+@pytest.mark.parametrize("data", [b"", b"GIF89a" + bytes(60), b"\xff\xd8\xff\xda" + bytes(60)])
+def test_unknown_or_damaged_headers_fall_back(tmp_path, data):
+    path = tmp_path / "broken"
+    path.write_bytes(data)
+    assert read_details(str(path)) is None
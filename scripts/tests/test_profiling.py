@@ -0,0 +1,50 @@
+# ==============================================================================
+# Script Name: test_profiling.py
+# Description: Tests for the run profile's per-stage memory and tool
+#              accounting.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.profiling import RunProfile, current_rss_mb, stage
+from libs.runner import run_command
+
+@pytest.mark.skipif(current_rss_mb() is None, reason="current RSS is only read from /proc")
+def test_stage_records_its_own_memory_growth():
+    profile = RunProfile("test")
+
+    def work():
+        with stage("small"):
+            pass
+        with stage("big"):
+            block = np.ones(64 * 2**20, dtype=np.uint8)
+        with stage("after"):
+            pass
+        return block
+
+    profile.bind(work)()
+    stages = profile.stages()
+    assert stages["big"]["rss_growth_mb"] >= 48
+    assert stages["small"]["rss_growth_mb"] < 16
+    assert stages["after"]["rss_growth_mb"] < 16
+
+def test_run_command_counts_against_open_stages():
+    profile = RunProfile("test")
+
+    def work():
+        with stage("outer"):
+            with stage("inner"):
+                return run_command([sys.executable, "-c", "pass"], check=True)
+
+    result = profile.bind(work)()
+    stages = profile.stages()
+    assert result.returncode == 0
+    assert stages["outer"]["subprocesses"] == stages["inner"]["subprocesses"] == 1
+    assert stages["inner"]["subprocess_cpu_s"] > 0
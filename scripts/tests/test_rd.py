@@ -0,0 +1,67 @@
+# ==============================================================================
+# Script Name: test_rd.py
+# Description: Tests for the rate-distortion fitting and Bjontegaard deltas
+#              against curve pairs whose BD-rate and BD-quality are known.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs import rd
+
+RATES = np.array([100.0, 200.0, 400.0, 800.0])
+
+def test_half_the_rate_is_minus_fifty_percent():
+    # PSNR linear in log2(rate), 6 dB per doubling: PCHIP fits it exactly
+    quality = 30 + 6 * np.log2(RATES / 100)
+    bd_rate, bd_quality = rd.bd_batch([RATES], [quality], [RATES / 2], [quality])
+    assert bd_rate[0] == pytest.approx(-50.0)
+    assert bd_quality[0] == pytest.approx(6.0)
+
+def test_constant_rate_factor_on_a_bent_curve():
+    # A constant rate ratio shifts log rate evenly, whatever the curve's shape
+    quality = np.array([20.0, 31.0, 37.0, 40.0])
+    bd_rate, _ = rd.bd_batch([RATES, RATES], [quality, quality], [RATES * 0.8, RATES * 1.25],
+                             [quality, quality])
+    assert bd_rate == pytest.approx([-20.0, 25.0])
+
+def test_unusable_pairs_are_nan():
+    quality = np.array([30.0, 33.0, 36.0, 39.0])
+    bd_rate, bd_quality = rd.bd_batch(
+        [RATES, RATES, RATES],
+        [quality, quality, quality],
+        [RATES[:1], RATES, RATES],           # a single point, then no quality overlap, then NaNs
+        [quality[:1], quality + 20, [np.nan] * 4])
+    assert np.isnan(bd_rate).all()
+    assert np.isnan(bd_quality[[0, 2]]).all()
+
+def test_dominated_points_and_lossless_psnr_are_ignored():
+    quality = 30 + 6 * np.log2(RATES / 100)
+    # An extra larger file with lower quality, and an identical (infinite PSNR) one
+    rates = np.append(RATES / 2, [1000.0, 2000.0])
+    noisy = rd.quality_scale("PSNR", np.append(quality, [35.0, rd.PSNR_INF]))
+    bd_rate, _ = rd.bd_batch([RATES], [quality], [rates], [noisy])
+    assert bd_rate[0] == pytest.approx(-50.0)
+
+def test_comparisons_and_summary_per_format_pair():
+    def rows(fmt, rates, psnr):
+        return [{"format": fmt, "params": f"-q {i}", "size_kb": r, "PSNR": p}
+                for i, (r, p) in enumerate(zip(rates, psnr))]
+
+    quality = 30 + 6 * np.log2(RATES / 100)
+    images = [rd.curve_points(rows("jpeg", RATES, quality) + rows("webp", RATES * f, quality)
+                              + [{"format": "webp", "params": "-lossless", "size_kb": 1.0, "PSNR": rd.PSNR_INF}])
+              for f in (0.5, 0.7)]
+
+    comparisons = rd.bd_comparisons(images)
+    assert [(c["anchor"], c["test"], c["metric"]) for c in comparisons] == [("jpeg", "webp", "PSNR")] * 2
+    [summary] = rd.summarize(comparisons)
+    assert summary["images"] == 2
+    assert summary["bd_rate_mean"] == pytest.approx(-40.0)
+    assert summary["bd_quality_median"] == pytest.approx(np.mean([6.0, -6 * np.log2(0.7)]))
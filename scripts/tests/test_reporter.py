@@ -0,0 +1,40 @@
+# ==============================================================================
+# Script Name: test_reporter.py
+# Description: Tests for the report's chart specs and SVG rendering.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import os
+import sys
+import warnings
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.reporter import chart_specs, render_chart
+
+ROWS = [
+    {"format": "webp", "quality": 50, "size_kb": 3.0, "PSNR": 35.0, "decode_ms": 1.5, "decode_mps": 12.5},
+    {"format": "jpeg", "quality": 50, "size_kb": 4.0, "PSNR": 34.0},
+]
+
+def test_formats_without_a_value_are_left_out_of_its_chart():
+    specs = dict(chart_specs(ROWS, ["PSNR"]))
+    assert [s["label"] for s in specs["PSNR_efficiency"]["series"]] == ["jpeg", "webp"]
+    assert [s["label"] for s in specs["decode_time"]["series"]] == ["webp"]
+
+def test_decode_throughput_is_charted():
+    specs = dict(chart_specs(ROWS, ["PSNR"]))
+    [series] = specs["decode_speed"]["series"]
+    assert (series["x"], series["y"]) == ([3.0], [12.5])
+    assert "encode_time" not in specs
+
+def test_chart_without_series_renders_without_warnings(tmp_path):
+    pytest.importorskip("matplotlib")
+    spec = {"title": "Decode Time vs File Size", "xlabel": "Size (KB)", "ylabel": "ms", "series": []}
+    light, dark = str(tmp_path / "chart.svg"), str(tmp_path / "chart_dark.svg")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        render_chart(spec, light, dark)
+    assert os.path.getsize(light) and os.path.getsize(dark)
@@ -0,0 +1,101 @@
+# ==============================================================================
+# Script Name: test_resume.py
+# Description: Tests for interrupted runs and the run journal: a cancelled
+#              image must not be journaled as reported, --resume must finish
+#              every variant, and only a matching, intact journal is resumed.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs import scheduler as scheduler_module
+from libs.journal import JOURNAL_NAME, RunJournal, find_resumable, run_header
+from libs.scheduler import BatchScheduler
+
+FORMATS = ["webp", "jpeg"]
+STEPS = 4
+
+@pytest.fixture
+def image(tmp_path):
+    rng = np.random.default_rng(1)
+    path = str(tmp_path / "photo.png")
+    Image.fromarray(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)).save(path)
+    return path
+
+def make_scheduler(tmp_path, resume=False):
+    return BatchScheduler(FORMATS, STEPS, str(tmp_path / "reports"), jobs=1, backend="pillow", charts="js",
+                          resume=resume)
+
+def journal(tmp_path):
+    return RunJournal(os.path.join(str(tmp_path / "reports"), "photo", "data", JOURNAL_NAME))
+
+def test_interrupted_run_resumes_to_completion(tmp_path, image, monkeypatch):
+    sched = make_scheduler(tmp_path)
+    run_task = scheduler_module.run_task
+    calls = []
+
+    def interrupted(task, cache):
+        calls.append(task)
+        if len(calls) == 3:
+            sched.cancel()
+        return run_task(task, cache)
+
+    monkeypatch.setattr(scheduler_module, "run_task", interrupted)
+    sched.start()
+    try:
+        job = sched.submit(image)
+        assert job.finished.wait(60)
+    finally:
+        sched.shutdown()
+
+    assert job.status == "cancelled"
+    assert len(calls) == 3
+    assert not journal(tmp_path).reported()
+    monkeypatch.setattr(scheduler_module, "run_task", run_task)
+
+    summary = make_scheduler(tmp_path, resume=True).run([image])
+
+    [result] = summary.images
+    assert result["status"] == "ok"
+    assert result["output_dir"] == os.path.join(str(tmp_path / "reports"), "photo")
+    resumed = journal(tmp_path)
+    assert resumed.reported()
+    assert len(resumed.units("analyze")) == result["variants"] > len(calls)
+
+def test_torn_last_line_is_dropped_and_cut_off(tmp_path):
+    path = str(tmp_path / JOURNAL_NAME)
+    first = RunJournal(path)
+    first.record("encode", variant="a_q05.webp")
+    first.close()
+    with open(path, "a") as f:
+        f.write('{"stage": "analyze", "vari')
+
+    torn = RunJournal(path)
+    assert list(torn.units("encode")) == ["a_q05.webp"]
+    torn.record("analyze", variant="a_q05.webp")
+    torn.close()
+    assert list(RunJournal(path).units("analyze")) == ["a_q05.webp"]
+
+def test_find_resumable_needs_the_same_run(tmp_path, image):
+    header = run_header(image, FORMATS, STEPS, "python", "pillow", 2048)
+    roots = []
+    for name, steps in (("old", STEPS), ("other", STEPS + 1), ("new", STEPS)):
+        root = str(tmp_path / name)
+        os.makedirs(os.path.join(root, "data"))
+        journal = RunJournal(os.path.join(root, "data", JOURNAL_NAME))
+        journal.record("start", **dict(header, steps=steps))
+        journal.close()
+        roots.append(root)
+        time.sleep(0.01)
+
+    assert find_resumable(roots, header) == roots[2]
+    assert find_resumable(roots[:2], header) == roots[0]
+    assert find_resumable([roots[1], str(tmp_path / "missing")], header) is None
@@ -0,0 +1,66 @@
+# ==============================================================================
+# Script Name: test_sampling.py
+# Description: Tests for adaptive quality sampling: the coarse grid, where it
+#              is refined, and the per-format encode budget.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import csv
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.sampling import QUALITY_MAX, QUALITY_MIN, coarse_qualities, refine_metric, refine_qualities
+from libs.scheduler import BatchScheduler
+
+@pytest.mark.parametrize("budget, count", [(1, 2), (3, 3), (5, 5), (40, 5)])
+def test_coarse_grid_spans_the_quality_range(budget, count):
+    qualities = coarse_qualities(budget)
+    assert len(qualities) == count
+    assert qualities[0] == QUALITY_MIN and qualities[-1] == QUALITY_MAX
+
+def test_refine_metric_prefers_ssim():
+    assert refine_metric({"PSNR": 30.0, "SSIM": 0.9}) == "SSIM"
+    assert refine_metric({"PSNR": 30.0, "SSIM": float("nan")}) == "PSNR"
+    assert refine_metric({"PSNR": ""}) is None
+
+def test_refinement_follows_the_bend():
+    # Flat up to q76, then size and quality jump: only the last interval is split
+    points = {5: (10.0, 0.90), 29: (10.2, 0.901), 53: (10.4, 0.902), 76: (10.6, 0.903), 100: (80.0, 0.99)}
+    assert refine_qualities(points, set(points), budget=20) == [88]
+
+def test_refinement_respects_the_budget_and_tried_qualities():
+    points = {5: (1.0, 0.5), 29: (2.0, 0.7), 53: (4.0, 0.8), 76: (8.0, 0.9), 100: (16.0, 0.99)}
+    sampled = set(points)
+    assert len(refine_qualities(points, sampled, budget=20)) == 4
+    # Largest share first: the q5..q29 interval changes quality the most
+    assert refine_qualities(points, sampled, budget=6) == [17]
+    assert refine_qualities(points, sampled, budget=5) == []
+    # A quality that failed to encode is not tried again
+    assert 17 not in refine_qualities(points, sampled | {17}, budget=20)
+
+def test_adjacent_qualities_are_not_split():
+    points = {50: (1.0, 0.5), 51: (9.0, 0.99)}
+    assert refine_qualities(points, set(points), budget=10) == []
+
+def test_adaptive_run_stays_within_the_encode_budget(tmp_path):
+    y, x = np.mgrid[0:32, 0:48]
+    image = str(tmp_path / "photo.png")
+    Image.fromarray(np.dstack([x * 5, y * 7, (x + y) * 3]).astype(np.uint8)).save(image)
+    sched = BatchScheduler(["webp", "jpeg"], 10, str(tmp_path / "reports"), jobs=1, backend="pillow", charts="js",
+                           sampling="adaptive", max_encodes=7)
+    summary = sched.run([image])
+
+    [result] = summary.images
+    assert result["status"] == "ok"
+    with open(os.path.join(result["output_dir"], "data", "metrics.csv"), newline="") as f:
+        rows = [row for row in csv.DictReader(f) if "lossless" not in row["params"]]
+    for fmt in ("webp", "jpeg"):
+        qualities = sorted(int(row["quality"]) for row in rows if row["format"] == fmt)
+        assert set(coarse_qualities(7)) <= set(qualities)
+        assert len(coarse_qualities(7)) < len(qualities) <= 7
@@ -0,0 +1,63 @@
+# ==============================================================================
+# Script Name: test_scheduler.py
+# Description: Tests for how the batch scheduler settles an image's status
+#              when its variants (or their callbacks) fail.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.journal import RunJournal
+from libs.scheduler import BatchScheduler
+
+@pytest.fixture
+def images(tmp_path):
+    rng = np.random.default_rng(2)
+    good = str(tmp_path / "good.png")
+    Image.fromarray(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)).save(good)
+    bad = str(tmp_path / "bad.png")
+    with open(good, "rb") as src, open(bad, "wb") as dst:
+        dst.write(src.read(200))
+    return good, bad
+
+def make_scheduler(tmp_path):
+    return BatchScheduler(["webp"], 2, str(tmp_path / "reports"), jobs=1, backend="pillow", charts="js")
+
+def test_image_without_variants_fails(tmp_path, images):
+    good, bad = images
+    summary = make_scheduler(tmp_path).run([good, bad])
+
+    status = {os.path.basename(i["image"]): (i["status"], i["variants"]) for i in summary.images}
+    assert status["good.png"][0] == "ok"
+    assert status["bad.png"] == ("failed", 0)
+    assert not os.path.exists(os.path.join(str(tmp_path / "reports"), "bad", "index.html"))
+    assert all(group["count"] == 1 for group in summary.groups.values())
+
+def test_callback_error_fails_only_its_variant(tmp_path, images, monkeypatch):
+    good, _ = images
+    record = RunJournal.record
+
+    def disk_full(journal, stage, **data):
+        if stage == "encode" and data["variant"].endswith("_q05.webp"):
+            raise OSError("No space left on device")
+        return record(journal, stage, **data)
+
+    monkeypatch.setattr(RunJournal, "record", disk_full)
+    sched = make_scheduler(tmp_path)
+    sched.start()
+    try:
+        job = sched.submit(good)
+        assert job.finished.wait(60)
+    finally:
+        sched.shutdown()
+
+    assert job.status == "failed"
+    assert job.failed == 1
+    assert job.rows and not any(row["filename"].endswith("_q05.webp") for row in job.rows)
@@ -0,0 +1,79 @@
+# ==============================================================================
+# Script Name: test_search.py
+# Description: Tests for target-quality mode: parsing --target and bisecting
+#              the quality axis.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import csv
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.search import parse_target, run_target_search, search_format
+
+@pytest.mark.parametrize("spec, expected", [
+    ("SSIM=0.98", ("SSIM", 0.98)),
+    ("psnr-red = 40", ("PSNR-Red", 40.0)),
+    ("MS-SSIM=0.99", ("MSSSIM", 0.99)),
+    ("ms-ssim-gray=0.9", ("MSSSIM-Gray", 0.9)),
+])
+def test_parse_target(spec, expected):
+    assert parse_target(spec) == expected
+
+@pytest.mark.parametrize("spec", ["SSIM", "FOO=1", "PSNR-Cyan=30", "SSIM=high"])
+def test_parse_target_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_target(spec)
+
+def evaluator(score):
+    calls = []
+
+    def evaluate(fmt, q):
+        calls.append(q)
+        return {"format": fmt, "quality": q, "PSNR": score(q), "RMSE": 100 - score(q)}
+
+    return evaluate, calls
+
+@pytest.mark.parametrize("needed", [1, 37, 63, 100])
+def test_search_finds_the_lowest_passing_quality(needed):
+    evaluate, calls = evaluator(lambda q: q)
+    best, rows = search_format("webp", evaluate, "PSNR", needed)
+    assert best["quality"] == needed
+    assert len(rows) == len(set(calls)) <= 8
+    assert all(row["PSNR"] < needed for row in rows if row["quality"] < needed)
+
+def test_search_for_lower_is_better_metrics():
+    evaluate, _ = evaluator(lambda q: q)
+    best, _ = search_format("webp", evaluate, "RMSE", 58)
+    assert best["quality"] == 42
+
+def test_unreachable_target_costs_one_encode():
+    evaluate, calls = evaluator(lambda q: q)
+    best, rows = search_format("webp", evaluate, "PSNR", 101)
+    assert best is None
+    assert calls == [100] and len(rows) == 1
+
+def test_run_target_search_writes_both_tables(tmp_path):
+    # A smooth gradient: noise never reaches a useful PSNR after chroma subsampling
+    y, x = np.mgrid[0:32, 0:48]
+    source = str(tmp_path / "photo.png")
+    Image.fromarray(np.dstack([x * 5, y * 7, (x + y) * 3]).astype(np.uint8)).save(source)
+    dirs = {name: str(tmp_path / name) for name in ("images", "diffs", "data")}
+    for path in dirs.values():
+        os.makedirs(path)
+
+    _, results = run_target_search(source, dirs, ["webp"], "PSNR=35", jobs=1, backend="pillow")
+
+    [result] = results
+    assert result["met"] and 1 <= result["quality"] <= 100 and result["encodes"] <= 8
+    assert result["value"] >= 35
+    with open(os.path.join(dirs["data"], "target_search.csv"), newline="") as f:
+        assert [row["format"] for row in csv.DictReader(f)] == ["webp"]
+    with open(os.path.join(dirs["data"], "metrics.csv"), newline="") as f:
+        assert len(list(csv.DictReader(f))) == result["encodes"]
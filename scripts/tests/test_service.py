@@ -0,0 +1,79 @@
+# ==============================================================================
+# Script Name: test_service.py
+# Description: Tests for the analysis service's request validation and
+#              de-duplication, and the scheduler's image slots.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.compressor import quality_steps
+from libs.scheduler import BatchScheduler
+from libs.service import AnalysisService
+
+@pytest.fixture
+def scheduler(tmp_path):
+    scheduler = BatchScheduler(["webp"], 4, str(tmp_path / "reports"), jobs=1, max_open_images=2, charts="js")
+    scheduler.start()
+    yield scheduler
+    scheduler.shutdown()
+
+@pytest.mark.parametrize("steps", [0, 101, "4"])
+def test_quality_steps_rejects_out_of_range(steps):
+    with pytest.raises(ValueError):
+        quality_steps(steps)
+
+def test_quality_steps_bounds():
+    assert quality_steps(1) == [5, 100]
+    assert quality_steps(100)[-1] == 100
+
+@pytest.mark.parametrize("steps", [0, 101, 2.5, True])
+def test_service_rejects_bad_steps(scheduler, tmp_path, steps):
+    image = tmp_path / "a.png"
+    image.write_bytes(b"")
+    with pytest.raises(ValueError):
+        AnalysisService(scheduler).submit(str(image), steps=steps)
+
+def test_failed_job_setup_releases_its_slot(scheduler, tmp_path):
+    # Bypasses the service's checks: the scheduler itself must not leak the slot
+    for _ in range(scheduler.max_open_images + 1):
+        with pytest.raises(ValueError):
+            scheduler.submit(str(tmp_path / "a.png"), steps=101)
+    for _ in range(scheduler.max_open_images):
+        assert scheduler.open_slots.acquire(blocking=False)
+
+def test_identical_in_flight_requests_share_a_job(scheduler, tmp_path, monkeypatch):
+    image = tmp_path / "a.png"
+    image.write_bytes(b"png")
+    release = threading.Event()
+    started = []
+
+    def submit(path, formats, steps, listener):
+        started.append((path, steps))
+        release.wait(10)
+        listener("finished", {"status": "ok"})
+
+    monkeypatch.setattr(scheduler, "submit", submit)
+    service = AnalysisService(scheduler)
+
+    job, deduplicated = service.submit(str(image))
+    assert not deduplicated
+    assert service.submit(str(image)) == (job, True)
+    other, deduplicated = service.submit(str(image), steps=2)
+    assert other is not job and not deduplicated
+
+    release.set()
+    assert [e["event"] for e in job.follow()] == ["queued", "finished"]
+    list(other.follow())
+    assert service.get(job.id) is job and not service.active
+
+    again, deduplicated = service.submit(str(image))
+    assert again is not job and not deduplicated
+    list(again.follow())
+    assert len(started) == 3
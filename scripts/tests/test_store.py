@@ -0,0 +1,60 @@
+# ==============================================================================
+# Script Name: test_store.py
+# Description: Tests for the typed metrics store (metrics.npz): round trips
+#              with missing metrics and schema checks.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import json
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs import store
+
+FIELDNAMES = ["filename", "format", "quality", "params", "size_kb", "relative_path", "diff_path", "details",
+              "PSNR", "SSIM", "MSSSIM", "decode_ms"]
+
+ROWS = [
+    {"filename": "a_q05.webp", "format": "webp", "quality": 5, "params": "-q 5", "size_kb": 1.5,
+     "relative_path": "images/a_q05.webp", "diff_path": "diffs/diff_a_q05.webp", "details": "{}",
+     "PSNR": 28.25, "SSIM": 0.91, "MSSSIM": float("nan"), "decode_ms": None},
+    {"filename": "a_lossless.webp", "format": "webp", "quality": 100, "params": "-lossless", "size_kb": 9.0,
+     "relative_path": "images/a_lossless.webp", "diff_path": None, "details": "",
+     "PSNR": 999.0, "SSIM": "", "MSSSIM": 1.0, "decode_ms": 0.75},
+]
+
+def test_round_trip_keeps_types_and_missing_metrics(tmp_path):
+    path = store.write_metrics_store(str(tmp_path / store.STORE_NAME), ROWS, FIELDNAMES)
+    columns, fieldnames = store.read_metrics_store(path)
+
+    assert fieldnames == FIELDNAMES
+    assert columns["quality"].dtype == np.int32
+    assert columns["filename"].dtype.kind == "U"
+    assert all(columns[name].dtype == np.float64 for name in ("size_kb", "PSNR", "SSIM", "MSSSIM", "decode_ms"))
+    assert math.isnan(columns["MSSSIM"][0]) and math.isnan(columns["SSIM"][1])
+
+    rows = store.to_rows(columns, fieldnames)
+    assert rows[0]["MSSSIM"] is None and rows[0]["decode_ms"] is None and rows[1]["SSIM"] is None
+    assert rows[1]["diff_path"] == ""
+    assert [row["quality"] for row in rows] == [5, 100]
+    assert rows[0]["PSNR"] == 28.25 and rows[1]["PSNR"] == 999.0
+    assert not os.path.exists(f"{path}.tmp.npz")
+
+def test_empty_run_round_trips(tmp_path):
+    path = store.write_metrics_store(str(tmp_path / store.STORE_NAME), [], FIELDNAMES)
+    columns, fieldnames = store.read_metrics_store(path)
+    assert fieldnames == FIELDNAMES
+    assert store.to_rows(columns, fieldnames) == []
+
+def test_other_schema_version_is_rejected(tmp_path):
+    path = str(tmp_path / store.STORE_NAME)
+    meta = json.dumps({"version": store.SCHEMA_VERSION + 1, "rows": 0, "columns": []})
+    np.savez(path, **{store.SCHEMA_KEY: np.array(meta)})
+    with pytest.raises(ValueError):
+        store.read_metrics_store(path)
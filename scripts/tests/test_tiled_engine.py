@@ -0,0 +1,75 @@
+# ==============================================================================
+# Script Name: test_tiled_engine.py
+# Description: Tests for the tiled metrics engine's reference decoding:
+#              sources past Pillow's decompression-bomb limit and band-by-band
+#              spilling of striped or uncompressed images.
+# Usage:       python -m pytest scripts/tests
+# ==============================================================================
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs import analyzer
+from libs import metrics
+
+def make_image(path, mode="RGB", size=(61, 97)):
+    rng = np.random.default_rng(0)
+    img = Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)).convert(mode)
+    img.save(path, **({"compression": None} if path.endswith(".tif") else {}))
+    return path
+
+def read_spill(raw):
+    return np.fromfile(raw.path, dtype=raw.dtype).reshape(raw.shape).transpose(1, 2, 0)
+
+def test_tiled_engine_decodes_past_bomb_limit(tmp_path, monkeypatch):
+    # 5917 pixels is over twice this limit: a plain Image.open raises DecompressionBombError
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    path = make_image(str(tmp_path / "big.png"))
+
+    assert analyzer.load_reference(path, "numpy") is None
+    reference = analyzer.load_reference(path, "tiled")
+    try:
+        assert isinstance(reference, metrics.TiledReference)
+        assert reference.size == (61, 97)
+        assert Image.MAX_IMAGE_PIXELS == 1000
+        scores = reference.compare(path)
+        assert scores["PSNR-Red"] == metrics.PSNR_INF
+    finally:
+        reference.close()
+
+@pytest.mark.parametrize("ext", [".tif", ".bmp", ".ppm"])
+@pytest.mark.parametrize("mode", ["RGB", "L", "P", "1"])
+def test_spill_decodes_in_bands(tmp_path, monkeypatch, ext, mode):
+    if ext == ".ppm" and mode == "P":
+        pytest.skip("PPM has no palette mode")
+    monkeypatch.setattr(metrics, "SPILL_CHUNK_BYTES", 1000)
+    bands = []
+    decode_tiles = metrics.decode_tiles
+    monkeypatch.setattr(metrics, "decode_tiles", lambda *args: bands.append(args[2]) or decode_tiles(*args))
+    path = make_image(str(tmp_path / f"source{ext}"), mode)
+
+    raw, spill_mode = metrics.spill_image(path, str(tmp_path))
+    with Image.open(path) as img:
+        expected = np.asarray(img.convert(spill_mode))
+
+    spilled = read_spill(raw)
+    assert len(bands) > 1
+    assert np.array_equal(spilled, expected.reshape(spilled.shape))
+
+def test_untested_pillow_decodes_whole(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "SPILL_CHUNK_BYTES", 1000)
+    monkeypatch.setattr(metrics, "BANDED_DECODE_PILLOW", ((0, 0), (0, 1)))
+    monkeypatch.setattr(metrics, "decode_tiles", None)
+    path = make_image(str(tmp_path / "source.tif"))
+
+    raw, spill_mode = metrics.spill_image(path, str(tmp_path))
+    with Image.open(path) as img:
+        expected = np.asarray(img.convert(spill_mode))
+
+    assert np.array_equal(read_spill(raw), expected)